@@ -1,19 +1,75 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Literal
 
 class Settings(BaseSettings):
     # 项目基础信息
     PROJECT_NAME: str = "Student Wellbeing and Academic System"
     VERSION: str = "1.0.0"
     
-    # 数据库配置 (默认为当前目录下的 sqlite 文件)
-    DATABASE_URL: str = "qlite:///./student_system.db"
+    # 数据库配置 (默认为当前目录下的 sqlite 文件；支持 SQLite 和 PostgreSQL，其他数据库启动时报错)
+    DATABASE_URL: str = "sqlite:///./student_wellbeing.db"
+
+    # 使用异步驱动 (SQLite -> aiosqlite, PostgreSQL -> asyncpg) 和 AsyncSession 处理请求
+    ASYNC_DB: bool = False
+
+    # 连接池配置 (PostgreSQL 等服务器数据库，以及 SQLite 文件数据库)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30       # 等待空闲连接的秒数
+    DB_POOL_RECYCLE: int = 1800     # 连接最长复用时间 (秒)
+    DB_POOL_PRE_PING: bool = True   # 取出连接前先检测是否可用
+
+    # SQLite 连接参数 (每个连接建立时通过 PRAGMA 设置)
+    SQLITE_WAL: bool = True                   # WAL 模式: 读不会被写锁阻塞
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000        # 遇到写锁时等待的毫秒数
+    SQLITE_MMAP_SIZE: int = 268435456         # 内存映射读取大小 (256MB)
     
     # 安全配置 (JWT Token)
     SECRET_KEY: str = "CHANGE_THIS_TO_A_SUPER_SECRET_KEY_FOR_ASSESSMENT"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60  # Token 有效期 60 分钟
 
+    # 密码哈希 (bcrypt)
+    BCRYPT_ROUNDS: int = 12                # 修改后旧哈希会在登录时自动升级
+    PASSWORD_HASH_WORKERS: int = 2         # 哈希进程池大小
+    PASSWORD_HASH_QUEUE_SIZE: int = 64     # 排队中的哈希任务上限，超过返回 429
+
+    # 已认证用户的进程内缓存 (避免每个请求都查 users 表)
+    USER_CACHE_TTL_SECONDS: int = 300
+    USER_CACHE_MAX_SIZE: int = 10000
+    # 直接信任 Token 中签名过的 role 声明，完全跳过数据库 (角色变更要等旧 Token 过期才生效)
+    TRUST_TOKEN_ROLE: bool = False
+
+    # 仪表盘接口的响应缓存 (写入路径递增版本号使其失效)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_BACKEND: str = "memory"       # memory (进程内 LRU) 或 redis (多个进程共享)
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024       # 进程内缓存的条目上限
+    RESPONSE_CACHE_TTL_SECONDS: int = 300
+    # 读取 cache_versions 表 (seed.py / datagen.py 等进程外写入递增的版本号) 的最小间隔，0 表示不读取
+    RESPONSE_CACHE_SHARED_VERSION_SECONDS: float = 1.0
+
+    # 大列表接口使用 orjson + 免校验的 schema 构造输出 (需要安装 orjson)
+    FAST_JSON: bool = False
+
+    # 同一学生同一周重复提交调查时的处理策略 (接口可通过 on_conflict 参数覆盖)
+    # replace: 用新数据覆盖; keep_first: 保留已有记录; reject: 报错
+    SURVEY_CONFLICT_POLICY: Literal["replace", "keep_first", "reject"] = "replace"
+
+    # 请求级性能指标: Server-Timing 响应头、GET /metrics (Prometheus 格式) 和慢查询日志
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True
+    SLOW_QUERY_MS: float = 200             # 超过该耗时的 SQL 写入慢查询日志 (0 表示关闭)
+    SLOW_QUERY_EXPLAIN: bool = True        # 慢查询日志附带 EXPLAIN 执行计划
+    SLOW_QUERY_LOG_FILE: str = ""          # 为空时只输出到 app.slow_query 日志器
+
+    # 每个学生的汇总表 (预警名单使用) 与原始数据定期对账的间隔秒数 (0 表示不启动对账线程)
+    STUDENT_SUMMARY_RECONCILE_SECONDS: int = 3600
+
+    # 后台 CSV 导入的工作线程数 (同时执行的导入任务数)
+    IMPORT_WORKERS: int = 2
+
     # 允许跨域的源 (Frontend URL)
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:8081", "http://localhost:8080"]
 
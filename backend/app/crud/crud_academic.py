@@ -1,6 +1,12 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case, select
+import datetime
+from typing import Optional
 from app import models, schemas
+from app.pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+
+# 每次 IN (...) 查询的学号数量上限 (低于 SQLite 的绑定变量限制)
+STUDENT_LOOKUP_BATCH = 900
 
 # 获取所有课程列表
 def get_all_courses(db: Session):
@@ -10,134 +16,258 @@ def get_all_courses(db: Session):
 def get_course_by_id(db: Session, course_id: int):
     return db.query(models.Course).filter(models.Course.id == course_id).first()
 
-# 获取课程的统计数据 (Dashboard 数据)
-def get_course_analytics(db: Session, course_id: int):
-    # 计算平均分
-    # 查询该课程下所有 Grade 的平均 score
-    avg_grade = db.query(func.avg(models.Grade.score))\
-                  .filter(models.Grade.course_id == course_id)\
-                  .scalar()
-
-    # 计算出勤率
-    # 总记录数
-    total_attendance = db.query(models.Attendance)\
-                         .filter(models.Attendance.course_id == course_id)\
-                         .count()
-    
-    # 出勤(Present)的记录数
-    present_count = db.query(models.Attendance)\
-                      .filter(models.Attendance.course_id == course_id, 
-                              models.Attendance.status == models.AttendanceStatus.PRESENT)\
-                      .count()
-    
-    # 防止除以零
-    attendance_rate = 0.0
-    if total_attendance > 0:
-        attendance_rate = (present_count / total_attendance) * 100
+# 课程统计的聚合查询 (成绩、出勤、选课人数各聚合一次，再按课程拼接)
+def _course_analytics_query(db: Session, course_id: Optional[int] = None):
+    """
+    出勤使用条件聚合 SUM(CASE WHEN status = ...) 一次扫描得到各状态的数量
+    course_id 为空时返回所有课程
+    """
+    status = models.Attendance.status
+
+    grade_stats = db.query(
+        models.Grade.course_id.label("course_id"),
+        func.avg(models.Grade.score).label("average_grade")
+    ).group_by(models.Grade.course_id)
+
+    attendance_stats = db.query(
+        models.Attendance.course_id.label("course_id"),
+        func.count().label("total"),
+        func.sum(case((status == models.AttendanceStatus.PRESENT, 1), else_=0)).label("present"),
+        func.sum(case((status == models.AttendanceStatus.LATE, 1), else_=0)).label("late"),
+        func.sum(case((status == models.AttendanceStatus.ABSENT, 1), else_=0)).label("absent")
+    ).group_by(models.Attendance.course_id)
+
+    enrolment_stats = db.query(
+        models.student_courses.c.course_id.label("course_id"),
+        func.count().label("enrolled")
+    ).group_by(models.student_courses.c.course_id)
+
+    courses = db.query(models.Course)
+    if course_id is not None:
+        # 过滤条件直接放进各个子查询，避免先聚合全表
+        grade_stats = grade_stats.filter(models.Grade.course_id == course_id)
+        attendance_stats = attendance_stats.filter(models.Attendance.course_id == course_id)
+        enrolment_stats = enrolment_stats.filter(models.student_courses.c.course_id == course_id)
+        courses = courses.filter(models.Course.id == course_id)
 
-    student_count = db.query(models.Student)\
-                      .join(models.student_courses)\
-                      .filter(models.student_courses.c.course_id == course_id)\
-                      .count()
+    grade_stats = grade_stats.subquery()
+    attendance_stats = attendance_stats.subquery()
+    enrolment_stats = enrolment_stats.subquery()
+
+    return courses.add_columns(
+        grade_stats.c.average_grade,
+        attendance_stats.c.total,
+        attendance_stats.c.present,
+        attendance_stats.c.late,
+        attendance_stats.c.absent,
+        enrolment_stats.c.enrolled
+    ).outerjoin(grade_stats, grade_stats.c.course_id == models.Course.id)\
+     .outerjoin(attendance_stats, attendance_stats.c.course_id == models.Course.id)\
+     .outerjoin(enrolment_stats, enrolment_stats.c.course_id == models.Course.id)\
+     .order_by(models.Course.id)
+
+def _format_course_analytics(row):
+    total = row.total or 0
+    present, late, absent = row.present or 0, row.late or 0, row.absent or 0
+
+    # 防止除以零
+    def rate(count):
+        return round((count / total) * 100, 1) if total > 0 else 0.0
 
     return {
-        "average_grade": round(avg_grade, 2) if avg_grade else 0.0,
-        "attendance_rate": round(attendance_rate, 1),
-        "total_students_enrolled": student_count
+        "average_grade": round(row.average_grade, 2) if row.average_grade else 0.0,
+        "attendance_rate": rate(present),
+        "late_rate": rate(late),
+        "absence_rate": rate(absent),
+        "attendance_breakdown": {"present": present, "late": late, "absent": absent},
+        "total_students_enrolled": row.enrolled or 0
     }
 
+# 获取课程的统计数据 (Dashboard 数据)
+def get_course_analytics(db: Session, course_id: int):
+    row = _course_analytics_query(db, course_id).first()
+    if row is None:
+        return None
+    return _format_course_analytics(row)
+
+# 一次查询获取所有课程的统计数据 (Dashboard 总览)
+def get_all_course_analytics(db: Session):
+    return [
+        {
+            "course_id": row.Course.id,
+            "course_name": row.Course.name,
+            "course_code": row.Course.code,
+            "analytics": _format_course_analytics(row)
+        }
+        for row in _course_analytics_query(db).all()
+    ]
+
 # 获取某门课的所有学生成绩 (用于列表展示)
-def get_course_grades(db: Session, course_id: int):
-    return db.query(models.Grade).filter(models.Grade.course_id == course_id).all()
+def get_course_grades(db: Session, course_id: int, min_score: Optional[float] = None,
+                      max_score: Optional[float] = None, after: Optional[tuple] = None,
+                      limit: int = DEFAULT_PAGE_SIZE):
+    """
+    按 (score, id) 键集分页，正好对应 (course_id, score) 索引的顺序
+    返回: (grades, next_key)
+    """
+    query = db.query(models.Grade).filter(models.Grade.course_id == course_id)
+    if min_score is not None:
+        query = query.filter(models.Grade.score >= min_score)
+    if max_score is not None:
+        query = query.filter(models.Grade.score <= max_score)
+
+    return keyset_paginate(
+        query,
+        (models.Grade.score, models.Grade.id),
+        lambda g: (g.score, g.id),
+        after, limit
+    )
 
 # 根据学号获取详细学术信息 (成绩 + 出勤)
 def get_student_academic_details(db: Session, student_number: str):
-    # 查找学生
-    student = db.query(models.Student).filter(models.Student.student_number == student_number).first()
-    if not student:
-        return None
-    
-    # 获取成绩 (关联课程信息)
-    grades = db.query(models.Grade)\
-        .join(models.Course)\
-        .filter(models.Grade.student_id == student.id)\
-        .order_by(models.Grade.submission_date.desc())\
-        .all()
-        
-    # 获取出勤 (关联课程信息)
-    attendances = db.query(models.Attendance)\
-        .join(models.Course)\
-        .filter(models.Attendance.student_id == student.id)\
-        .order_by(models.Attendance.date.desc())\
-        .all()
-
-    # 格式化数据以符合 Schema (因为 ORM 对象直接转 Pydantic 有时需要手动处理关联字段的扁平化)
-    formatted_grades = []
-    for g in grades:
-        # 确保 Course 已加载
-        formatted_grades.append({
-            "id": g.id,
-            "student_id": g.student_id,
-            "assignment_title": g.assignment_title,
-            "score": g.score,
-            "submission_date": g.submission_date,
-            "course_name": g.course.name,
-            "course_code": g.course.code
-        })
-
-    formatted_attendances = []
-    for a in attendances:
-        formatted_attendances.append({
-            "id": a.id,
-            "date": a.date,
-            "status": a.status,
-            "course_name": a.course.name,
-            "course_code": a.course.code
-        })
+    return get_student_academic_reports(db, [student_number]).get(student_number)
 
-    return {
-        "student": student,
-        "grades": formatted_grades,
-        "attendances": formatted_attendances
-    }
+# 批量获取学生的学术档案 (队列导出使用)
+def get_student_academic_reports(db: Session, student_numbers) -> dict:
+    """
+    只查询需要的列 (不构造 ORM 对象)，每批学生固定 3 条查询:
+    学生、成绩 JOIN 课程、出勤 JOIN 课程
+    返回: {student_number: report}，不存在的学号不会出现在结果中
+    """
+    numbers = list(dict.fromkeys(student_numbers))
+    reports = {}
+    for start in range(0, len(numbers), STUDENT_LOOKUP_BATCH):
+        reports.update(_load_academic_reports(db, numbers[start:start + STUDENT_LOOKUP_BATCH]))
+    return reports
+
+def _load_academic_reports(db: Session, student_numbers: list) -> dict:
+    students = db.execute(
+        select(models.Student.id, models.Student.full_name, models.Student.student_number, models.Student.email)
+        .where(models.Student.student_number.in_(student_numbers))
+    ).all()
+    if not students:
+        return {}
+
+    reports = {}
+    report_by_id = {}
+    for row in students:
+        report = {
+            "student": {"full_name": row.full_name, "student_number": row.student_number, "email": row.email},
+            "grades": [],
+            "attendances": [],
+        }
+        reports[row.student_number] = report
+        report_by_id[row.id] = report
+    student_ids = list(report_by_id)
+
+    # 成绩 (按提交时间倒序，走 (student_id, submission_date) 索引)
+    grades = db.execute(
+        select(
+            models.Grade.id, models.Grade.student_id, models.Grade.assignment_title,
+            models.Grade.score, models.Grade.submission_date,
+            models.Course.name.label("course_name"), models.Course.code.label("course_code"),
+        )
+        .join(models.Course, models.Course.id == models.Grade.course_id)
+        .where(models.Grade.student_id.in_(student_ids))
+        .order_by(models.Grade.student_id, models.Grade.submission_date.desc(), models.Grade.id.desc())
+    )
+    for row in grades.mappings():
+        report_by_id[row["student_id"]]["grades"].append(dict(row))
+
+    # 出勤 (按日期倒序，走 (student_id, date) 索引)
+    attendances = db.execute(
+        select(
+            models.Attendance.student_id, models.Attendance.id, models.Attendance.date, models.Attendance.status,
+            models.Course.name.label("course_name"), models.Course.code.label("course_code"),
+        )
+        .join(models.Course, models.Course.id == models.Attendance.course_id)
+        .where(models.Attendance.student_id.in_(student_ids))
+        .order_by(models.Attendance.student_id, models.Attendance.date.desc(), models.Attendance.id.desc())
+    )
+    for row in attendances.mappings():
+        attendance = dict(row)
+        report_by_id[attendance.pop("student_id")]["attendances"].append(attendance)
+
+    return reports
 
 # 获取成绩不达标的学生 (预警名单)
-def get_academic_at_risk_students(db: Session):
+def get_academic_at_risk_students(db: Session, pass_mark: Optional[float] = None,
+                                  limit: Optional[int] = None, offset: int = 0):
     """
-    筛选规则: 存在任意一门课程成绩 < 50 的学生
+    筛选规则: 存在任意一条按风险规则判定为不及格的成绩 (见 app/risk_rules.py) 的学生
+    不指定 pass_mark 时直接读取学生汇总表 (fail_count 按当前规则统计，走 (fail_count, student_id) 索引)；
+    指定 pass_mark 时以成绩 < pass_mark 为准，用单条 GROUP BY 聚合查询同时算出平均分和挂科数量，
+    排序和分页也在 SQL 中完成
     """
-    PASS_MARK = 50.0
-
-    # 1. 找出所有有挂科记录的学生 ID (去重)
-    failing_student_ids = db.query(models.Grade.student_id)\
-        .filter(models.Grade.score < PASS_MARK)\
-        .distinct()
-
-    # 2. 查询这些学生的基础信息
-    # 使用 in_ 操作符筛选
-    at_risk_students = db.query(models.Student)\
-        .filter(models.Student.id.in_(failing_student_ids))\
-        .all()
-    
-    risk_list = []
-    for student in at_risk_students:
-        # 补充计算：平均分
-        avg_score = db.query(func.avg(models.Grade.score))\
-            .filter(models.Grade.student_id == student.id)\
-            .scalar()
-            
-        # 补充计算：挂科数量
-        fail_count = db.query(models.Grade)\
-            .filter(models.Grade.student_id == student.id, models.Grade.score < PASS_MARK)\
-            .count()
-            
-        risk_list.append({
-            "student": student,
-            "average_score": round(avg_score, 1) if avg_score else 0.0,
-            "failed_courses_count": fail_count
-        })
-        
+    if pass_mark is None:
+        summary = models.StudentSummary
+        avg_score = summary.score_sum / summary.grade_count
+        fail_count = summary.fail_count
+        query = db.query(models.Student, avg_score, fail_count)\
+            .join(summary, summary.student_id == models.Student.id)\
+            .filter(fail_count > 0)
+    else:
+        avg_score = func.avg(models.Grade.score)
+        fail_count = func.sum(case((models.Grade.score < pass_mark, 1), else_=0))
+        query = db.query(models.Student, avg_score, fail_count)\
+            .join(models.Grade, models.Grade.student_id == models.Student.id)\
+            .group_by(models.Student.id)\
+            .having(fail_count > 0)
+
     # 按挂科数量降序排列，挂科越多的排越前
-    risk_list.sort(key=lambda x: x['failed_courses_count'], reverse=True)
-    
-    return risk_list
\ No newline at end of file
+    query = query.order_by(fail_count.desc(), models.Student.id).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [
+        {
+            "student": student,
+            "average_score": round(avg, 1) if avg else 0.0,
+            "failed_courses_count": fails
+        }
+        for student, avg, fails in query.all()
+    ]
+
+# --- 导出 (由 app.exports 流式执行) ---
+
+def _filter_dates(query, column, date_from: Optional[datetime.datetime], date_to: Optional[datetime.datetime]):
+    if date_from is not None:
+        query = query.where(column >= date_from)
+    if date_to is not None:
+        query = query.where(column <= date_to)
+    return query
+
+# 成绩导出查询 (每行一条成绩，附学号和课程代码)
+def grade_export_query(course_id: Optional[int] = None,
+                       date_from: Optional[datetime.datetime] = None, date_to: Optional[datetime.datetime] = None):
+    grade = models.Grade
+    query = select(
+        grade.id,
+        models.Student.student_number,
+        models.Course.code.label("course_code"),
+        grade.assignment_title,
+        grade.score,
+        grade.submission_date,
+    ).join(models.Student, models.Student.id == grade.student_id)\
+        .join(models.Course, models.Course.id == grade.course_id)\
+        .order_by(grade.id)
+    if course_id is not None:
+        query = query.where(grade.course_id == course_id)
+    return _filter_dates(query, grade.submission_date, date_from, date_to)
+
+# 出勤导出查询
+def attendance_export_query(course_id: Optional[int] = None,
+                            date_from: Optional[datetime.datetime] = None, date_to: Optional[datetime.datetime] = None):
+    attendance = models.Attendance
+    query = select(
+        attendance.id,
+        models.Student.student_number,
+        models.Course.code.label("course_code"),
+        attendance.date,
+        attendance.status,
+    ).join(models.Student, models.Student.id == attendance.student_id)\
+        .join(models.Course, models.Course.id == attendance.course_id)\
+        .order_by(attendance.id)
+    if course_id is not None:
+        query = query.where(attendance.course_id == course_id)
+    return _filter_dates(query, attendance.date, date_from, date_to)
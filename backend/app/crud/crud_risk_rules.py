@@ -0,0 +1,102 @@
+from sqlalchemy.orm import Session, selectinload
+import datetime
+from typing import Optional
+from app import models, risk_rules, schemas, student_summary
+from app.crud import crud_academic
+from app.response_cache import ACADEMIC, RISK_RULES, response_cache
+
+
+class RuleSetConflictError(Exception):
+    """同一领域、同一课程已经有规则集"""
+
+class InvalidRuleSetError(Exception):
+    """指标不属于该领域，或课程不存在"""
+
+# 获取规则集列表 (可按领域过滤)
+def get_rule_sets(db: Session, domain: Optional[str] = None):
+    query = db.query(models.RiskRuleSet).options(selectinload(models.RiskRuleSet.rules))
+    if domain is not None:
+        query = query.filter(models.RiskRuleSet.domain == domain)
+    return query.order_by(models.RiskRuleSet.domain, models.RiskRuleSet.id).all()
+
+def get_rule_set(db: Session, rule_set_id: int):
+    return db.query(models.RiskRuleSet)\
+        .options(selectinload(models.RiskRuleSet.rules))\
+        .filter(models.RiskRuleSet.id == rule_set_id)\
+        .first()
+
+def _validate(db: Session, data: schemas.RiskRuleSetIn, rule_set_id: Optional[int] = None):
+    allowed = risk_rules.METRICS[data.domain]
+    for rule in data.rules:
+        if rule.metric not in allowed:
+            raise InvalidRuleSetError(
+                f"Metric '{rule.metric}' is not available for {data.domain} rules (allowed: {', '.join(allowed)})"
+            )
+    if data.course_id is not None and crud_academic.get_course_by_id(db, data.course_id) is None:
+        raise InvalidRuleSetError(f"Course {data.course_id} not found")
+
+    # course_id 为 NULL 时唯一索引不起作用，在这里检查
+    duplicate = db.query(models.RiskRuleSet.id).filter(
+        models.RiskRuleSet.domain == data.domain,
+        models.RiskRuleSet.course_id.is_(None) if data.course_id is None
+        else models.RiskRuleSet.course_id == data.course_id,
+    )
+    if rule_set_id is not None:
+        duplicate = duplicate.filter(models.RiskRuleSet.id != rule_set_id)
+    if duplicate.first() is not None:
+        scope = "the default" if data.course_id is None else f"course {data.course_id}"
+        raise RuleSetConflictError(f"A {data.domain} rule set for {scope} already exists.")
+
+def _commit_changes(db: Session, scopes: set):
+    """
+    scopes: 修改涉及的 {(domain, course_id)} (更新时包括修改前后的领域和课程)
+    学术规则变化时在同一事务内重算学生汇总表 (fail_count 按规则统计):
+    课程规则集只影响该课程的成绩，只重算在这些课程有成绩的学生；默认规则集变化时重建整张表
+    提交后递增规则版本号，并使依赖这些规则的接口缓存失效 (领域名即响应缓存的命名空间)
+    """
+    db.flush()
+    courses = {course_id for domain, course_id in scopes if domain == ACADEMIC}
+    if None in courses:
+        student_summary.rebuild(db)
+    elif courses:
+        graded = db.query(models.Grade.student_id).filter(models.Grade.course_id.in_(courses)).distinct()
+        student_summary.refresh(db, [row.student_id for row in graded], rules=risk_rules.load(db))
+    db.commit()
+    response_cache.bump(RISK_RULES, *{domain for domain, _ in scopes})
+
+def _build_rules(data: schemas.RiskRuleSetIn) -> list:
+    return [models.RiskRule(metric=r.metric, operator=r.operator, threshold=r.threshold) for r in data.rules]
+
+# 创建规则集
+def create_rule_set(db: Session, data: schemas.RiskRuleSetIn):
+    _validate(db, data)
+    rule_set = models.RiskRuleSet(
+        domain=data.domain,
+        course_id=data.course_id,
+        description=data.description,
+        version=1,
+        updated_at=datetime.datetime.utcnow(),
+        rules=_build_rules(data),
+    )
+    db.add(rule_set)
+    _commit_changes(db, {(data.domain, data.course_id)})
+    return get_rule_set(db, rule_set.id)
+
+# 整体替换规则集的内容 (版本号加 1)
+def update_rule_set(db: Session, rule_set: models.RiskRuleSet, data: schemas.RiskRuleSetIn):
+    _validate(db, data, rule_set.id)
+    scopes = {(rule_set.domain, rule_set.course_id), (data.domain, data.course_id)}
+    rule_set.domain = data.domain
+    rule_set.course_id = data.course_id
+    rule_set.description = data.description
+    rule_set.rules = _build_rules(data)
+    rule_set.version += 1
+    rule_set.updated_at = datetime.datetime.utcnow()
+    _commit_changes(db, scopes)
+    return get_rule_set(db, rule_set.id)
+
+# 删除规则集 (删除默认规则集后使用内置的默认阈值)
+def delete_rule_set(db: Session, rule_set: models.RiskRuleSet):
+    scope = (rule_set.domain, rule_set.course_id)
+    db.delete(rule_set)
+    _commit_changes(db, {scope})
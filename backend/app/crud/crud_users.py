@@ -0,0 +1,12 @@
+from sqlalchemy.orm import Session
+from app import models
+
+# 根据用户名查找系统用户 (工作人员)
+def get_user_by_username(db: Session, username: str):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+# 登录时升级密码哈希 (哈希参数变更后)
+def update_password_hash(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
+    return user
@@ -1,61 +1,617 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from app import models, schemas
+from sqlalchemy.orm import Session, aliased, contains_eager
+from sqlalchemy import bindparam, case, func, desc, literal, select, tuple_, update
+import datetime
+import pandas as pd
+from typing import Optional
+from app import models, risk_rules, schemas, student_summary, wellbeing_rollups
+from app.config import get_settings
+from app.database import upsert_insert
+from app.pagination import keyset_paginate
+from app.response_cache import WELLBEING, response_cache
+
+settings = get_settings()
+
+# CSV 批量导入必须包含的列
+SURVEY_CSV_COLUMNS = ['student_number', 'week_number', 'stress_level', 'hours_slept']
+
+# 每次 IN (...) 查询的学号数量上限 (低于 SQLite 的绑定变量限制)
+STUDENT_LOOKUP_BATCH = 900
+
+# 流式导入时每个分块读取的行数
+CSV_CHUNK_SIZE = 10000
+
+# 导入结果中最多返回的错误条数 (超大文件时避免错误列表本身撑爆内存)
+MAX_REPORTED_ERRORS = 1000
+
+# --- 调查记录写入 ---
+class SurveyConflictError(Exception):
+    """reject 策略下，该学生这一周已经有调查记录"""
+
+# 同一学生同一周已有记录时的处理结果
+CREATED, UPDATED, SKIPPED, REJECTED = "created", "updated", "skipped", "rejected"
 
 # 创建/录入一条健康调查记录
-def create_survey(db: Session, survey: schemas.WellbeingSurveyCreate):
+def create_survey(db: Session, survey: schemas.WellbeingSurveyCreate, policy: Optional[str] = None):
+    """
+    该学生这一周已有记录时按 policy (默认取配置 SURVEY_CONFLICT_POLICY) 处理:
+    replace 覆盖并返回更新后的记录; keep_first 返回已有记录; reject 抛出 SurveyConflictError
+    学号不存在时返回 None
+    """
     student = db.query(models.Student).filter(models.Student.student_number == survey.student_number).first()
     if not student:
         return None
-    
-    db_survey = models.WellbeingSurvey(
-        student_id=student.id,
-        week_number=survey.week_number,
-        stress_level=survey.stress_level,
-        hours_slept=survey.hours_slept
-    )
-    db.add(db_survey)
+
+    outcome, = upsert_surveys(db, [{
+        "student_id": student.id,
+        "week_number": survey.week_number,
+        "stress_level": survey.stress_level,
+        "hours_slept": survey.hours_slept,
+        "recorded_at": datetime.datetime.utcnow(),
+    }], policy)
+    if outcome == REJECTED:
+        db.rollback()
+        raise SurveyConflictError(f"Survey for week {survey.week_number} already exists.")
+
     db.commit()
-    db.refresh(db_survey)
-    return db_survey
-
-# 获取每周的平均健康数据 (用于趋势图)
-def get_weekly_analytics(db: Session):
-    """
-    返回: List of {week_number, avg_stress, avg_sleep}
-    """
-    results = db.query(
-        models.WellbeingSurvey.week_number,
-        func.avg(models.WellbeingSurvey.stress_level).label("avg_stress"),
-        func.avg(models.WellbeingSurvey.hours_slept).label("avg_sleep")
-    ).group_by(models.WellbeingSurvey.week_number)\
-     .order_by(models.WellbeingSurvey.week_number)\
-     .all()
-    
+    if outcome != SKIPPED:
+        response_cache.bump(WELLBEING)
+    return db.query(models.WellbeingSurvey)\
+        .filter(models.WellbeingSurvey.student_id == student.id,
+                models.WellbeingSurvey.week_number == survey.week_number)\
+        .first()
+
+# 按 (student_id, week_number) 查找已有的调查记录
+def get_survey_ids_by_student_weeks(db: Session, pairs) -> dict:
+    """
+    返回: {(student_id, week_number): survey_id}
+    """
+    pairs = list(pairs)
+    mapping = {}
+    # 每对占用两个绑定变量
+    batch_size = STUDENT_LOOKUP_BATCH // 2
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        rows = db.query(models.WellbeingSurvey.student_id, models.WellbeingSurvey.week_number, models.WellbeingSurvey.id)\
+            .filter(tuple_(models.WellbeingSurvey.student_id, models.WellbeingSurvey.week_number).in_(batch))\
+            .all()
+        mapping.update({(student_id, week): survey_id for student_id, week, survey_id in rows})
+    return mapping
+
+# 读取并锁定已有的调查记录 (覆盖前的旧值)
+def _lock_surveys_by_student_weeks(db: Session, pairs) -> dict:
+    """
+    PostgreSQL 上使用 SELECT ... FOR UPDATE，读到的旧值在本事务提交前不会被其他请求修改；
+    SQLite 忽略 FOR UPDATE (调用前本事务已经写入过，持有写锁)
+    返回: {(student_id, week_number): {id, stress_level, hours_slept}}
+    """
+    pairs = list(pairs)
+    survey = models.WellbeingSurvey.__table__
+    mapping = {}
+    batch_size = STUDENT_LOOKUP_BATCH // 2
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        rows = db.execute(
+            select(survey.c.student_id, survey.c.week_number, survey.c.id, survey.c.stress_level, survey.c.hours_slept)
+            .where(tuple_(survey.c.student_id, survey.c.week_number).in_(batch))
+            .with_for_update()
+        )
+        for student_id, week, survey_id, stress_level, hours_slept in rows:
+            mapping[(student_id, week)] = {"id": survey_id, "stress_level": stress_level, "hours_slept": hours_slept}
+    return mapping
+
+# 写入一批调查记录 (所有写入路径共用)，不提交
+def upsert_surveys(db: Session, records, policy: Optional[str] = None) -> list:
+    """
+    records: [{student_id, week_number, stress_level, hours_slept, recorded_at, idempotency_key?}, ...]
+    每个 (student_id, week_number) 只保留一条记录，已存在 (或同一批次中重复出现) 时按 policy 处理:
+    - replace: 覆盖 -> updated
+    - keep_first: 保留先出现的 -> skipped
+    - reject: 不写入 -> rejected
+    1. INSERT ... ON CONFLICT DO NOTHING RETURNING: 返回的即实际插入的记录 (不依赖事先读取，
+       其他请求并发插入同一 (学生, 周) 时也不会重复计数)
+    2. replace 时读取并锁定冲突的记录，记下旧值后 UPDATE
+    3. 每周汇总表减去旧值、加上新值，并用写入的记录更新受影响学生的汇总行
+    4. 写入 (created / updated) 的记录带有幂等键时记入 survey_idempotency_keys (已有的键不会被覆盖)
+    返回: 与 records 一一对应的结果 created / updated / skipped / rejected
+    """
+    policy = policy or settings.SURVEY_CONFLICT_POLICY
+
+    outcomes = [None] * len(records)
+    to_write = {}  # (student_id, week_number) -> 最终写入的记录
+    first = {}     # (student_id, week_number) -> 首次出现的位置 (结果取决于数据库中是否已有记录)
+    for position, record in enumerate(records):
+        key = (record["student_id"], record["week_number"])
+        if key not in first:
+            first[key] = position
+        elif policy == "replace":
+            outcomes[position] = UPDATED
+        else:
+            outcomes[position] = SKIPPED if policy == "keep_first" else REJECTED
+            continue
+        to_write[key] = {name: value for name, value in record.items() if name != "idempotency_key"}
+
+    if not to_write:
+        return outcomes
+
+    table = models.WellbeingSurvey.__table__
+    stmt = upsert_insert(db, table)\
+        .on_conflict_do_nothing(index_elements=["student_id", "week_number"])\
+        .returning(table.c.student_id, table.c.week_number, table.c.id)
+    inserted = {(student_id, week): survey_id for student_id, week, survey_id in db.execute(stmt, list(to_write.values()))}
+    conflicts = [key for key in to_write if key not in inserted]
+
+    for key in to_write:
+        if key in inserted:
+            outcomes[first[key]] = CREATED
+        elif policy == "replace":
+            outcomes[first[key]] = UPDATED
+        else:
+            outcomes[first[key]] = SKIPPED if policy == "keep_first" else REJECTED
+
+    replaced = {}
+    if conflicts and policy == "replace":
+        replaced = _lock_surveys_by_student_weeks(db, conflicts)
+        db.execute(
+            update(table)
+            .where(table.c.student_id == bindparam("b_student_id"), table.c.week_number == bindparam("b_week_number"))
+            .values(
+                stress_level=bindparam("b_stress_level"),
+                hours_slept=bindparam("b_hours_slept"),
+                recorded_at=bindparam("b_recorded_at"),
+            ),
+            [{f"b_{name}": value for name, value in to_write[key].items()} for key in replaced],
+        )
+
+    survey_ids = {**inserted, **{key: old["id"] for key, old in replaced.items()}}
+    written = [{**to_write[key], "id": survey_id} for key, survey_id in survey_ids.items()]
+    wellbeing_rollups.apply_surveys(
+        db, written, [{"student_id": key[0], "week_number": key[1], **old} for key, old in replaced.items()]
+    )
+    student_summary.refresh_surveys(db, written)
+
+    keys = [
+        {"idempotency_key": record["idempotency_key"], "survey_id": survey_ids[(record["student_id"], record["week_number"])],
+         "created_at": record["recorded_at"]}
+        for record, outcome in zip(records, outcomes)
+        if record.get("idempotency_key") and outcome in (CREATED, UPDATED)
+        and (record["student_id"], record["week_number"]) in survey_ids
+    ]
+    if keys:
+        db.execute(models.SurveyIdempotencyKey.__table__.insert(), keys)
+    return outcomes
+
+# 一次性把一组学号解析为 student.id
+def get_student_ids_by_numbers(db: Session, student_numbers) -> dict:
+    """
+    返回: {student_number: student_id}，不存在的学号不会出现在结果中
+    """
+    numbers = list(student_numbers)
+    mapping = {}
+    for start in range(0, len(numbers), STUDENT_LOOKUP_BATCH):
+        batch = numbers[start:start + STUDENT_LOOKUP_BATCH]
+        rows = db.query(models.Student.student_number, models.Student.id)\
+            .filter(models.Student.student_number.in_(batch))\
+            .all()
+        mapping.update(rows)
+    return mapping
+
+# 批量录入健康调查记录 (CSV 导入使用)
+def bulk_create_surveys(db: Session, df: pd.DataFrame, row_offset: int = 0, policy: Optional[str] = None):
+    """
+    集合式批量导入，替代逐行调用 create_survey:
+    1. 用 pandas 向量化校验各列 (非空、数值、整数)
+    2. 一次查询解析所有学号
+    3. 在单个事务内用 executemany 写入所有有效行 (同一学生同一周按 policy 处理)，并更新每周汇总表
+    row_offset: 当 df 只是文件的一部分时，用于计算错误信息中的行号
+    返回: (success_count, errors)，success_count 为新增和覆盖的行数
+    """
+    row_numbers = pd.Series(range(row_offset + 1, row_offset + 1 + len(df)), index=df.index)
+
+    # 1. 向量化校验
+    student_numbers = df['student_number'].astype('string').str.strip()
+    week = pd.to_numeric(df['week_number'], errors='coerce')
+    stress = pd.to_numeric(df['stress_level'], errors='coerce')
+    sleep = pd.to_numeric(df['hours_slept'], errors='coerce')
+
+    invalid = student_numbers.isna() | (student_numbers == '') \
+        | week.isna() | stress.isna() | sleep.isna() \
+        | (week % 1 != 0) | (stress % 1 != 0)
+    invalid = invalid.fillna(True).astype(bool)
+
+    # 2. 解析学号 -> student_id
+    id_map = get_student_ids_by_numbers(db, student_numbers[~invalid].unique().tolist())
+    student_ids = student_numbers.map(id_map)
+    missing = ~invalid & student_ids.isna()
+    valid = ~invalid & ~missing
+
+    # 只对出错的行逐条生成提示
+    row_errors = [(row_no, "Invalid or missing values.") for row_no in row_numbers[invalid].tolist()]
+    row_errors += [
+        (row_no, f"Student {number} not found.")
+        for row_no, number in zip(row_numbers[missing].tolist(), student_numbers[missing].tolist())
+    ]
+
+    # 3. 单事务 executemany 写入
+    recorded_at = datetime.datetime.utcnow()
+    records = [
+        {
+            "student_id": int(sid),
+            "week_number": int(w),
+            "stress_level": int(s),
+            "hours_slept": float(h),
+            "recorded_at": recorded_at,
+        }
+        for sid, w, s, h in zip(
+            student_ids[valid].tolist(),
+            week[valid].tolist(),
+            stress[valid].tolist(),
+            sleep[valid].tolist(),
+        )
+    ]
+    success_count = 0
+    if records:
+        outcomes = upsert_surveys(db, records, policy)
+        db.commit()
+        response_cache.bump(WELLBEING)
+
+        success_count = sum(outcome in (CREATED, UPDATED) for outcome in outcomes)
+        row_errors += [
+            (row_no, f"Survey for student {number} week {record['week_number']} already exists.")
+            for row_no, number, record, outcome in zip(
+                row_numbers[valid].tolist(), student_numbers[valid].tolist(), records, outcomes
+            )
+            if outcome == REJECTED
+        ]
+
+    # 按行号排序
+    row_errors.sort()
+    errors = [f"Row {row_no}: {message}" for row_no, message in row_errors]
+    return success_count, errors
+
+# 根据幂等键查找已录入的记录
+def get_survey_ids_by_idempotency_keys(db: Session, keys) -> dict:
+    """
+    返回: {idempotency_key: survey_id}，包括之后被其他请求覆盖过的记录的键
+    """
+    keys = list(keys)
+    mapping = {}
+    for start in range(0, len(keys), STUDENT_LOOKUP_BATCH):
+        batch = keys[start:start + STUDENT_LOOKUP_BATCH]
+        rows = db.query(models.SurveyIdempotencyKey.idempotency_key, models.SurveyIdempotencyKey.survey_id)\
+            .filter(models.SurveyIdempotencyKey.idempotency_key.in_(batch))\
+            .all()
+        mapping.update(rows)
+    return mapping
+
+# 批量录入健康调查记录 (JSON / NDJSON 批量接口使用)
+def create_surveys_batch(db: Session, items, policy: Optional[str] = None):
+    """
+    items: [(index, schemas.WellbeingSurveyBatchItem), ...]，index 为记录在请求中的位置
+    一次查询解析所有学号、一次查询已存在的幂等键，在单个事务中写入
+    幂等键已存在 (包括同一批次中重复出现) 的记录返回 duplicate，不会重复写入
+    同一学生同一周已有记录时按 policy 处理 (updated / skipped / reject 时为 error)
+    返回: [{index, status, id, error}, ...]
+    并发请求提交相同的幂等键时抛出 IntegrityError (整批回滚)
+    """
+    id_map = get_student_ids_by_numbers(db, {item.student_number for _, item in items})
+    existing = get_survey_ids_by_idempotency_keys(
+        db, {item.idempotency_key for _, item in items if item.idempotency_key}
+    )
+
+    results = []
+    records = []
+    new_results = []     # 与 records 一一对应
+    batch_keys = {}      # 本批次中首次出现的幂等键 -> records 中的位置
+    in_batch_duplicates = []
+    recorded_at = datetime.datetime.utcnow()
+    for index, item in items:
+        key = item.idempotency_key
+        if key in existing:
+            results.append({"index": index, "status": "duplicate", "id": existing[key]})
+            continue
+        if key in batch_keys:
+            result = {"index": index, "status": "duplicate"}
+            in_batch_duplicates.append((result, batch_keys[key]))
+            results.append(result)
+            continue
+        student_id = id_map.get(item.student_number)
+        if student_id is None:
+            results.append({"index": index, "status": "error", "error": f"Student {item.student_number} not found."})
+            continue
+
+        if key:
+            batch_keys[key] = len(records)
+        records.append({
+            "student_id": student_id,
+            "week_number": item.week_number,
+            "stress_level": item.stress_level,
+            "hours_slept": item.hours_slept,
+            "recorded_at": recorded_at,
+            "idempotency_key": key,
+        })
+        result = {"index": index}
+        new_results.append(result)
+        results.append(result)
+
+    if records:
+        outcomes = upsert_surveys(db, records, policy)
+        survey_ids = get_survey_ids_by_student_weeks(db, {(r["student_id"], r["week_number"]) for r in records})
+        for result, record, outcome in zip(new_results, records, outcomes):
+            if outcome == REJECTED:
+                result.update(status="error", error=f"Survey for week {record['week_number']} already exists.")
+            else:
+                result.update(status=outcome, id=survey_ids.get((record["student_id"], record["week_number"])))
+        for result, position in in_batch_duplicates:
+            result["id"] = new_results[position].get("id")
+
+        db.commit()
+        response_cache.bump(WELLBEING)
+
     return results
 
-# 获取处于“风险”状态的学生
-def get_at_risk_students(db: Session, stress_threshold: int = 4, sleep_threshold: float = 5.0):
+# 流式导入 CSV 文件 (按分块读取 + 逐块提交)
+def import_surveys_csv(db: Session, source, chunksize: int = CSV_CHUNK_SIZE, on_progress=None,
+                       policy: Optional[str] = None):
     """
-    筛选规则: 压力 >= 4 OR 睡眠 < 5小时
-    仅返回最近一周的数据，或者所有历史高危数据
+    source: 文件对象 (例如 UploadFile.file)，按 chunksize 行分块读取，不会整体读入内存
+    on_progress: 可选回调，每个分块提交后以当前进度 dict 调用一次
+    policy: 同一学生同一周已有记录时的处理策略，重复导入同一文件 (replace / keep_first) 不会产生重复数据
+    列缺失时抛出 ValueError
+    返回: {processed_count, success_count, error_count, chunks, errors}
     """
-    # 查找所有符合风险阈值的记录，并关联出学生信息
-    risky_records = db.query(models.WellbeingSurvey)\
-        .join(models.Student)\
-        .filter(
-            (models.WellbeingSurvey.stress_level >= stress_threshold) | 
-            (models.WellbeingSurvey.hours_slept < sleep_threshold)
-        )\
-        .order_by(desc(models.WellbeingSurvey.week_number))\
+    progress = {
+        "processed_count": 0,
+        "success_count": 0,
+        "error_count": 0,
+        "chunks": 0,
+        "errors": [],
+    }
+
+    reader = pd.read_csv(source, dtype={'student_number': str}, chunksize=chunksize)
+    for chunk in reader:
+        if progress["chunks"] == 0 and not all(col in chunk.columns for col in SURVEY_CSV_COLUMNS):
+            raise ValueError(f"CSV must contain columns: {SURVEY_CSV_COLUMNS}")
+
+        # 每个分块在自己的事务中写入
+        success_count, errors = bulk_create_surveys(db, chunk, row_offset=progress["processed_count"], policy=policy)
+
+        progress["processed_count"] += len(chunk)
+        progress["success_count"] += success_count
+        progress["error_count"] += len(errors)
+        progress["chunks"] += 1
+        room = MAX_REPORTED_ERRORS - len(progress["errors"])
+        if room > 0:
+            progress["errors"].extend(errors[:room])
+
+        if on_progress:
+            on_progress(progress)
+
+    return progress
+
+# 获取每周的健康数据汇总 (用于趋势图)
+def get_weekly_analytics(db: Session, course_id: Optional[int] = None):
+    """
+    直接读取增量维护的每周汇总表，只需读取 O(周数) 行
+    course_id: 只统计选修该课程的学生，为空时统计全体学生
+    返回: List of WellbeingWeeklyRollup (按周排序)
+    """
+    return db.query(models.WellbeingWeeklyRollup)\
+        .filter(models.WellbeingWeeklyRollup.course_id == (course_id or wellbeing_rollups.ALL_STUDENTS),
+                models.WellbeingWeeklyRollup.survey_count > 0)\
+        .order_by(models.WellbeingWeeklyRollup.week_number)\
         .all()
-        
-    return risky_records
+
+# 根据直方图计算每周的百分位数
+def get_weekly_percentiles(db: Session, percentiles, course_id: Optional[int] = None):
+    """
+    返回: {week_number: {"stress": {p: value}, "sleep": {p: value}}}
+    压力为精确值；睡眠为所在 0.5 小时桶的下界
+    """
+    histogram = models.WellbeingWeeklyHistogram
+    rows = db.query(histogram.week_number, histogram.metric, histogram.bucket, histogram.count)\
+        .filter(histogram.course_id == (course_id or wellbeing_rollups.ALL_STUDENTS), histogram.count > 0)\
+        .order_by(histogram.week_number, histogram.metric, histogram.bucket)\
+        .all()
+
+    buckets = {}
+    for week, metric, bucket, count in rows:
+        buckets.setdefault(week, {}).setdefault(metric, []).append((bucket, count))
+
+    return {
+        week: {
+            metric: {p: wellbeing_rollups.percentile(values, p) for p in percentiles}
+            for metric, values in metrics.items()
+        }
+        for week, metrics in buckets.items()
+    }
+
+# 获取处于“风险”状态的学生
+def get_at_risk_students(db: Session, stress_threshold: Optional[int] = None, sleep_threshold: Optional[float] = None,
+                         week_from: Optional[int] = None, week_to: Optional[int] = None,
+                         course_id: Optional[int] = None, trend_weeks: Optional[int] = None,
+                         after: Optional[tuple] = None, limit: Optional[int] = None):
+    """
+    只看每个学生最近一周 (周范围内) 的调查记录
+    筛选规则: wellbeing 风险规则 (指定 course_id 时用该课程的规则集，否则按学生所选每门课的规则集，
+    任一命中即列出，见 app/risk_rules.py)；
+    指定 stress_threshold / sleep_threshold 时改为 压力 >= stress_threshold OR 睡眠 < sleep_threshold
+    (未指定的一项取默认阈值)
+    trend_weeks=N 时，最近 N 周压力逐周上升 (stress_rising) 或睡眠逐周下降 (sleep_falling) 的学生也会列出
+    可按周范围、课程 (选修该课的学生) 过滤
+    整个计算在一条 SQL 中完成 (窗口函数)，按 (week_number, id) 倒序键集分页
+    不限周范围、不看趋势时直接读取学生汇总表中的最近一条记录
+    返回: (records, next_key)
+    """
+    if stress_threshold is None and sleep_threshold is None:
+        rules = risk_rules.get_rules(db)
+        if course_id is None:
+            def condition(columns, student_column):
+                return rules.student_condition(WELLBEING, columns, student_column)
+        else:
+            def condition(columns, student_column):
+                return rules.condition(WELLBEING, columns, course_id=course_id)
+    else:
+        compiled = risk_rules.compile_rules((
+            ("stress_level", ">=", risk_rules.DEFAULT_STRESS_THRESHOLD if stress_threshold is None else stress_threshold),
+            ("hours_slept", "<", risk_rules.DEFAULT_SLEEP_THRESHOLD if sleep_threshold is None else sleep_threshold),
+        ))
+
+        def condition(columns, student_column):
+            return compiled(columns)
+
+    if week_from is None and week_to is None and not trend_weeks:
+        return _get_latest_at_risk_students(db, condition, course_id, after, limit)
+
+    survey = models.WellbeingSurvey
+    by_student = dict(partition_by=survey.student_id)
+
+    # 第一层: 每个学生的记录从新到旧编号，并计算与上一周相比的变化量
+    ranked = db.query(
+        survey,
+        func.row_number().over(**by_student, order_by=(survey.week_number.desc(), survey.id.desc())).label("recency"),
+        (survey.stress_level - func.lag(survey.stress_level).over(**by_student, order_by=(survey.week_number, survey.id))).label("stress_delta"),
+        (survey.hours_slept - func.lag(survey.hours_slept).over(**by_student, order_by=(survey.week_number, survey.id))).label("sleep_delta"),
+    )
+    ranked = _filter_weeks(ranked, week_from, week_to)
+    if course_id is not None:
+        enrolled = db.query(models.student_courses.c.student_id)\
+            .filter(models.student_courses.c.course_id == course_id)
+        ranked = ranked.filter(survey.student_id.in_(enrolled))
+    ranked = ranked.subquery()
+
+    # 第二层: 统计最近 N 周内 (N-1 次变化) 上升 / 下降的次数
+    if trend_weeks:
+        in_window = ranked.c.recency < trend_weeks
+        rising = func.sum(case((in_window & (ranked.c.stress_delta > 0), 1), else_=0))\
+            .over(partition_by=ranked.c.student_id) == trend_weeks - 1
+        falling = func.sum(case((in_window & (ranked.c.sleep_delta < 0), 1), else_=0))\
+            .over(partition_by=ranked.c.student_id) == trend_weeks - 1
+    else:
+        rising = falling = literal(False)
+    flagged = select(
+        ranked,
+        rising.label("stress_rising"),
+        falling.label("sleep_falling"),
+    ).subquery()
+
+    # 外层: 只保留每个学生最新的一条，并关联出学生信息
+    latest = aliased(survey, flagged)
+    risk = condition({"stress_level": latest.stress_level, "hours_slept": latest.hours_slept}, latest.student_id)
+    if trend_weeks:
+        risk = risk | (flagged.c.stress_rising == True) | (flagged.c.sleep_falling == True)
+    query = db.query(latest, flagged.c.stress_rising, flagged.c.sleep_falling)\
+        .join(latest.student)\
+        .options(contains_eager(latest.student))\
+        .filter(flagged.c.recency == 1, risk)
+
+    rows, next_key = keyset_paginate(
+        query,
+        (latest.week_number, latest.id),
+        lambda row: (row[0].week_number, row[0].id),
+        after, limit, descending=True
+    )
+
+    # 趋势标记挂到记录上，供 WellbeingRiskOut 读取
+    records = []
+    for record, stress_rising, sleep_falling in rows:
+        record.stress_rising = bool(stress_rising)
+        record.sleep_falling = bool(sleep_falling)
+        records.append(record)
+    return records, next_key
+
+def _get_latest_at_risk_students(db: Session, condition, course_id: Optional[int],
+                                 after: Optional[tuple], limit: Optional[int]):
+    """
+    condition(columns, student_column): 预警条件
+    汇总表每个学生一行，按 (latest_week_number, latest_survey_id) 索引倒序扫描，取满一页即停止
+    """
+    survey, summary = models.WellbeingSurvey, models.StudentSummary
+    query = db.query(survey)\
+        .join(summary, summary.latest_survey_id == survey.id)\
+        .join(survey.student)\
+        .options(contains_eager(survey.student))\
+        .filter(condition({"stress_level": summary.latest_stress_level, "hours_slept": summary.latest_hours_slept},
+                          summary.student_id))
+    if course_id is not None:
+        enrolled = db.query(models.student_courses.c.student_id)\
+            .filter(models.student_courses.c.course_id == course_id)
+        query = query.filter(summary.student_id.in_(enrolled))
+
+    records, next_key = keyset_paginate(
+        query,
+        (summary.latest_week_number, summary.latest_survey_id),
+        lambda s: (s.week_number, s.id),
+        after, limit, descending=True
+    )
+    for record in records:
+        record.stress_rising = record.sleep_falling = False
+    return records, next_key
 
 # 根据学号查询
-def get_surveys_by_student_number(db: Session, student_number: str):
-    return db.query(models.WellbeingSurvey)\
+def get_surveys_by_student_number(db: Session, student_number: str,
+                                  week_from: Optional[int] = None, week_to: Optional[int] = None,
+                                  after: Optional[tuple] = None, limit: Optional[int] = None):
+    """
+    按 (week_number, id) 键集分页，返回: (surveys, next_key)
+    """
+    query = db.query(models.WellbeingSurvey)\
         .join(models.Student)\
-        .filter(models.Student.student_number == student_number)\
-        .order_by(models.WellbeingSurvey.week_number)\
-        .all()
\ No newline at end of file
+        .filter(models.Student.student_number == student_number)
+    query = _filter_weeks(query, week_from, week_to)
+
+    return keyset_paginate(
+        query,
+        (models.WellbeingSurvey.week_number, models.WellbeingSurvey.id),
+        lambda s: (s.week_number, s.id),
+        after, limit
+    )
+
+def _filter_weeks(query, week_from: Optional[int], week_to: Optional[int]):
+    if week_from is not None:
+        query = query.filter(models.WellbeingSurvey.week_number >= week_from)
+    if week_to is not None:
+        query = query.filter(models.WellbeingSurvey.week_number <= week_to)
+    return query
+
+# 调查记录导出查询 (由 app.exports 流式执行)
+def survey_export_query(course_id: Optional[int] = None,
+                        week_from: Optional[int] = None, week_to: Optional[int] = None):
+    """
+    course_id: 只导出选修该课程的学生 (与趋势接口的课程切片一致)
+    """
+    survey = models.WellbeingSurvey
+    query = select(
+        survey.id,
+        models.Student.student_number,
+        survey.week_number,
+        survey.stress_level,
+        survey.hours_slept,
+        survey.recorded_at,
+    ).join(models.Student, models.Student.id == survey.student_id)\
+        .order_by(survey.id)
+    if course_id is not None:
+        query = query.where(survey.student_id.in_(
+            select(models.student_courses.c.student_id).where(models.student_courses.c.course_id == course_id)
+        ))
+    return _filter_weeks(query, week_from, week_to)
+
+# --- CSV 后台导入任务 ---
+def create_import_job(db: Session, filename: str, user_id: int):
+    job = models.ImportJob(filename=filename, created_by=user_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_import_job(db: Session, job_id: int):
+    return db.query(models.ImportJob).filter(models.ImportJob.id == job_id).first()
+
+# 请求取消任务 (由后台线程在下一个分块提交后检查并停止)
+def request_import_cancel(db: Session, job: models.ImportJob):
+    job.cancel_requested = True
+    if job.status == models.ImportStatus.PENDING:
+        job.status = models.ImportStatus.CANCELLED
+        job.finished_at = datetime.datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+    return job
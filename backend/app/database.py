@@ -1,20 +1,143 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from app.config import get_settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./student_wellbeing.db"
+settings = get_settings()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# 支持的数据库 -> 对应方言的 INSERT (调查记录和汇总表的写入使用 INSERT ... ON CONFLICT)
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+# SQLite: 每个新连接建立时设置 PRAGMA
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        # WAL 模式下读操作不会被写事务 (例如 CSV 导入) 阻塞
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+
+def _pool_options(url) -> dict:
+    # SQLite 内存数据库使用单连接池，不支持连接池大小配置
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def build_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """
+    根据配置创建数据库引擎，连接池大小 / pre-ping 由配置决定:
+    - SQLite: 关闭线程检查，连接时设置 WAL / busy_timeout / mmap
+    - PostgreSQL: 直接使用连接池配置
+    其他数据库不支持 INSERT ... ON CONFLICT，启动时即抛出配置错误，而不是在写入调查记录时才失败
+    """
+    db_url = make_url(url)
+    if db_url.get_backend_name() not in UPSERT_INSERTS:
+        raise RuntimeError(
+            f"DATABASE_URL uses '{db_url.get_backend_name()}', which is not supported "
+            f"(supported: {', '.join(UPSERT_INSERTS)})"
+        )
+    if db_url.get_backend_name() == "sqlite":
+        db_engine = create_engine(
+            db_url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+            **_pool_options(db_url),
+        )
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+        return db_engine
+
+    return create_engine(db_url, **_pool_options(db_url))
+
+
+# 同步 URL 对应的异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def build_async_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """
+    创建异步引擎 (仅在 ASYNC_DB 开启时使用)，连接参数与同步引擎一致
+    """
+    async_url = make_url(url)
+    async_url = async_url.set(drivername=ASYNC_DRIVERS.get(async_url.get_backend_name(), async_url.drivername))
+
+    if async_url.get_backend_name() == "sqlite":
+        db_engine = create_async_engine(
+            async_url,
+            connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **_pool_options(async_url),
+        )
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        return db_engine
+
+    return create_async_engine(async_url, **_pool_options(async_url))
+
+
+engine = build_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = build_async_engine() if settings.ASYNC_DB else None
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+) if settings.ASYNC_DB else None
+
 Base = declarative_base()
 
+
+def upsert_insert(conn, table):
+    """
+    返回支持 on_conflict_do_update / on_conflict_do_nothing 的 INSERT 语句
+    conn: Session 或 Connection，根据其方言选择 SQLite / PostgreSQL 的实现 (其他数据库在 build_engine 中已被拒绝)
+    """
+    dialect = conn.dialect if hasattr(conn, "dialect") else conn.get_bind().dialect
+    return UPSERT_INSERTS[dialect.name](table)
+
+
 # 依赖项：获取数据库会话
-def get_db():
+# ASYNC_DB 开启时返回 AsyncSession，否则返回普通 Session；路由统一通过 run_db 调用 CRUD
+async def get_db():
+    if settings.ASYNC_DB:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    在请求的会话上执行同步 CRUD 函数 fn(db, *args, **kwargs):
+    - AsyncSession: 通过 run_sync 在异步驱动上执行，等待数据库时不占用线程
+    - Session: 放到线程池中执行 (与普通 def 路由的行为一致)
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
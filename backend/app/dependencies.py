@@ -2,17 +2,22 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, run_db
 from app import models
+from app.crud import crud_users
 from app.config import get_settings
+from app.response_cache import USERS, response_cache
+from app.user_cache import CachedUser, user_cache
 
 settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CachedUser:
     """
-    解码 JWT Token 并从数据库中查找当前用户。
+    解码 JWT Token 并查找当前用户。
+    用户身份按 (username, jti) 缓存，缓存命中时不查询数据库；
+    开启 TRUST_TOKEN_ROLE 时直接使用 Token 中签名过的角色。
     如果 Token 无效、过期或用户不存在，抛出 401 错误。
     """
     credentials_exception = HTTPException(
@@ -29,28 +34,49 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-            
-        # 可选: 获取角色 (虽然我们主要靠数据库查，但也可以校验 Token 里的角色)
-        # token_role: str = payload.get("role")
+
+        jti = payload.get("jti")
+        token_role = payload.get("role")
             
     except JWTError:
         # 如果 Token 过期或被篡改，decode 会抛出 JWTError
         raise credentials_exception
 
+    # 快速路径: 信任 Token 中的角色 (签名保证未被篡改)
+    # 没有 uid 的 Token 不能走这条路径 (例如导入任务需要记录创建者)
+    if settings.TRUST_TOKEN_ROLE and token_role:
+        uid = payload.get("uid")
+        if not isinstance(uid, int) or isinstance(uid, bool):
+            raise credentials_exception
+        try:
+            role = models.Role(token_role)
+        except ValueError:
+            raise credentials_exception
+        return CachedUser(id=uid, username=username, full_name=None, role=role)
+
+    # 缓存命中则直接返回 (用户在其他进程被修改后 USERS 版本号变化，不再命中)
+    await response_cache.sync_shared(db)
+    version = response_cache.shared_version(USERS)
+    cached = user_cache.get(username, jti, version)
+    if cached is not None:
+        return cached
+
     # 从数据库查找用户
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = await run_db(db, crud_users.get_user_by_username, username)
     
     if user is None:
         raise credentials_exception
-        
-    return user
 
-def require_course_director(current_user: models.User = Depends(get_current_user)):
+    cached = CachedUser.from_user(user)
+    user_cache.put(jti, cached, version)
+    return cached
+
+def require_course_director(current_user: CachedUser = Depends(get_current_user)):
     if current_user.role != models.Role.COURSE_DIRECTOR:
         raise HTTPException(status_code=403, detail="Access forbidden: Course Directors only")
     return current_user
 
-def require_wellbeing_officer(current_user: models.User = Depends(get_current_user)):
+def require_wellbeing_officer(current_user: CachedUser = Depends(get_current_user)):
     if current_user.role != models.Role.WELLBEING_OFFICER:
         raise HTTPException(status_code=403, detail="Access forbidden: Wellbeing Officers only")
     return current_user
\ No newline at end of file
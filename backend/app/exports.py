@@ -0,0 +1,158 @@
+"""
+流式数据导出 (CSV / NDJSON / Parquet)
+
+查询为 Core select (不创建 ORM 对象)，通过 yield_per 分批读取 (PostgreSQL 使用服务端游标)，
+每批编码后立即写入 StreamingResponse，内存占用与导出的总行数无关。
+Parquet 每批写成一个 row group，需要安装 pyarrow。
+
+导出使用独立的数据库连接: 响应体在路由函数返回之后才开始生成，不能依赖请求的 Session。
+"""
+import csv
+import datetime
+import enum
+import io
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, Float, Integer
+
+from app.database import engine
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 可选依赖
+    pyarrow = None
+
+# 每批读取和编码的行数
+EXPORT_BATCH = 5000
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _partitions(query):
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=EXPORT_BATCH).execute(query)
+        for rows in result.partitions():
+            yield rows
+
+
+def _converters(query) -> list:
+    """枚举输出值，时间输出 ISO 8601；其他类型原样输出"""
+    converters = []
+    for column in query.selected_columns:
+        enum_class = getattr(column.type, "enum_class", None)
+        if enum_class is not None and issubclass(enum_class, enum.Enum):
+            converters.append(lambda v: v.value if v is not None else None)
+        elif isinstance(column.type, DateTime):
+            converters.append(lambda v: v.isoformat() if v is not None else None)
+        else:
+            converters.append(None)
+    return converters
+
+
+def _convert(rows, converters) -> list:
+    if not any(converters):
+        return rows
+    return [
+        tuple(value if convert is None else convert(value) for value, convert in zip(row, converters))
+        for row in rows
+    ]
+
+
+def _csv_chunks(query):
+    converters = _converters(query)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(query.selected_columns.keys())
+    for rows in _partitions(query):
+        writer.writerows(_convert(rows, converters))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # 没有数据时也输出表头
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(query):
+    converters = _converters(query)
+    columns = list(query.selected_columns.keys())
+    for rows in _partitions(query):
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in _convert(rows, converters)).encode()
+
+
+def _arrow_type(column):
+    if isinstance(column.type, Integer):
+        return pyarrow.int64()
+    if isinstance(column.type, Float):
+        return pyarrow.float64()
+    if isinstance(column.type, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+class _ChunkSink(io.RawIOBase):
+    """ParquetWriter 的输出目标: 收集写入的字节，每写完一个 row group 取出一次"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_chunks(query):
+    schema = pyarrow.schema([(column.name, _arrow_type(column)) for column in query.selected_columns])
+    # 时间列直接交给 Arrow，只转换枚举
+    converters = [
+        convert if not isinstance(column.type, DateTime) else None
+        for convert, column in zip(_converters(query), query.selected_columns)
+    ]
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    try:
+        for rows in _partitions(query):
+            columns = list(zip(*_convert(rows, converters)))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "csv": _csv_chunks,
+    "ndjson": _ndjson_chunks,
+    "parquet": _parquet_chunks,
+}
+
+
+def streaming_response(query, fmt: str, name: str) -> StreamingResponse:
+    """
+    query: 带列标签的 Core select (列名即导出的字段名)
+    name: 下载文件名 (不含扩展名)
+    """
+    if fmt == "parquet" and pyarrow is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires the 'pyarrow' package")
+    filename = f"{name}_{datetime.date.today():%Y%m%d}.{fmt}"
+    return StreamingResponse(
+        ENCODERS[fmt](query),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,94 @@
+"""
+大列表响应的快速 JSON 序列化 (FAST_JSON=true 时启用，需要安装 orjson)
+
+默认路径: response_model 校验 ORM 对象 -> 序列化为 dict -> json.dumps
+快速路径: 按 schema 的字段直接取值组装成 dict (数据来自数据库，跳过重复校验)，
+          再由 orjson 一次性编码 (datetime / 枚举由 orjson 原生处理)
+
+对比两种路径的基准测试: python -m benchmarks.serialization
+"""
+import typing
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy import inspect as sa_inspect
+
+from app.config import get_settings
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+settings = get_settings()
+
+# 启动时 (导入本模块时) 即报配置错误，而不是在第一个请求时返回 500
+if settings.FAST_JSON and orjson is None:
+    raise RuntimeError("FAST_JSON=true requires the 'orjson' package (pip install orjson)")
+
+
+def enabled() -> bool:
+    return settings.FAST_JSON
+
+
+@lru_cache()
+def _field_plan(schema) -> tuple:
+    """
+    返回: ((字段名, 默认值, 嵌套 schema 或 None, 是否为列表), ...)
+    只处理本项目 schema 中出现的形式: X / List[X]
+    """
+    plan = []
+    for name, field in schema.model_fields.items():
+        annotation, many = field.annotation, False
+        if typing.get_origin(annotation) in (list, typing.List):
+            annotation, many = typing.get_args(annotation)[0], True
+        nested = annotation if isinstance(annotation, type) and issubclass(annotation, BaseModel) else None
+        default = None if field.is_required() else field.default
+        plan.append((name, default, nested, many))
+    return tuple(plan)
+
+
+def construct(schema, obj) -> dict:
+    """
+    按 schema 的字段从 dict / ORM 对象 / Row 取值，组装成可直接编码的 dict
+    数据来自数据库，不做校验 (也不创建 Pydantic 实例，这部分开销比编码本身还大)
+    嵌套 schema 递归组装，缺少的字段使用 schema 中的默认值
+    """
+    plan = _field_plan(schema)
+    if isinstance(obj, dict):
+        values = {name: obj.get(name, default) for name, default, _, _ in plan}
+    else:
+        values = {name: getattr(obj, name, default) for name, default, _, _ in plan}
+    for name, _, nested, many in plan:
+        value = values[name]
+        if nested is not None and value is not None:
+            values[name] = [construct(nested, v) for v in value] if many else construct(nested, value)
+    return values
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    # 没有 schema 的 ORM 对象: 输出所有列 (与 jsonable_encoder 的结果一致)
+    state = sa_inspect(obj, raiseerr=False)
+    if state is not None and getattr(state, "mapper", None) is not None:
+        return {attr.key: getattr(obj, attr.key) for attr in state.mapper.column_attrs}
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_response(content, schema=None, many: bool = True, headers: Optional[dict] = None) -> Response:
+    """
+    schema: 与路由的 response_model 对应的 Pydantic 模型 (many=True 时 content 为列表)
+    """
+    if schema is not None:
+        content = [construct(schema, item) for item in content] if many else construct(schema, content)
+    return FastJSONResponse(content=content, headers=headers)
@@ -0,0 +1,112 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app import models
+from app.config import get_settings
+from app.crud import crud_wellbeing
+from app.database import SessionLocal
+
+settings = get_settings()
+
+# 后台导入线程池: 上传请求只负责落盘和提交任务，不等待导入完成
+executor = ThreadPoolExecutor(max_workers=settings.IMPORT_WORKERS, thread_name_prefix="csv-import")
+
+
+class ImportCancelled(Exception):
+    """导入过程中检测到取消请求"""
+
+
+def save_upload(source) -> str:
+    """
+    把上传文件复制到独立的临时文件 (请求结束后 UploadFile 会被关闭)
+    按块复制，不会把整个文件读入内存；复制失败 (例如磁盘已满) 时删除不完整的文件
+    """
+    fd, path = tempfile.mkstemp(prefix="survey_import_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as target:
+            shutil.copyfileobj(source, target)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def fail_interrupted_jobs() -> int:
+    """
+    启动时调用: 上次进程退出时仍在排队或执行的任务不会再被执行 (线程池和临时文件都已不在)，
+    标记为 FAILED，避免一直停留在 PENDING / RUNNING
+    返回: 标记的任务数
+    """
+    db = SessionLocal()
+    try:
+        count = db.query(models.ImportJob)\
+            .filter(models.ImportJob.status.in_([models.ImportStatus.PENDING, models.ImportStatus.RUNNING]))\
+            .update({
+                "status": models.ImportStatus.FAILED,
+                "message": "Interrupted: the server stopped before the import finished",
+                "finished_at": datetime.datetime.utcnow(),
+            }, synchronize_session=False)
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def submit_import(job_id: int, path: str, policy: Optional[str] = None):
+    executor.submit(run_import_job, job_id, path, policy)
+
+
+def run_import_job(job_id: int, path: str, policy: Optional[str] = None):
+    """
+    在工作线程中执行导入，使用独立的数据库会话
+    每个分块提交后写回进度并检查取消标记；取消前已提交的分块会保留
+    policy: 同一学生同一周已有记录时的处理策略 (为空时取配置)
+    """
+    db = SessionLocal()
+    jobs = db.query(models.ImportJob).filter(models.ImportJob.id == job_id)
+
+    def on_progress(progress):
+        jobs.update({
+            "processed_count": progress["processed_count"],
+            "success_count": progress["success_count"],
+            "error_count": progress["error_count"],
+            "errors_json": json.dumps(progress["errors"]),
+        })
+        db.commit()
+        if jobs.with_entities(models.ImportJob.cancel_requested).scalar():
+            raise ImportCancelled()
+
+    try:
+        job = jobs.first()
+        # 任务在排队期间已被取消
+        if job is None or job.cancel_requested:
+            return
+
+        job.status = models.ImportStatus.RUNNING
+        job.started_at = datetime.datetime.utcnow()
+        db.commit()
+
+        try:
+            with open(path, "rb") as f:
+                crud_wellbeing.import_surveys_csv(db, f, on_progress=on_progress, policy=policy)
+            final_status, message = models.ImportStatus.COMPLETED, None
+        except ImportCancelled:
+            final_status, message = models.ImportStatus.CANCELLED, "Cancelled by user"
+        except Exception as e:
+            db.rollback()
+            final_status, message = models.ImportStatus.FAILED, str(e)
+
+        jobs.update({
+            "status": final_status,
+            "message": message,
+            "finished_at": datetime.datetime.utcnow(),
+        })
+        db.commit()
+    finally:
+        os.remove(path)
+        db.close()
@@ -0,0 +1,298 @@
+"""
+请求级性能指标
+
+- InstrumentationMiddleware: 统计每个请求的耗时，以及请求内执行的 SQL 语句数、数据库总耗时和最慢的一条语句，
+  通过 Server-Timing 响应头返回 (浏览器开发者工具可直接查看)
+- SQLAlchemy before/after_cursor_execute 事件: 为当前请求计数计时；
+  超过 SLOW_QUERY_MS 的语句写入慢查询日志 (附 EXPLAIN 结果)
+- metrics: 进程内汇总，GET /metrics 以 Prometheus 文本格式输出
+
+请求的统计对象放在 contextvar 中，run_in_threadpool / AsyncSession.run_sync 执行的查询同样能计入；
+后台导入线程不属于任何请求，只计入全局的查询耗时分布。
+每条语句的额外开销只是两次 perf_counter 和几次加法。
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from app.config import get_settings
+from app.response_cache import response_cache
+
+settings = get_settings()
+
+slow_query_logger = logging.getLogger("app.slow_query")
+if settings.SLOW_QUERY_LOG_FILE:
+    _handler = logging.FileHandler(settings.SLOW_QUERY_LOG_FILE)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.setLevel(logging.WARNING)
+
+# 直方图的桶上限 (秒)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# 没有匹配到路由的请求 (404 等) 统一使用的标签，避免任意路径产生无限多的时间序列
+UNMATCHED_ROUTE = "unmatched"
+
+# 慢查询日志中语句和参数的最大长度
+LOG_TEXT_LIMIT = 2000
+
+
+class RequestStats:
+    __slots__ = ("method", "path", "query_count", "db_seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement = None
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (
+            f'db;desc="{self.query_count} queries";dur={self.db_seconds * 1000:.2f}, '
+            f"db-slowest;dur={self.slowest_seconds * 1000:.2f}, "
+            f"total;dur={total_seconds * 1000:.2f}"
+        )
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """当前请求的统计 (不在请求内时为 None)"""
+    return _current.get()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for upper, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{upper}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class Metrics:
+    """进程内的指标汇总 (多进程部署时每个进程各自输出)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)                                  # (method, route, status) -> 次数
+        self.request_seconds = defaultdict(lambda: _Histogram(REQUEST_BUCKETS))  # (method, route)
+        self.request_queries = defaultdict(int)                           # (method, route) -> SQL 语句数
+        self.request_db_seconds = defaultdict(float)                      # (method, route) -> 数据库耗时
+        self.query_seconds = _Histogram(QUERY_BUCKETS)
+        self.slow_queries = 0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.request_seconds[key].observe(seconds)
+            self.request_queries[key] += stats.query_count
+            self.request_db_seconds[key] += stats.db_seconds
+
+    def observe_query(self, seconds: float, slow: bool):
+        with self._lock:
+            self.query_seconds.observe(seconds)
+            if slow:
+                self.slow_queries += 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total HTTP requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP http_request_duration_seconds Request latency.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), histogram in sorted(self.request_seconds.items()):
+                lines += histogram.render("http_request_duration_seconds", f'method="{method}",route="{route}"')
+
+            lines += [
+                "# HELP http_request_db_queries_total SQL statements executed while handling requests.",
+                "# TYPE http_request_db_queries_total counter",
+            ]
+            for (method, route), count in sorted(self.request_queries.items()):
+                lines.append(f'http_request_db_queries_total{{method="{method}",route="{route}"}} {count}')
+
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent in SQL statements while handling requests.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), seconds in sorted(self.request_db_seconds.items()):
+                lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {seconds}')
+
+            lines += [
+                "# HELP db_query_duration_seconds Duration of every SQL statement, including background jobs.",
+                "# TYPE db_query_duration_seconds histogram",
+            ]
+            lines += self.query_seconds.render("db_query_duration_seconds", "")
+            lines += [
+                "# HELP db_slow_queries_total SQL statements slower than SLOW_QUERY_MS.",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_queries}",
+            ]
+
+        cache = response_cache.metrics()
+        for name in ("hits", "misses", "not_modified"):
+            lines += [f"# TYPE response_cache_{name}_total counter", f"response_cache_{name}_total {cache[name]}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# --- SQLAlchemy 事件 ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 同一连接上的语句不会嵌套执行，保存一个开始时间即可 (出错时下一条语句会覆盖)
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+
+    stats = _current.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_seconds += elapsed
+        if elapsed > stats.slowest_seconds:
+            stats.slowest_seconds = elapsed
+            stats.slowest_statement = statement
+
+    slow = settings.SLOW_QUERY_MS > 0 and elapsed * 1000 >= settings.SLOW_QUERY_MS
+    metrics.observe_query(elapsed, slow)
+    if slow:
+        _log_slow_query(conn, statement, parameters, executemany, elapsed, stats)
+
+
+# 各数据库的执行计划语法
+EXPLAIN_PREFIX = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+}
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """
+    用刚执行成功的语句和参数取执行计划 (只处理查询语句)
+    直接使用 DBAPI 游标，不会再次触发执行事件
+    """
+    prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" | ".join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed, stats):
+    plan = None if executemany or not settings.SLOW_QUERY_EXPLAIN else _explain(conn, statement, parameters)
+    where = f"{stats.method} {stats.path}" if stats is not None else "background"
+    message = f"Slow query ({elapsed * 1000:.1f} ms) in {where}:\n{statement[:LOG_TEXT_LIMIT]}"
+    if not executemany:
+        message += f"\nParameters: {str(parameters)[:LOG_TEXT_LIMIT]}"
+    if plan:
+        message += f"\nPlan:\n{plan}"
+    slow_query_logger.warning(message)
+
+
+def install(engine):
+    """在引擎上注册计时事件 (异步引擎传入 async_engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- ASGI 中间件 ---
+
+def _route_label(scope) -> str:
+    """
+    使用路径模板作为标签 (例如 /wellbeing/students/{student_number}/history)
+    路由匹配后会写回 scope["route"]；部分 FastAPI 版本中通过 include_router 注册的路由只记录相对路径，
+    按段数从实际路径中补上前缀
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return UNMATCHED_ROUTE
+    parts = scope["path"].rstrip("/").split("/")
+    depth = len(template.rstrip("/").split("/"))
+    return "/".join(parts[:len(parts) - depth + 1]) + template
+
+
+class InstrumentationMiddleware:
+    """
+    纯 ASGI 中间件 (不缓冲响应体，流式响应不受影响)
+    Server-Timing 在响应开始时写入，只包含此前完成的查询
+    """
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope["method"], scope["path"])
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", stats.server_timing(time.perf_counter() - start)
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            metrics.observe_request(
+                scope["method"], _route_label(scope), status, time.perf_counter() - start, stats
+            )
@@ -1,11 +1,29 @@
-from fastapi import FastAPI
-from app.database import engine, Base
-from app.routers import auth, academic, wellbeing
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
+from app import import_jobs, instrumentation, student_summary
+from app.database import async_engine, engine, Base
+from app.routers import auth, academic, risk, wellbeing
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
+from app.migrations import run_migrations
+from app.pagination import NEXT_CURSOR_HEADER
+from app.dependencies import get_current_user
+from app.response_cache import response_cache
+from app.user_cache import CachedUser
 
 settings = get_settings()
 
+# 创建缺失的数据表 (例如新增的 import_jobs)，已存在的表不受影响
+Base.metadata.create_all(bind=engine)
+# 对已有数据库执行未应用的版本化迁移 (例如新增索引)
+run_migrations(engine)
+# 上次进程退出时未完成的 CSV 导入任务不会再执行，标记为失败
+import_jobs.fail_interrupted_jobs()
+
+# 定期修正学生汇总表中与原始数据不一致的行
+if settings.STUDENT_SUMMARY_RECONCILE_SECONDS > 0:
+    student_summary.start_reconciler(settings.STUDENT_SUMMARY_RECONCILE_SECONDS)
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="Assessment Project for PAI",
@@ -19,14 +37,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 让前端能读取分页游标响应头
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# 请求耗时 / SQL 语句数统计 (最后注册，位于最外层，计入 CORS 等中间件的耗时)
+if settings.METRICS_ENABLED:
+    instrumentation.install(engine)
+    if async_engine is not None:
+        instrumentation.install(async_engine.sync_engine)
+    app.add_middleware(instrumentation.InstrumentationMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+
 # 注册路由
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(academic.router, prefix="/academic", tags=["Academic (Director)"])
 app.include_router(wellbeing.router, prefix="/wellbeing", tags=["Wellbeing (Officer)"])
+app.include_router(risk.router, prefix="/risk", tags=["Cohort Risk"])
 
 @app.get("/")
 def read_root():
     return {"message": "System is running"}
 
+# 响应缓存的命中率等指标 (当前进程)
+@app.get("/cache/stats")
+def read_cache_stats(current_user: CachedUser = Depends(get_current_user)):
+    return response_cache.metrics()
+
+
+# Prometheus 指标 (当前进程)，不需要登录，部署时应只对监控网络开放
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        return PlainTextResponse(instrumentation.metrics.render(), media_type="text/plain; version=0.0.4")
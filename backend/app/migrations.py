@@ -0,0 +1,160 @@
+"""
+版本化的数据库迁移
+
+新数据库由 Base.metadata.create_all 直接建出最新结构；
+已有数据库通过这里按版本号依次升级，已执行的版本记录在 schema_migrations 表中。
+每个迁移都写成可重复执行的 (例如 checkfirst / IF NOT EXISTS)，
+这样对 create_all 刚建好的新库再跑一遍也不会出错。
+
+命令行执行: python -m app.migrations
+"""
+import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, func, inspect, select, text
+
+from app import models, risk_rules, student_summary, wellbeing_rollups
+from app.database import engine
+
+# 迁移记录表 (不放进 Base.metadata，避免和业务表混在一起)
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+
+def _build_wellbeing_rollups(conn):
+    for table in (models.WellbeingWeeklyRollup.__table__, models.WellbeingWeeklyHistogram.__table__):
+        table.create(conn, checkfirst=True)
+    wellbeing_rollups.rebuild(conn)
+
+
+def _build_student_summary(conn):
+    models.StudentSummary.__table__.create(conn, checkfirst=True)
+    student_summary.rebuild(conn)
+
+
+def _add_risk_rules(conn):
+    """规则表 + 与原来硬编码阈值相同的默认规则集 (学生汇总表不需要重算)"""
+    for table in (models.RiskRuleSet.__table__, models.RiskRule.__table__):
+        table.create(conn, checkfirst=True)
+    risk_rules.seed_defaults(conn)
+
+
+def _add_cache_versions(conn):
+    models.CacheVersion.__table__.create(conn, checkfirst=True)
+
+
+def _add_survey_idempotency_keys(conn):
+    """幂等键移到单独的表中 (覆盖记录时不再丢失原来的键)，复制已有的键"""
+    keys = models.SurveyIdempotencyKey.__table__
+    surveys = models.WellbeingSurvey.__table__
+    keys.create(conn, checkfirst=True)
+    conn.execute(keys.insert().from_select(
+        ["idempotency_key", "survey_id", "created_at"],
+        select(surveys.c.idempotency_key, surveys.c.id, surveys.c.recorded_at)
+        .where(surveys.c.idempotency_key.is_not(None)),
+    ))
+
+
+def _create_indexes(*names):
+    """
+    按名称创建模型中定义的索引
+    (明确列出名称: 后续迁移新增的索引可能依赖尚未添加的列或尚未清理的重复数据)
+    """
+    indexes = {index.name: index for table in models.Base.metadata.tables.values() for index in table.indexes}
+
+    def migrate(conn):
+        for name in names:
+            indexes[name].create(conn, checkfirst=True)
+    return migrate
+
+
+def _add_column(table, column):
+    def migrate(conn):
+        existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    return migrate
+
+
+def _add_survey_idempotency_key(conn):
+    _add_column(models.WellbeingSurvey.__table__, models.WellbeingSurvey.__table__.c.idempotency_key)(conn)
+    _create_indexes("ux_surveys_idempotency_key")(conn)
+
+
+def _dedupe_surveys(conn):
+    """
+    每个 (student_id, week_number) 只保留最新的一条 (id 最大，即最后一次上传的数据)，
+    然后建立唯一索引，并重算汇总表
+    """
+    surveys = models.WellbeingSurvey.__table__
+    latest = select(func.max(surveys.c.id)).group_by(surveys.c.student_id, surveys.c.week_number)
+    conn.execute(delete(surveys).where(surveys.c.id.not_in(latest)))
+
+    conn.execute(text("DROP INDEX IF EXISTS ix_surveys_student_week"))
+    _create_indexes("ux_surveys_student_week")(conn)
+    wellbeing_rollups.rebuild(conn)
+
+
+# (版本号, 说明, 迁移函数(conn))，按版本号递增追加，已发布的迁移不要修改
+MIGRATIONS = [
+    (1, "Add composite indexes for dashboard and alert queries", _create_indexes(
+        "ix_student_courses_course_student",
+        "ix_grades_course_score",
+        "ix_grades_student_score",
+        "ix_grades_student_submission",
+        "ix_attendances_course_status",
+        "ix_attendances_student_date",
+        "ix_surveys_week_stress_sleep",
+        # (student_id, week_number) 索引在迁移 4 清理重复数据后以唯一索引创建
+        "ix_surveys_stress",
+        "ix_surveys_sleep",
+    )),
+    (2, "Build weekly wellbeing rollups from existing surveys", _build_wellbeing_rollups),
+    (3, "Add idempotency keys to wellbeing surveys", _add_survey_idempotency_key),
+    (4, "Remove duplicate weekly surveys and make (student, week) unique", _dedupe_surveys),
+    (5, "Build per-student summary table from existing data", _build_student_summary),
+    (6, "Add configurable risk rules with the previous thresholds as defaults", _add_risk_rules),
+    (7, "Add shared response cache versions for out-of-process data loads", _add_cache_versions),
+    (8, "Keep every survey idempotency key in its own table", _add_survey_idempotency_keys),
+]
+
+
+def get_schema_version(conn) -> int:
+    versions = conn.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def run_migrations(bind=engine) -> list:
+    """
+    执行所有未应用的迁移，每个版本在自己的事务中执行
+    返回: 本次应用的版本号列表
+    """
+    migration_metadata.create_all(bind=bind)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        with bind.begin() as conn:
+            if version <= get_schema_version(conn):
+                continue
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.datetime.utcnow(),
+            ))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    applied = run_migrations()
+    if applied:
+        print(f"Applied migrations: {applied}")
+    else:
+        print("Database schema is up to date.")
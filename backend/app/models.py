@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Boolean, Table, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Boolean, Table, Text, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from app.database import Base
 import datetime
 import enum
+import json
 
 # --- 枚举定义 ---
 class Role(str, enum.Enum):
@@ -14,12 +15,21 @@ class AttendanceStatus(str, enum.Enum):
     ABSENT = "absent"
     LATE = "late"
 
+class ImportStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
 # --- 1. 关联表: 学生选课 (多对多) ---
 student_courses = Table(
     'student_courses',
     Base.metadata,
     Column('student_id', Integer, ForeignKey('students.id'), primary_key=True),
-    Column('course_id', Integer, ForeignKey('courses.id'), primary_key=True)
+    Column('course_id', Integer, ForeignKey('courses.id'), primary_key=True),
+    # 主键以 student_id 开头，按课程统计人数需要单独的索引
+    Index('ix_student_courses_course_student', 'course_id', 'student_id')
 )
 
 # --- 2. 系统用户表 (仅限工作人员) ---
@@ -78,6 +88,16 @@ class Grade(Base):
     student = relationship("Student", back_populates="grades")
     course = relationship("Course", back_populates="grades")
 
+    # 索引按实际查询设计:
+    # 课程平均分 / 课程成绩列表 -> (course_id, score)
+    # 学生挂科聚合 (预警名单) -> (student_id, score) 覆盖索引
+    # 学生成绩单按提交时间排序 -> (student_id, submission_date)
+    __table_args__ = (
+        Index('ix_grades_course_score', 'course_id', 'score'),
+        Index('ix_grades_student_score', 'student_id', 'score'),
+        Index('ix_grades_student_submission', 'student_id', 'submission_date'),
+    )
+
 # --- 6. 出勤表 (Attendance) - 学术数据 ---
 class Attendance(Base):
     __tablename__ = "attendances"
@@ -92,6 +112,13 @@ class Attendance(Base):
     student = relationship("Student", back_populates="attendances")
     course = relationship("Course", back_populates="attendances")
 
+    # 课程出勤率 (按状态条件聚合) -> (course_id, status)
+    # 学生出勤记录按日期排序 -> (student_id, date)
+    __table_args__ = (
+        Index('ix_attendances_course_status', 'course_id', 'status'),
+        Index('ix_attendances_student_date', 'student_id', 'date'),
+    )
+
 # --- 7. 健康调查表 (Wellbeing) - 敏感数据 ---
 # 只有 Wellbeing Officer 能访问此表
 class WellbeingSurvey(Base):
@@ -104,5 +131,147 @@ class WellbeingSurvey(Base):
     stress_level = Column(Integer)
     hours_slept = Column(Float)
     recorded_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # 迁移 8 之前的幂等键 (已复制到 survey_idempotency_keys，不再写入)
+    idempotency_key = Column(String, nullable=True)
     
-    student = relationship("Student", back_populates="surveys")
\ No newline at end of file
+    student = relationship("Student", back_populates="surveys")
+
+    # 每周趋势 (GROUP BY week_number 求平均) -> 覆盖索引 (week_number, stress_level, hours_slept)
+    # 学生历史 / 最近一周 -> (student_id, week_number)，同时保证每个学生每周只有一条记录
+    # 风险筛选 stress >= x OR sleep < y -> 两个单列索引 (OR 条件可分别走索引)
+    __table_args__ = (
+        Index('ix_surveys_week_stress_sleep', 'week_number', 'stress_level', 'hours_slept'),
+        Index('ux_surveys_student_week', 'student_id', 'week_number', unique=True),
+        Index('ix_surveys_stress', 'stress_level'),
+        Index('ix_surveys_sleep', 'hours_slept'),
+        Index('ux_surveys_idempotency_key', 'idempotency_key', unique=True),
+    )
+
+# --- 8. CSV 导入任务表 (后台导入) ---
+# 上传接口只创建任务并立即返回，实际导入在后台线程中执行
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String)
+    created_by = Column(Integer, ForeignKey("users.id"))
+
+    status = Column(SQLEnum(ImportStatus), default=ImportStatus.PENDING)
+    processed_count = Column(Integer, default=0)
+    success_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    errors_json = Column(Text, default="[]")  # 行级错误 (JSON 数组，条数有上限)
+    message = Column(String, nullable=True)   # 任务失败原因
+    cancel_requested = Column(Boolean, default=False)
+
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    @property
+    def errors(self):
+        return json.loads(self.errors_json or "[]")
+
+
+# --- 9. 每周健康数据汇总表 (趋势图使用) ---
+# 由写入路径 (create_survey / CSV 导入) 在同一事务内增量维护，见 app/wellbeing_rollups.py
+# course_id = 0 表示全体学生，其余为选修该课程的学生
+class WellbeingWeeklyRollup(Base):
+    __tablename__ = "wellbeing_weekly_rollups"
+
+    week_number = Column(Integer, primary_key=True)
+    course_id = Column(Integer, primary_key=True)
+
+    survey_count = Column(Integer, default=0)
+    stress_sum = Column(Float, default=0)
+    stress_sumsq = Column(Float, default=0)   # 平方和，用于计算方差
+    stress_min = Column(Float)
+    stress_max = Column(Float)
+    sleep_sum = Column(Float, default=0)
+    sleep_sumsq = Column(Float, default=0)
+    sleep_min = Column(Float)
+    sleep_max = Column(Float)
+
+# --- 10. 每周健康数据直方图 (计算百分位数) ---
+# metric: 'stress' 按压力值分桶；'sleep' 按 0.5 小时分桶 (bucket 为桶的下界)
+class WellbeingWeeklyHistogram(Base):
+    __tablename__ = "wellbeing_weekly_histograms"
+
+    week_number = Column(Integer, primary_key=True)
+    course_id = Column(Integer, primary_key=True)
+    metric = Column(String, primary_key=True)
+    bucket = Column(Float, primary_key=True)
+    count = Column(Integer, default=0)
+
+# --- 11. 每个学生的汇总数据 (预警名单 / 风险评分使用) ---
+# 由调查写入路径在同一事务内按学生刷新，并由定期对账修正，见 app/student_summary.py
+# fail_count 按当前的学术风险规则统计 (规则修改后整表重算，见 app/risk_rules.py)
+class StudentSummary(Base):
+    __tablename__ = "student_summary"
+
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+
+    grade_count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0)
+    fail_count = Column(Integer, default=0)
+    attendance_count = Column(Integer, default=0)
+    present_count = Column(Integer, default=0)
+
+    # 最近一周的调查记录 (没有调查时为 NULL)
+    latest_survey_id = Column(Integer, nullable=True)
+    latest_week_number = Column(Integer, nullable=True)
+    latest_stress_level = Column(Integer, nullable=True)
+    latest_hours_slept = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index('ix_student_summary_fail_count', 'fail_count', 'student_id'),
+        Index('ix_student_summary_latest_week', 'latest_week_number', 'latest_survey_id'),
+    )
+
+# --- 12. 风险规则 (预警名单的判定条件，可通过 /risk/rules 接口修改) ---
+# domain: academic 判定每条成绩是否不及格; wellbeing 判定学生最近一周的调查是否触发预警
+# course_id 为空的是该领域的默认规则集，其余只作用于该课程；同一规则集内的条件为 OR 关系
+class RiskRuleSet(Base):
+    __tablename__ = "risk_rule_sets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    domain = Column(String, nullable=False)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=True)
+    description = Column(String, nullable=True)
+    version = Column(Integer, default=1)     # 每次修改加 1
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    rules = relationship("RiskRule", back_populates="rule_set", cascade="all, delete-orphan", order_by="RiskRule.id")
+
+    __table_args__ = (
+        Index('ix_risk_rule_sets_domain_course', 'domain', 'course_id'),
+    )
+
+class RiskRule(Base):
+    __tablename__ = "risk_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rule_set_id = Column(Integer, ForeignKey("risk_rule_sets.id"), nullable=False)
+    metric = Column(String, nullable=False)      # 例如 score / stress_level / hours_slept
+    operator = Column(String, nullable=False)    # < <= > >=
+    threshold = Column(Float, nullable=False)
+
+    rule_set = relationship("RiskRuleSet", back_populates="rules")
+
+# --- 13. 响应缓存的共享版本号 ---
+# 在服务进程之外写入数据的脚本 (seed.py / datagen.py / 汇总表命令行) 在这里递增命名空间的版本号，
+# 服务进程的响应缓存定期读取，使用 memory 后端时也能感知进程外的数据变化
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    namespace = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# --- 14. 调查记录的幂等键 ---
+# 每个用过的键一行 (包括覆盖已有记录的修正)，重试旧请求时总能识别为 duplicate，不会把修正改回去
+class SurveyIdempotencyKey(Base):
+    __tablename__ = "survey_idempotency_keys"
+
+    idempotency_key = Column(String, primary_key=True)
+    survey_id = Column(Integer, ForeignKey("wellbeing_surveys.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
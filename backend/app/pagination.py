@@ -0,0 +1,106 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import tuple_
+
+from app import fast_json
+
+# 列表接口的默认 / 最大分页大小
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 下一页游标通过响应头返回，保持响应体仍然是列表 (前端无需改动)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+# 游标中每个值的类型对应排序列的类型 (浮点列也接受整数，可为空的列接受 null)
+CURSOR_TYPES = {
+    int: (int,),
+    float: (int, float),
+    str: (str,),
+    Optional[int]: (int, type(None)),
+    Optional[float]: (int, float, type(None)),
+    Optional[str]: (str, type(None)),
+}
+
+
+def decode_cursor(cursor: Optional[str], types: tuple) -> Optional[tuple]:
+    """
+    types: 各排序列的类型 (CURSOR_TYPES 的键)，例如 (Optional[float], int) 对应 (score, id)
+    游标由客户端传回，结构或类型不符时抛出 400，不会把任意值传给数据库驱动
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, list) or len(key) != len(types) or not all(
+        # bool 是 int 的子类，单独排除
+        isinstance(value, CURSOR_TYPES[expected]) and not isinstance(value, bool)
+        for value, expected in zip(key, types)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(key)
+
+
+def keyset_paginate(query, sort_columns, key_fn, after: Optional[tuple], limit: Optional[int], descending: bool = False):
+    """
+    键集 (keyset) 分页: 按 sort_columns 排序，只取排在游标 after 之后的 limit 条
+    sort_columns 必须能唯一确定顺序 (最后一列一般是主键)
+    limit 为 None 时返回游标之后的全部记录
+    返回: (rows, next_key)，没有下一页时 next_key 为 None
+    """
+    columns = tuple_(*sort_columns)
+    if after is not None:
+        query = query.filter(columns < tuple_(*after) if descending else columns > tuple_(*after))
+
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in sort_columns])
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, key_fn(rows[-1])
+
+
+def parse_fields(fields: Optional[str], allowed) -> Optional[set]:
+    """解析 fields=a,b,c 投影参数，包含未知字段时抛出 400"""
+    if not fields:
+        return None
+    selected = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = selected - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    return selected
+
+
+def page_response(response: Response, items, next_key: Optional[tuple], fields: Optional[set] = None, schema=None):
+    """
+    写入下一页游标；指定了 fields 时只返回这些字段 (绕过 response_model)
+    schema: 与路由的 response_model 对应的 Pydantic 模型，用于投影和 FAST_JSON 输出
+    """
+    headers = {NEXT_CURSOR_HEADER: encode_cursor(next_key)} if next_key is not None else {}
+    if fields is None:
+        if fast_json.enabled():
+            return fast_json.fast_response(items, schema, headers=headers)
+        response.headers.update(headers)
+        return items
+
+    if schema is not None:
+        items = [schema.model_validate(item).model_dump(include=fields) for item in items]
+    content = [
+        {k: v for k, v in item.items() if k in fields}
+        for item in jsonable_encoder(items)
+    ]
+    return JSONResponse(content=content, headers=headers)
@@ -0,0 +1,270 @@
+"""
+仪表盘接口的响应缓存
+
+缓存键 = 命名空间 + 版本号 + 角色 + 路径 + 查询参数，值为序列化好的 JSON 响应体。
+写入路径 (create_survey / CSV 导入 / 规则修改) 调用 bump() 递增命名空间的版本号，
+旧版本的条目不再被命中，随 LRU 淘汰或 TTL 过期自然清除。
+
+后端只使用 redis-py 客户端的 get / set / incr 子集:
+- memory (默认): 进程内 LRU，bump() 只对本进程生效
+- redis: 多个 worker 进程共享版本号和缓存条目
+
+在服务进程之外写入数据的脚本 (seed.py / datagen.py / 汇总表命令行) 在同一事务中调用 bump_shared()，
+递增数据库 cache_versions 表中的版本号。每个进程的有效版本号 = 后端计数器 + 该表中的版本号，
+表每隔 RESPONSE_CACHE_SHARED_VERSION_SECONDS 秒最多读取一次，两种后端都能在这个间隔内感知进程外的写入。
+
+respond() 在事件循环中执行: 读取 cache_versions 表通过 run_db 使用请求的会话，
+redis 后端的 get / set 放到线程池中执行，都不会阻塞事件循环。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from app import models
+from app.config import get_settings
+from app.database import engine, run_db, upsert_insert
+
+settings = get_settings()
+
+# 命名空间: 学术数据 (成绩 / 出勤)、健康数据 (调查) 与风险规则
+ACADEMIC = "academic"
+WELLBEING = "wellbeing"
+RISK_RULES = "risk_rules"
+# 用户 (角色 / 密码): 只使用 cache_versions 中的共享版本号，使各进程的已认证用户缓存 (user_cache) 失效
+USERS = "users"
+
+cache_versions = models.CacheVersion.__table__
+
+
+class LocalCache:
+    """
+    进程内 LRU + TTL 缓存，接口与 redis-py 客户端一致 (get / set / incr)
+    计数器单独保存，不参与 LRU 淘汰 (版本号被淘汰会导致旧条目重新命中)
+    """
+    # 所有操作都在内存中完成，可以直接在事件循环中调用
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            if name in self._counters:
+                return str(self._counters[name]).encode()
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[name]
+                return None
+            self._entries.move_to_end(name)
+            return value
+
+    def set(self, name: str, value: bytes, ex: Optional[int] = None):
+        with self._lock:
+            self._entries[name] = (time.monotonic() + ex if ex else None, value)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            return self._counters[name]
+
+
+def _build_backend():
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        backend = redis.Redis.from_url(settings.RESPONSE_CACHE_REDIS_URL)
+        backend.blocking = True  # 每次调用都是一次网络往返
+        return backend
+    return LocalCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+@lru_cache()
+def _type_adapter(response_model):
+    return TypeAdapter(response_model)
+
+
+def _serialize(result, response_model=None) -> bytes:
+    # 指定 response_model 时按模型输出 (与路由的 response_model 行为一致)
+    if response_model is not None:
+        adapter = _type_adapter(response_model)
+        return adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+    return json.dumps(jsonable_encoder(result)).encode()
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def bump_shared(conn, *namespaces: str):
+    """
+    进程外写入数据后调用 (conn 为写入数据的连接或会话，随其事务一起提交):
+    递增 cache_versions 表中的版本号，服务进程最迟 RESPONSE_CACHE_SHARED_VERSION_SECONDS 秒后使这些命名空间失效
+    """
+    stmt = upsert_insert(conn, cache_versions)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["namespace"], set_={"version": cache_versions.c.version + 1}
+    )
+    conn.execute(stmt, [{"namespace": namespace, "version": 1} for namespace in namespaces])
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl_seconds: int, enabled: bool = True, shared_version_seconds: float = 0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.shared_version_seconds = shared_version_seconds
+        self._shared_versions = {}
+        self._shared_read_at = None
+        self._stats = Counter()
+        self._lock = threading.Lock()
+
+    def _shared_stale(self) -> bool:
+        """距离上次读取 cache_versions 表已超过间隔"""
+        if not self.shared_version_seconds:
+            return False
+        with self._lock:
+            return self._shared_read_at is None \
+                or time.monotonic() - self._shared_read_at >= self.shared_version_seconds
+
+    def _refresh_shared(self, conn=None):
+        """读取 cache_versions 表 (conn: 调用方的连接或会话，为空时从连接池取一个连接)"""
+        now = time.monotonic()
+        query = select(cache_versions.c.namespace, cache_versions.c.version)
+        if conn is None:
+            with engine.connect() as own:
+                versions = dict(own.execute(query).all())
+        else:
+            versions = dict(conn.execute(query).all())
+        with self._lock:
+            self._shared_versions, self._shared_read_at = versions, now
+
+    async def sync_shared(self, db=None):
+        """读取间隔已到时，在 run_db (请求的会话) 或线程池中重新读取 cache_versions 表"""
+        if not self._shared_stale():
+            return
+        if db is not None:
+            await run_db(db, self._refresh_shared)
+        else:
+            await run_in_threadpool(self._refresh_shared)
+
+    def shared_version(self, namespace: str) -> int:
+        """上次读取到的共享版本号 (不访问数据库，先 await sync_shared())"""
+        with self._lock:
+            return self._shared_versions.get(namespace, 0)
+
+    def _shared_version(self, namespace: str, conn=None) -> int:
+        """cache_versions 表中的版本号 (按间隔读取，两次读取之间使用上次的结果)"""
+        if not self.shared_version_seconds:
+            return 0
+        if self._shared_stale():
+            self._refresh_shared(conn)
+        with self._lock:
+            return self._shared_versions.get(namespace, 0)
+
+    def version(self, namespace: str, conn=None) -> int:
+        """
+        当前版本号 (同步，可能查询数据库 / redis；conn 为调用方的连接或会话)
+        事件循环中不要直接调用，respond() 会先在线程池 / run_db 中完成这些读取
+        """
+        # 两部分都只增不减，和也只增不减
+        value = self.backend.get(f"version:{namespace}")
+        return (int(value) if value is not None else 0) + self._shared_version(namespace, conn)
+
+    def bump(self, *namespaces: str):
+        """数据写入后调用，使这些命名空间下的所有缓存条目失效"""
+        for namespace in namespaces:
+            self.backend.incr(f"version:{namespace}")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _make_key(self, request: Request, namespace, role: str) -> str:
+        # 依赖多个命名空间的响应 (例如综合风险评分) 使用所有版本号
+        namespaces = (namespace,) if isinstance(namespace, str) else tuple(namespace)
+        versions = ".".join(str(self.version(ns)) for ns in namespaces)
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"response:{'+'.join(namespaces)}:v{versions}:{role}:{request.url.path}?{params}"
+
+    async def _call(self, fn, *args, **kwargs):
+        """调用后端: 会阻塞的 (redis) 放到线程池中执行"""
+        if getattr(self.backend, "blocking", True):
+            return await run_in_threadpool(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    async def respond(self, request: Request, namespace, role: str, compute, response_model=None, db=None) -> Response:
+        """
+        namespace: 命名空间，或多个命名空间组成的元组 (任何一个变化都会失效)
+        db: 请求的会话 (Session 或 AsyncSession)，用于读取 cache_versions 表
+        命中缓存时直接返回保存的响应体；否则 await compute() 计算并写入缓存
+        响应带 ETag，请求的 If-None-Match 与之相同时返回 304
+        compute 中抛出的异常 (例如 404) 原样向上传递，不会被缓存
+        """
+        key = cached = None
+        if self.enabled:
+            await self.sync_shared(db)
+            key = await self._call(self._make_key, request, namespace, role)
+            cached = await self._call(self.backend.get, key)
+
+        if cached is not None:
+            self._count("hits")
+            etag, body = cached.split(b"\n", 1)
+            etag, cache_status = etag.decode(), "HIT"
+        else:
+            if key:
+                self._count("misses")
+            body = _serialize(await compute(), response_model)
+            etag, cache_status = f'"{hashlib.sha1(body).hexdigest()}"', "MISS"
+            if key:
+                await self._call(self.backend.set, key, etag.encode() + b"\n" + body, ex=self.ttl_seconds)
+
+        # 带认证信息的角色相关数据: 只允许浏览器私有缓存，且每次都要重新验证
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Cache": cache_status}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self._count("not_modified")
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        return {
+            "enabled": self.enabled,
+            "backend": settings.RESPONSE_CACHE_BACKEND,
+            "hits": stats.get("hits", 0),
+            "misses": stats.get("misses", 0),
+            "not_modified": stats.get("not_modified", 0),
+            "hit_rate": round(stats.get("hits", 0) / lookups, 4) if lookups else 0.0,
+            "versions": {ns: self.version(ns) for ns in (ACADEMIC, WELLBEING, RISK_RULES)},
+        }
+
+
+response_cache = ResponseCache(
+    _build_backend(), settings.RESPONSE_CACHE_TTL_SECONDS, settings.RESPONSE_CACHE_ENABLED,
+    settings.RESPONSE_CACHE_SHARED_VERSION_SECONDS,
+)
@@ -0,0 +1,165 @@
+"""
+可配置的风险规则 (预警名单的判定条件)
+
+规则集保存在 risk_rule_sets / risk_rules 表中，通过 /risk/rules 接口修改，每个规则集是若干条件的 OR:
+- academic: 判定每条成绩是否不及格 (指标 score)，有不及格成绩的学生进入学术预警名单
+- wellbeing: 判定学生最近一周的调查 (指标 stress_level / hours_slept)
+
+course_id 为空的是默认规则集，其余只作用于该课程:
+- 成绩按所属课程选择规则集，多个规则集在同一条查询中用 CASE course_id 分支求值
+- 健康预警指定课程时使用该课程的规则集；不指定课程时，选修多门课的学生按所选每门课的规则集判定，
+  任何一个规则集命中即进入名单 (OR)，没有专门规则集的课程和没有选课的学生使用默认规则集
+数据库中没有默认规则集时使用 DEFAULT_RULES (即原来硬编码的阈值)。
+
+规则集修改后递增 RISK_RULES 命名空间的版本号。加载并编译后的规则按版本号缓存在进程内，
+同一版本下生成过滤条件不查询数据库，开销与硬编码的阈值相同；
+memory 后端的版本号不在进程间共享，缓存最长保留 RESPONSE_CACHE_TTL_SECONDS。
+"""
+import datetime
+import operator
+import threading
+import time
+
+from sqlalchemy import and_, case, exists, or_, select
+
+from app import models
+from app.config import get_settings
+from app.response_cache import ACADEMIC, RISK_RULES, WELLBEING, response_cache
+
+settings = get_settings()
+
+# 默认及格线与健康预警阈值
+DEFAULT_PASS_MARK = 50.0
+DEFAULT_STRESS_THRESHOLD = 4
+DEFAULT_SLEEP_THRESHOLD = 5.0
+
+# 各领域可用的指标
+METRICS = {
+    ACADEMIC: ("score",),
+    WELLBEING: ("stress_level", "hours_slept"),
+}
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# 没有配置默认规则集时使用: {domain: ((metric, operator, threshold), ...)}
+DEFAULT_RULES = {
+    ACADEMIC: (("score", "<", DEFAULT_PASS_MARK),),
+    WELLBEING: (("stress_level", ">=", DEFAULT_STRESS_THRESHOLD), ("hours_slept", "<", DEFAULT_SLEEP_THRESHOLD)),
+}
+
+rule_sets = models.RiskRuleSet.__table__
+rules_table = models.RiskRule.__table__
+enrolments = models.student_courses
+
+_cache_lock = threading.Lock()
+_cached = None  # (版本号, 加载时间, CompiledRules)
+
+
+def compile_rules(rules):
+    """
+    ((metric, operator, threshold), ...) -> condition(columns)
+    columns: {metric: 列表达式}，同一组规则可以作用于不同的表 (原始调查 / 学生汇总表等)
+    """
+    compiled = [(metric, OPERATORS[op], threshold) for metric, op, threshold in rules]
+
+    def condition(columns):
+        return or_(*[compare(columns[metric], threshold) for metric, compare, threshold in compiled])
+    return condition
+
+
+class CompiledRules:
+    """某一版本的全部规则集"""
+
+    def __init__(self, definitions: dict):
+        # {(domain, course_id): ((metric, operator, threshold), ...)}，course_id 为 None 的是默认规则集
+        self.definitions = {**{(domain, None): rules for domain, rules in DEFAULT_RULES.items()}, **definitions}
+        self._conditions = {key: compile_rules(rules) for key, rules in self.definitions.items()}
+
+    def condition(self, domain: str, columns: dict, course_id=None):
+        """单个规则集 (该课程没有专门的规则集时使用默认规则集)"""
+        key = (domain, course_id) if (domain, course_id) in self._conditions else (domain, None)
+        return self._conditions[key](columns)
+
+    def course_condition(self, domain: str, columns: dict, course_column):
+        """
+        按每行的 course_column 选择规则集: CASE WHEN course_id = ... THEN ... ELSE 默认规则集 END
+        没有按课程的规则集时直接返回默认规则集的条件
+        """
+        overrides = sorted(course_id for d, course_id in self._conditions if d == domain and course_id is not None)
+        default = self.condition(domain, columns)
+        if not overrides:
+            return default
+        return case(
+            *[(course_column == course_id, self._conditions[(domain, course_id)](columns)) for course_id in overrides],
+            else_=default,
+        )
+
+    def student_condition(self, domain: str, columns: dict, student_column):
+        """
+        按学生选修的课程选择规则集: 每门课的规则集 (没有专门规则集的用默认规则集) 任一命中即为真
+        没有选课的学生使用默认规则集；用 EXISTS 查 student_courses (主键以 student_id 开头)
+        没有按课程的规则集时直接返回默认规则集的条件
+        """
+        overrides = sorted(course_id for d, course_id in self._conditions if d == domain and course_id is not None)
+        default = self.condition(domain, columns)
+        if not overrides:
+            return default
+
+        def enrolled(*criteria):
+            return exists().where(enrolments.c.student_id == student_column, *criteria)
+
+        # 有没有专门规则集的课程，或者没有选课
+        uses_default = or_(enrolled(enrolments.c.course_id.not_in(overrides)), ~enrolled())
+        return or_(
+            and_(default, uses_default),
+            *[and_(self._conditions[(domain, course_id)](columns), enrolled(enrolments.c.course_id == course_id))
+              for course_id in overrides],
+        )
+
+
+def load(conn) -> CompiledRules:
+    """从数据库读取全部规则集 (不使用缓存；conn 可以是 Connection 或 Session)"""
+    rows = conn.execute(
+        select(rule_sets.c.domain, rule_sets.c.course_id, rules_table.c.metric,
+               rules_table.c.operator, rules_table.c.threshold)
+        .join(rules_table, rules_table.c.rule_set_id == rule_sets.c.id)
+        .order_by(rule_sets.c.id, rules_table.c.id)
+    )
+    definitions = {}
+    for domain, course_id, metric, op, threshold in rows:
+        definitions.setdefault((domain, course_id), []).append((metric, op, threshold))
+    return CompiledRules({key: tuple(rules) for key, rules in definitions.items()})
+
+
+def get_rules(conn) -> CompiledRules:
+    """返回当前版本的规则，版本未变化时直接使用进程内编译好的结果"""
+    global _cached
+    version = response_cache.version(RISK_RULES, conn)
+    with _cache_lock:
+        if _cached is not None and _cached[0] == version \
+                and time.monotonic() - _cached[1] < settings.RESPONSE_CACHE_TTL_SECONDS:
+            return _cached[2]
+    compiled = load(conn)
+    with _cache_lock:
+        _cached = (version, time.monotonic(), compiled)
+    return compiled
+
+
+def seed_defaults(conn):
+    """为还没有默认规则集的领域写入 DEFAULT_RULES (迁移使用)"""
+    existing = set(conn.execute(select(rule_sets.c.domain).where(rule_sets.c.course_id.is_(None))).scalars())
+    for domain, rules in DEFAULT_RULES.items():
+        if domain in existing:
+            continue
+        rule_set_id = conn.execute(rule_sets.insert().values(
+            domain=domain, description="Default rules", version=1, updated_at=datetime.datetime.utcnow()
+        )).inserted_primary_key[0]
+        conn.execute(rules_table.insert(), [
+            {"rule_set_id": rule_set_id, "metric": metric, "operator": op, "threshold": threshold}
+            for metric, op, threshold in rules
+        ])
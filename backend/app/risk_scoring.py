@@ -0,0 +1,168 @@
+"""
+队列综合风险评分 (学术 + 健康)
+
+1. 一条 SQL 取出每个学生的充分统计量 (成绩、出勤来自学生汇总表，调查 GROUP BY 后与学生表左连接)
+2. 用 NumPy / pandas 向量化计算特征: 平均分、不及格次数、出勤率、压力随周次变化的斜率、平均睡眠不足
+3. 每项特征按阈值映射到 0~1，加权求和得到 0~100 的风险分，一次排序得到整个队列的排名
+
+没有数据的特征 (例如从未提交调查) 不计入风险。
+接口按领域评分: 课程主任只看到学术风险项，福利官只看到健康风险项，风险分只由该领域的风险项
+加权得到 (权重按领域内之和归一化)，不会从总分中推出另一领域的数据。
+每个领域的排名结果按该领域的数据版本缓存在进程内，写入路径递增版本号后下一次请求重新计算。
+
+基准测试: python -m benchmarks.risk_scoring
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.response_cache import ACADEMIC, WELLBEING, response_cache
+
+# 睡眠时长低于该值的部分计为睡眠不足 (小时)
+TARGET_SLEEP_HOURS = 7.0
+
+# 风险项: (领域, 特征列, 风险为 0 的取值, 风险为 1 的取值, 权重)，两个取值之间线性插值，权重之和为 1
+COMPONENTS = {
+    "score_risk": (ACADEMIC, "average_score", 70.0, 40.0, 0.25),
+    "fail_risk": (ACADEMIC, "fail_count", 0.0, 3.0, 0.25),
+    "attendance_risk": (ACADEMIC, "attendance_rate", 95.0, 60.0, 0.20),
+    "stress_trend_risk": (WELLBEING, "stress_slope", 0.0, 0.5, 0.15),
+    "sleep_risk": (WELLBEING, "sleep_deficit", 0.0, 2.0, 0.15),
+}
+
+# 各领域输出的特征列
+FEATURES = {
+    ACADEMIC: ["average_score", "fail_count", "attendance_rate"],
+    WELLBEING: ["stress_slope", "sleep_deficit", "survey_count"],
+}
+
+FEATURE_COLUMNS = ["average_score", "fail_count", "attendance_rate", "stress_slope", "sleep_deficit"]
+
+DOMAINS = (ACADEMIC, WELLBEING)
+
+_cache_lock = threading.Lock()
+_cached = {}  # {领域: (版本号, 排名后的 DataFrame)}
+
+
+def _statistics_query(domains=DOMAINS):
+    """
+    每个学生一行: 学生信息 + 充分统计量 (没有记录的为 NULL)，只取 domains 需要的列
+    成绩和出勤直接取学生汇总表，调查按学生 GROUP BY
+    """
+    summary, survey = models.StudentSummary, models.WellbeingSurvey
+
+    # 斜率 = (n·Σxy − Σx·Σy) / (n·Σx² − (Σx)²)，x 为周次，y 为压力值
+    week, stress = survey.week_number, survey.stress_level
+    survey_stats = select(
+        survey.student_id,
+        func.count().label("survey_count"),
+        func.sum(week).label("week_sum"),
+        func.sum(week * week).label("week_sumsq"),
+        func.sum(stress).label("stress_sum"),
+        func.sum(week * stress).label("week_stress_sum"),
+        func.sum(case(
+            (survey.hours_slept < TARGET_SLEEP_HOURS, TARGET_SLEEP_HOURS - survey.hours_slept), else_=0.0
+        )).label("sleep_deficit_sum"),
+    ).group_by(survey.student_id).subquery()
+
+    query = select(models.Student.id.label("student_id"), models.Student.student_number, models.Student.full_name)
+    if ACADEMIC in domains:
+        query = query.add_columns(
+            summary.grade_count, summary.score_sum, summary.fail_count,
+            summary.attendance_count, summary.present_count,
+        ).outerjoin(summary, summary.student_id == models.Student.id)
+    if WELLBEING in domains:
+        query = query.add_columns(
+            survey_stats.c.survey_count, survey_stats.c.week_sum, survey_stats.c.week_sumsq,
+            survey_stats.c.stress_sum, survey_stats.c.week_stress_sum, survey_stats.c.sleep_deficit_sum,
+        ).outerjoin(survey_stats, survey_stats.c.student_id == models.Student.id)
+    return query
+
+
+def load_statistics(db: Session, domains=DOMAINS) -> pd.DataFrame:
+    result = db.execute(_statistics_query(domains))
+    return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+
+def _ratio(numerator, denominator):
+    """分母为 0 (没有数据) 时返回 NaN"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def compute_features(stats: pd.DataFrame) -> pd.DataFrame:
+    """由充分统计量计算特征 (全部为整列运算)，只计算 stats 中有统计量的领域"""
+    s = stats.fillna({column: 0 for column in stats.columns if column not in ("student_number", "full_name")})
+    features = stats[["student_id", "student_number", "full_name"]].copy()
+    if "grade_count" in s:
+        features["average_score"] = _ratio(s["score_sum"], s["grade_count"])
+        features["fail_count"] = s["fail_count"].to_numpy(dtype=np.int64)
+        features["attendance_rate"] = _ratio(s["present_count"], s["attendance_count"]) * 100
+    if "survey_count" not in s:
+        return features
+
+    n = s["survey_count"].to_numpy(dtype=float)
+    week_sum = s["week_sum"].to_numpy(dtype=float)
+    # 少于两周的调查数据没有斜率
+    features["stress_slope"] = _ratio(
+        n * s["week_stress_sum"].to_numpy(dtype=float) - week_sum * s["stress_sum"].to_numpy(dtype=float),
+        n * s["week_sumsq"].to_numpy(dtype=float) - week_sum * week_sum,
+    )
+    features["sleep_deficit"] = _ratio(s["sleep_deficit_sum"], n)
+    features["survey_count"] = n.astype(np.int64)
+    return features
+
+
+def score_cohort(features: pd.DataFrame, domains=DOMAINS) -> pd.DataFrame:
+    """
+    计算 domains 的各风险项和总分，按风险分降序排名 (同分按 student_id)
+    权重按所选风险项之和归一化，只选一个领域时风险分同样为 0~100
+    返回新的 DataFrame: 增加 *_risk、risk_score、rank、percentile 列
+    """
+    components = {name: spec for name, spec in COMPONENTS.items() if spec[0] in domains}
+    weight_sum = sum(weight for _, _, _, _, weight in components.values())
+    scored = features.copy()
+    total = np.zeros(len(scored))
+    for name, (_, column, safe, risky, weight) in components.items():
+        values = scored[column].to_numpy(dtype=float)
+        risk = np.nan_to_num(np.clip((values - safe) / (risky - safe), 0.0, 1.0), nan=0.0)
+        scored[name] = risk
+        total += weight / weight_sum * risk
+    scored["risk_score"] = np.round(total * 100, 2)
+
+    scored = scored.sort_values(["risk_score", "student_id"], ascending=[False, True], kind="stable")
+    scored["rank"] = np.arange(1, len(scored) + 1)
+    # 百分位: 风险分不高于该学生的比例
+    scored["percentile"] = np.round(
+        scored["risk_score"].rank(method="max", pct=True).to_numpy() * 100, 1
+    ) if len(scored) else []
+    return scored.reset_index(drop=True)
+
+
+def get_ranked_cohort(db: Session, domain: str) -> pd.DataFrame:
+    """返回只按 domain 的风险项排名的整个队列，该领域数据版本未变化时直接使用进程内的结果"""
+    version = response_cache.version(domain, db)
+    with _cache_lock:
+        cached = _cached.get(domain)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    ranked = score_cohort(compute_features(load_statistics(db, (domain,))), (domain,))
+    with _cache_lock:
+        _cached[domain] = (version, ranked)
+    return ranked
+
+
+def to_records(ranked: pd.DataFrame, domain: str) -> list:
+    """DataFrame -> 接口输出的 dict 列表，只包含 domain 的特征和风险项 (NaN 输出为 null)"""
+    components = [name for name, spec in COMPONENTS.items() if spec[0] == domain]
+    ranked = ranked[["rank", "student_number", "full_name", "risk_score", "percentile", *FEATURES[domain], *components]]
+    ranked = ranked.round({column: 2 for column in FEATURE_COLUMNS if column in ranked} | {name: 3 for name in components})
+    frame = ranked.astype(object).where(ranked.notna(), None)
+    return frame.to_dict("records")
@@ -1,74 +1,123 @@
-from fastapi import APIRouter, Depends, HTTPException
+import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app import models, schemas
-from app.database import get_db
+from app import exports, fast_json, models, schemas
+from app.database import get_db, run_db
 from app.dependencies import get_current_user, require_course_director
 from app.crud import crud_academic
+from app.response_cache import ACADEMIC, response_cache
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, page_response, parse_fields
 
 router = APIRouter()
 
+# 批量学术档案接口每次最多查询的学号数量
+MAX_REPORT_BATCH = 5000
+
 @router.get("/courses", response_model=List[schemas.CourseOut]) # 需要在 schemas.py 定义 CourseOut
-def read_courses(
+async def read_courses(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_course_director)
 ):
     """
     获取主管负责的所有课程列表
     """
-    courses = crud_academic.get_all_courses(db)
+    courses = await run_db(db, crud_academic.get_all_courses)
     return courses
 
 @router.get("/courses/{course_id}/dashboard")
-def read_course_dashboard(
+async def read_course_dashboard(
     course_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_course_director)
 ):
     """
     获取某门课程的仪表盘数据 (平均分、出勤率)
     用于前端绘制图表
+    结果会被缓存，支持 If-None-Match (未变化时返回 304)
     """
-    course = crud_academic.get_course_by_id(db, course_id)
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-        
-    analytics = crud_academic.get_course_analytics(db, course_id)
-    
-    return {
-        "course_name": course.name,
-        "course_code": course.code,
-        "analytics": analytics
-    }
+    async def compute():
+        course = await run_db(db, crud_academic.get_course_by_id, course_id)
+        if not course:
+            raise HTTPException(status_code=404, detail="Course not found")
+
+        analytics = await run_db(db, crud_academic.get_course_analytics, course_id)
 
-@router.get("/courses/{course_id}/grades")
-def read_grades(
+        return {
+            "course_name": course.name,
+            "course_code": course.code,
+            "analytics": analytics
+        }
+
+    return await response_cache.respond(request, ACADEMIC, current_user.role.value, compute, db=db)
+
+@router.get("/dashboard/courses")
+async def read_all_course_dashboards(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_course_director)
+):
+    """
+    一次返回所有课程的仪表盘数据，前端无需为每门课单独请求
+    """
+    async def compute():
+        return await run_db(db, crud_academic.get_all_course_analytics)
+
+    return await response_cache.respond(request, ACADEMIC, current_user.role.value, compute, db=db)
+
+@router.get("/courses/{course_id}/grades", response_model=List[schemas.CourseGradeOut])
+async def read_grades(
     course_id: int,
+    response: Response,
+    min_score: Optional[float] = Query(None, ge=0, le=100),
+    max_score: Optional[float] = Query(None, ge=0, le=100),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_course_director)
 ):
     """
-    查看该课程所有学生的详细成绩单
+    查看该课程学生的详细成绩单，按分数从低到高排列
+    分页: 下一页游标在响应头 X-Next-Cursor 中，作为 cursor 参数传回；没有该响应头表示已到最后一页
+    fields=id,score 只返回指定字段
     """
-    grades = crud_academic.get_course_grades(db, course_id)
-    return grades
+    selected = parse_fields(fields, schemas.CourseGradeOut.model_fields)
+    grades, next_key = await run_db(
+        db, crud_academic.get_course_grades, course_id,
+        min_score=min_score, max_score=max_score,
+        after=decode_cursor(cursor, (Optional[float], int)), limit=limit
+    )
+    return page_response(response, grades, next_key, selected, schemas.CourseGradeOut)
 
 # 预警名单接口
 @router.get("/dashboard/alerts", response_model=List[schemas.AcademicRiskOut])
-def read_academic_alerts(
+async def read_academic_alerts(
+    request: Request,
+    pass_mark: Optional[float] = Query(None, ge=0, le=100),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_course_director)
 ):
     """
-    获取学术预警名单：只要有挂科记录的学生都会显示
+    获取学术预警名单：只要有按风险规则判定为不及格的成绩都会显示 (规则见 /risk/rules)
+    支持 limit/offset 分页；指定 pass_mark 时改为以低于该分数为不及格
+    结果会被缓存，支持 If-None-Match (未变化时返回 304)
     """
-    # 不再需要传递 threshold=50.0，逻辑已在 CRUD 内部写死为检测挂科
-    return crud_academic.get_academic_at_risk_students(db)
+    async def compute():
+        return await run_db(db, crud_academic.get_academic_at_risk_students, pass_mark=pass_mark, limit=limit, offset=offset)
+
+    return await response_cache.respond(
+        request, ACADEMIC, current_user.role.value, compute, List[schemas.AcademicRiskOut], db=db
+    )
 
 # 学生详情查询接口
 @router.get("/students/{student_number}/details", response_model=schemas.StudentAcademicReport)
-def read_student_details(
+async def read_student_details(
     student_number: str,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_course_director)
@@ -76,7 +125,60 @@ def read_student_details(
     """
     根据学号查询该学生的完整学术档案（所有课程成绩 + 出勤）
     """
-    report = crud_academic.get_student_academic_details(db, student_number)
+    report = await run_db(db, crud_academic.get_student_academic_details, student_number)
     if not report:
         raise HTTPException(status_code=404, detail="Student not found")
-    return report
\ No newline at end of file
+    if fast_json.enabled():
+        return fast_json.fast_response(report, schemas.StudentAcademicReport, many=False)
+    return report
+
+# 批量查询学生的学术档案
+@router.post("/students/details/batch", response_model=schemas.StudentAcademicReportBatch)
+async def read_student_details_batch(
+    payload: schemas.StudentReportBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_course_director)
+):
+    """
+    一次返回多名学生的学术档案 (用于导出整个队列)，按请求中的学号顺序排列
+    每批 900 名学生只需 3 条查询；不存在的学号列在 not_found 中
+    """
+    if len(payload.student_numbers) > MAX_REPORT_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_REPORT_BATCH} student numbers per request")
+
+    reports = await run_db(db, crud_academic.get_student_academic_reports, payload.student_numbers)
+    numbers = list(dict.fromkeys(payload.student_numbers))
+    result = {
+        "reports": [reports[n] for n in numbers if n in reports],
+        "not_found": [n for n in numbers if n not in reports],
+    }
+    if fast_json.enabled():
+        return fast_json.fast_response(result, schemas.StudentAcademicReportBatch, many=False)
+    return result
+
+# 流式导出成绩 (CSV / NDJSON / Parquet)
+@router.get("/export/grades")
+async def export_grades(
+    format: schemas.ExportFormat = "csv",
+    course_id: Optional[int] = None,
+    date_from: Optional[datetime.datetime] = None,
+    date_to: Optional[datetime.datetime] = None,
+    current_user: models.User = Depends(require_course_director)
+):
+    """
+    按 submission_date 过滤日期范围；数据分批读取、边读边写，适合导出整个队列
+    """
+    query = crud_academic.grade_export_query(course_id, date_from, date_to)
+    return exports.streaming_response(query, format, "grades")
+
+# 流式导出出勤记录
+@router.get("/export/attendance")
+async def export_attendance(
+    format: schemas.ExportFormat = "csv",
+    course_id: Optional[int] = None,
+    date_from: Optional[datetime.datetime] = None,
+    date_to: Optional[datetime.datetime] = None,
+    current_user: models.User = Depends(require_course_director)
+):
+    query = crud_academic.attendance_export_query(course_id, date_from, date_to)
+    return exports.streaming_response(query, format, "attendance")
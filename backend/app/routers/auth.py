@@ -4,7 +4,8 @@ from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app import models, schemas, security
-from app.database import get_db
+from app.database import get_db, run_db
+from app.crud import crud_users
 from app.config import get_settings
 
 router = APIRouter()
@@ -12,7 +13,7 @@ settings = get_settings()
 
 # 登录，输入用户名和密码，返回token
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
     db: Session = Depends(get_db)
 ):
@@ -23,22 +24,46 @@ def login_for_access_token(
     """
     
     # 查找用户
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
+    user = await run_db(db, crud_users.get_user_by_username, form_data.username)
     
     # 验证用户是否存在以及密码是否正确
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    # bcrypt 校验在独立的进程池中执行；队列已满或同一用户名正在校验时返回 429，进程池损坏且重建后仍失败时返回 503
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await security.verify_password_async(
+                form_data.username, form_data.password, user.hashed_password
+            )
+        except security.PasswordHashBusy:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts in progress, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        except security.PasswordHashUnavailable:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password verification is temporarily unavailable",
+                headers={"Retry-After": "1"},
+            )
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # 哈希参数已变更: 用本次登录的明文重新生成哈希并保存
+    if new_hash:
+        await run_db(db, crud_users.update_password_hash, user, new_hash)
+
     # 定义 Token 有效期
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     # 生成 Token
     access_token = security.create_access_token(
-        data={"sub": user.username, "role": user.role.value},
+        data={"sub": user.username, "role": user.role.value, "uid": user.id},
         expires_delta=access_token_expires
     )
     
@@ -0,0 +1,120 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+from typing import List, Optional, Union
+
+from app import models, risk_scoring, schemas
+from app.crud import crud_risk_rules
+from app.database import get_db, run_db
+from app.dependencies import get_current_user
+from app.response_cache import ACADEMIC, WELLBEING, response_cache
+from app.user_cache import CachedUser
+
+router = APIRouter()
+
+# 各角色可读的风险领域: 队列排名只输出该领域的特征和风险项，风险分也只由它们计算
+COHORT_DOMAINS = {
+    models.Role.COURSE_DIRECTOR: (ACADEMIC, schemas.AcademicCohortRiskOut),
+    models.Role.WELLBEING_OFFICER: (WELLBEING, schemas.WellbeingCohortRiskOut),
+}
+
+# 队列风险排名 (按角色: 学术或健康)
+@router.get("/cohort", response_model=List[Union[schemas.AcademicCohortRiskOut, schemas.WellbeingCohortRiskOut]])
+async def read_cohort_risk(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """
+    按风险分降序返回学生 (rank 为在整个队列中的名次)
+    课程主任: 平均分、不及格次数、出勤率加权得到的学术风险；福利官: 压力趋势和睡眠不足加权得到的健康风险
+    (见 app/risk_scoring.py)。不输出另一领域的数据，风险分也不包含另一领域的风险项
+    每个领域的评分结果和响应都会被缓存，该领域的数据变化后失效
+    """
+    if current_user.role not in COHORT_DOMAINS:
+        raise HTTPException(status_code=403, detail="Access forbidden: no readable risk components")
+    domain, schema = COHORT_DOMAINS[current_user.role]
+
+    async def compute():
+        ranked = await run_db(db, risk_scoring.get_ranked_cohort, domain)
+        return risk_scoring.to_records(ranked.iloc[offset:offset + limit], domain)
+
+    return await response_cache.respond(request, domain, current_user.role.value, compute, List[schema], db=db)
+
+
+# --- 风险规则 (预警名单的判定条件) ---
+
+# 修改各领域规则所需的角色
+RULE_EDITORS = {
+    ACADEMIC: models.Role.COURSE_DIRECTOR,
+    WELLBEING: models.Role.WELLBEING_OFFICER,
+}
+
+def _require_rule_editor(current_user: CachedUser, *domains: str):
+    for domain in domains:
+        if current_user.role != RULE_EDITORS[domain]:
+            raise HTTPException(status_code=403, detail=f"Access forbidden: cannot edit {domain} rules")
+
+async def _get_rule_set_or_404(db, rule_set_id: int):
+    rule_set = await run_db(db, crud_risk_rules.get_rule_set, rule_set_id)
+    if rule_set is None:
+        raise HTTPException(status_code=404, detail="Rule set not found")
+    return rule_set
+
+async def _save_rule_set(db, fn, *args):
+    try:
+        return await run_db(db, fn, *args)
+    except crud_risk_rules.InvalidRuleSetError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except crud_risk_rules.RuleSetConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/rules", response_model=List[schemas.RiskRuleSetOut])
+async def read_rule_sets(
+    domain: Optional[schemas.RiskRuleDomain] = None,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """
+    列出风险规则集 (course_id 为空的是该领域的默认规则集，没有时使用内置阈值)
+    academic: 成绩不及格的判定；wellbeing: 最近一周调查的预警判定
+    """
+    return await run_db(db, crud_risk_rules.get_rule_sets, domain)
+
+@router.post("/rules", response_model=schemas.RiskRuleSetOut, status_code=201)
+async def create_rule_set(
+    data: schemas.RiskRuleSetIn,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """
+    新建规则集 (academic 由课程主任、wellbeing 由福利官维护)
+    同一领域、同一课程只能有一个规则集 (409)；修改学术规则会重算学生汇总表中的不及格数
+    """
+    _require_rule_editor(current_user, data.domain)
+    return await _save_rule_set(db, crud_risk_rules.create_rule_set, data)
+
+@router.put("/rules/{rule_set_id}", response_model=schemas.RiskRuleSetOut)
+async def update_rule_set(
+    rule_set_id: int,
+    data: schemas.RiskRuleSetIn,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """整体替换规则集的条件，版本号加 1，预警名单和综合风险评分立即按新规则计算"""
+    rule_set = await _get_rule_set_or_404(db, rule_set_id)
+    _require_rule_editor(current_user, rule_set.domain, data.domain)
+    return await _save_rule_set(db, crud_risk_rules.update_rule_set, rule_set, data)
+
+@router.delete("/rules/{rule_set_id}", status_code=204)
+async def delete_rule_set(
+    rule_set_id: int,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """删除规则集: 课程规则集删除后该课程使用默认规则集，默认规则集删除后使用内置阈值"""
+    rule_set = await _get_rule_set_or_404(db, rule_set_id)
+    _require_rule_editor(current_user, rule_set.domain)
+    await run_db(db, crud_risk_rules.delete_rule_set, rule_set)
+    return Response(status_code=204)
@@ -1,133 +1,315 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import json
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
-import pandas as pd
-import io
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 
 from app import models, schemas
-from app.database import get_db
+from app.database import get_db, run_db
 # 引入权限依赖
 from app.dependencies import require_wellbeing_officer
 # 引入 CRUD
 from app.crud import crud_wellbeing
+from app import exports, import_jobs, wellbeing_rollups
+from app.response_cache import WELLBEING, response_cache
+from app.pagination import MAX_PAGE_SIZE, decode_cursor, page_response, parse_fields
 
 router = APIRouter()
 
+# 批量录入接口每次最多接收的记录数
+MAX_SURVEY_BATCH = 10000
+
 # --- 1. 获取仪表盘趋势数据 ---
 @router.get("/dashboard/trends")
-def read_wellbeing_trends(
+async def read_wellbeing_trends(
+    request: Request,
+    course_id: Optional[int] = None,
+    percentiles: Optional[str] = Query(None, description="例如 50,90"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_wellbeing_officer)
 ):
     """
     获取每周的平均压力和睡眠数据。
     前端可以用这个数据绘制 'Week 1-10' 的双折线图。
+    同时返回人数、方差、最小/最大值；course_id 只统计选修该课程的学生；
+    percentiles=50,90 额外返回各周的百分位数 (基于直方图)。
+    结果会被缓存，支持 If-None-Match (未变化时返回 304)。
     """
-    stats = crud_wellbeing.get_weekly_analytics(db)
-    
-    # 格式化返回数据以适配前端图表库
-    return [
-        {
-            "week": r.week_number,
-            "average_stress": round(r.avg_stress, 2),
-            "average_sleep": round(r.avg_sleep, 2)
-        }
-        for r in stats
-    ]
+    try:
+        requested = [float(p) for p in percentiles.split(",") if p.strip()] if percentiles else []
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma separated numbers")
+    if any(not 0 < p <= 100 for p in requested):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 100")
+
+    async def compute():
+        stats = await run_db(db, crud_wellbeing.get_weekly_analytics, course_id)
+        weekly_percentiles = await run_db(db, crud_wellbeing.get_weekly_percentiles, requested, course_id) if requested else {}
+
+        # 格式化返回数据以适配前端图表库
+        results = []
+        for r in stats:
+            item = {
+                "week": r.week_number,
+                "average_stress": round(r.stress_sum / r.survey_count, 2),
+                "average_sleep": round(r.sleep_sum / r.survey_count, 2),
+                "survey_count": r.survey_count,
+                "stress_variance": round(wellbeing_rollups.variance(r.stress_sum, r.stress_sumsq, r.survey_count), 4),
+                "sleep_variance": round(wellbeing_rollups.variance(r.sleep_sum, r.sleep_sumsq, r.survey_count), 4),
+                "stress_min": r.stress_min,
+                "stress_max": r.stress_max,
+                "sleep_min": r.sleep_min,
+                "sleep_max": r.sleep_max,
+            }
+            if requested:
+                item["percentiles"] = {
+                    f"p{p:g}": {metric: values[p] for metric, values in weekly_percentiles.get(r.week_number, {}).items()}
+                    for p in requested
+                }
+            results.append(item)
+        return results
+
+    return await response_cache.respond(request, WELLBEING, current_user.role.value, compute, db=db)
 
 # 获取风险预警名单
 @router.get("/dashboard/alerts", response_model=List[schemas.WellbeingRiskOut])
-def read_at_risk_students(
+async def read_at_risk_students(
+    response: Response,
+    stress_threshold: Optional[int] = Query(None, ge=1, le=10),
+    sleep_threshold: Optional[float] = Query(None, ge=0, le=24),
+    week_from: Optional[int] = Query(None, ge=1),
+    week_to: Optional[int] = Query(None, ge=1),
+    course_id: Optional[int] = None,
+    trend_weeks: Optional[int] = Query(None, ge=2, le=52),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_wellbeing_officer)
 ):
     """
-    获取最近触发 '高压力' 或 '低睡眠' 警报的学生名单。
+    获取最近一周触发 '高压力' 或 '低睡眠' 警报的学生名单 (每个学生一条，按周倒序)。
+    默认按 wellbeing 风险规则判定 (指定课程时使用该课程的规则集，否则学生所选任一课程的规则集命中即列出，见 /risk/rules)；
+    指定 stress_threshold / sleep_threshold 时改为 压力 >= stress_threshold 或 睡眠 < sleep_threshold。
+    可按周范围、课程过滤；指定 limit 时分页，方式同成绩单接口 (X-Next-Cursor)，不指定时返回全部。
+    trend_weeks=N: 同时标记最近 N 周压力持续上升或睡眠持续下降的学生。
     """
-    return crud_wellbeing.get_at_risk_students(db)
+    selected = parse_fields(fields, schemas.WellbeingRiskOut.model_fields)
+    records, next_key = await run_db(
+        db, crud_wellbeing.get_at_risk_students,
+        stress_threshold=stress_threshold, sleep_threshold=sleep_threshold,
+        week_from=week_from, week_to=week_to, course_id=course_id,
+        trend_weeks=trend_weeks, after=decode_cursor(cursor, (int, int)), limit=limit
+    )
+    return page_response(response, records, next_key, selected, schemas.WellbeingRiskOut)
 
 # 查询学生的调查数据
-@router.get("/students/{student_number}/history")
-def get_survey(
+@router.get("/students/{student_number}/history", response_model=List[schemas.WellbeingHistoryOut])
+async def get_survey(
     student_number : str,
+    response: Response,
+    week_from: Optional[int] = Query(None, ge=1),
+    week_to: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_wellbeing_officer)
 ):
     """
     福利官用excel表收集学生一周的数据,导出csv文件
     用csv文件导入到数据库中
+    按周顺序返回该学生的调查记录 (指定 limit 时分页)；周范围内没有记录时返回空列表
     """
-    result = crud_wellbeing.get_surveys_by_student_number(db, student_number)
-    if not result:
+    selected = parse_fields(fields, schemas.WellbeingHistoryOut.model_fields)
+    after = decode_cursor(cursor, (int, int))
+    result, next_key = await run_db(
+        db, crud_wellbeing.get_surveys_by_student_number, student_number,
+        week_from=week_from, week_to=week_to, after=after, limit=limit
+    )
+    if not result and after is None \
+            and not await run_db(db, crud_wellbeing.get_student_ids_by_numbers, [student_number]):
         raise HTTPException(status_code=404, detail="Student number not found")
-    return result
+    return page_response(response, result, next_key, selected, schemas.WellbeingHistoryOut)
+
+# 流式导出调查记录 (CSV / NDJSON / Parquet)
+@router.get("/export/surveys")
+async def export_surveys(
+    format: schemas.ExportFormat = "csv",
+    course_id: Optional[int] = None,
+    week_from: Optional[int] = Query(None, ge=1),
+    week_to: Optional[int] = Query(None, ge=1),
+    current_user: models.User = Depends(require_wellbeing_officer)
+):
+    """
+    course_id 只导出选修该课程的学生；数据分批读取、边读边写
+    """
+    query = crud_wellbeing.survey_export_query(course_id, week_from, week_to)
+    return exports.streaming_response(query, format, "surveys")
 
 # 录入新的调查数据
 @router.post("/surveys", response_model=schemas.WellbeingSurveyOut)
-def create_survey_entry(
+async def create_survey_entry(
     survey: schemas.WellbeingSurveyCreate,
+    on_conflict: Optional[schemas.SurveyConflictPolicy] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_wellbeing_officer)
 ):
     """
     福利官手动录入学生的一条调查结果
+    该学生这一周已有记录时按 on_conflict 处理 (默认取配置): replace 覆盖 / keep_first 保留原记录 / reject 返回 409
     """
-    result = crud_wellbeing.create_survey(db, survey)
+    try:
+        result = await run_db(db, crud_wellbeing.create_survey, survey, on_conflict)
+    except crud_wellbeing.SurveyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not result:
         raise HTTPException(status_code=404, detail="Student number not found")
     return result
 
-# CSV 批量导入
-@router.post("/upload_csv")
-def upload_surveys_csv(
+# 批量录入调查数据 (JSON 数组 或 NDJSON)
+@router.post("/surveys/batch", response_model=schemas.SurveyBatchResult)
+async def create_survey_batch(
+    request: Request,
+    on_conflict: Optional[schemas.SurveyConflictPolicy] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_wellbeing_officer)
+):
+    """
+    一次录入多条调查记录 (供自助终端和外部系统使用)
+    - Content-Type: application/json -> 请求体为 WellbeingSurveyBatchItem 数组
+    - Content-Type: application/x-ndjson -> 每行一条记录，按流读取
+    每条记录可带 idempotency_key，重试时相同的键不会重复插入 (返回 duplicate 及原记录 id)
+    同一学生同一周已有记录时按 on_conflict 处理 (updated / skipped / reject 时为 error)
+    所有有效记录在一个事务中插入；results 按请求中的顺序返回每条记录的结果
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        raw_items = []
+        async for item in _read_ndjson(request):
+            raw_items.append(item)
+            if len(raw_items) > MAX_SURVEY_BATCH:
+                break
+    else:
+        try:
+            raw_items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array")
+
+    if len(raw_items) > MAX_SURVEY_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SURVEY_BATCH} surveys per batch")
+
+    # 逐条校验，无效记录只影响自己
+    items, results = [], []
+    for index, raw in enumerate(raw_items):
+        if isinstance(raw, _InvalidLine):
+            results.append({"index": index, "status": "error", "error": "Invalid JSON."})
+            continue
+        try:
+            items.append((index, schemas.WellbeingSurveyBatchItem.model_validate(raw)))
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            results.append({"index": index, "status": "error", "error": f"{field}: {error['msg']}" if field else error["msg"]})
+
+    if items:
+        try:
+            results += await run_db(db, crud_wellbeing.create_surveys_batch, items, on_conflict)
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Conflicting concurrent batch with the same idempotency keys, please retry")
+    results.sort(key=lambda r: r["index"])
+
+    return {
+        "created_count": sum(r["status"] == "created" for r in results),
+        "updated_count": sum(r["status"] == "updated" for r in results),
+        "skipped_count": sum(r["status"] == "skipped" for r in results),
+        "duplicate_count": sum(r["status"] == "duplicate" for r in results),
+        "error_count": sum(r["status"] == "error" for r in results),
+        "results": results,
+    }
+
+class _InvalidLine:
+    """NDJSON 中无法解析的行 (占位，保持行号与结果对应)"""
+
+async def _read_ndjson(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_ndjson_line(line)
+    if buffer.strip():
+        yield _parse_ndjson_line(buffer)
+
+def _parse_ndjson_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return _InvalidLine()
+
+# CSV 批量导入 (后台任务)
+@router.post("/upload_csv", response_model=schemas.ImportJobOut, status_code=202)
+async def upload_surveys_csv(
     file: UploadFile = File(...),
+    on_conflict: Optional[schemas.SurveyConflictPolicy] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_wellbeing_officer)
 ):
     """
     允许 Welfare Officer 上传 CSV 文件批量导入数据。
     CSV 必须包含列: student_number, week_number, stress_level, hours_slept
+    上传后立即返回导入任务，导入在后台执行；
+    通过 GET /wellbeing/imports/{job_id} 查询进度、计数和错误。
+    同一学生同一周已有记录时按 on_conflict 处理，重复上传修正后的文件不会产生重复数据。
     """
     # 1. 验证文件格式
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Invalid file format. Please upload a CSV file.")
 
+    # 2. 先把上传内容转存到临时文件，成功后再创建任务记录 (转存失败时不会留下永远 PENDING 的任务)
+    path = await run_in_threadpool(import_jobs.save_upload, file.file)
     try:
-        # 2. 读取 CSV 内容
-        contents = file.file.read()
-        df = pd.read_csv(io.BytesIO(contents))
-        
-        # 3. 验证必要的列是否存在
-        required_columns = ['student_number', 'week_number', 'stress_level', 'hours_slept']
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(status_code=400, detail=f"CSV must contain columns: {required_columns}")
-
-        success_count = 0
-        errors = []
-
-        # 4. 遍历每一行并存入数据库
-        for index, row in df.iterrows():
-            # 构建 schema 对象
-            survey_data = schemas.WellbeingSurveyCreate(
-                student_number=str(row['student_number']), # 确保转为字符串
-                week_number=int(row['week_number']),
-                stress_level=int(row['stress_level']),
-                hours_slept=float(row['hours_slept'])
-            )
-            
-            # 调用之前的 CRUD 函数保存
-            result = crud_wellbeing.create_survey(db, survey_data)
-            
-            if result:
-                success_count += 1
-            else:
-                errors.append(f"Row {index+1}: Student {row['student_number']} not found.")
-
-        return {
-            "message": "Upload processed",
-            "success_count": success_count,
-            "errors": errors
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
\ No newline at end of file
+        job = await run_db(db, crud_wellbeing.create_import_job, file.filename, current_user.id)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    # 3. 交给后台线程池执行
+    import_jobs.submit_import(job.id, path, on_conflict)
+    return job
+
+# 查询导入任务的进度
+@router.get("/imports/{job_id}", response_model=schemas.ImportJobOut)
+async def read_import_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_wellbeing_officer)
+):
+    job = await run_db(db, crud_wellbeing.get_import_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+# 取消导入任务
+@router.post("/imports/{job_id}/cancel", response_model=schemas.ImportJobOut)
+async def cancel_import_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_wellbeing_officer)
+):
+    """
+    排队中的任务直接取消；执行中的任务在当前分块提交后停止 (已提交的分块会保留)
+    """
+    job = await run_db(db, crud_wellbeing.get_import_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job.status not in (models.ImportStatus.PENDING, models.ImportStatus.RUNNING):
+        raise HTTPException(status_code=409, detail="Import job already finished")
+    return await run_db(db, crud_wellbeing.request_import_cancel, job)
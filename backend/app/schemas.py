@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
 from datetime import datetime
 
 # --- Token Schemas ---
@@ -46,6 +46,10 @@ class GradeOut(BaseModel):
     class Config:
         from_attributes = True
 
+# 课程成绩单中的成绩 (包含课程 id)
+class CourseGradeOut(GradeOut):
+    course_id: int
+
 # 带有课程名称的成绩模型
 class GradeWithCourse(GradeOut):
     course_name: str
@@ -68,12 +72,45 @@ class StudentAcademicReport(BaseModel):
     grades: List[GradeWithCourse]
     attendances: List[AttendanceOut]
 
+# 批量查询学术报告 (队列导出)
+class StudentReportBatchRequest(BaseModel):
+    student_numbers: List[str]
+
+class StudentAcademicReportBatch(BaseModel):
+    reports: List[StudentAcademicReport]
+    not_found: List[str]
+
 # --- 新增：用于成绩预警的 Schema ---
 class AcademicRiskOut(BaseModel):
     student: StudentBasic
     average_score: float
     failed_courses_count: int
 
+# 队列风险评分 (每个角色只看到本领域的特征和风险项)，没有数据的特征为 null
+class CohortRiskBase(BaseModel):
+    rank: int
+    student_number: str
+    full_name: Optional[str] = None
+    risk_score: float
+    percentile: float
+
+# 课程主任: 学术风险 (平均分、不及格次数、出勤率)
+class AcademicCohortRiskOut(CohortRiskBase):
+    average_score: Optional[float] = None
+    fail_count: int
+    attendance_rate: Optional[float] = None
+    score_risk: float
+    fail_risk: float
+    attendance_risk: float
+
+# 福利官: 健康风险 (压力趋势、睡眠不足)
+class WellbeingCohortRiskOut(CohortRiskBase):
+    stress_slope: Optional[float] = None
+    sleep_deficit: Optional[float] = None
+    survey_count: int
+    stress_trend_risk: float
+    sleep_risk: float
+
 # 基础字段
 class WellbeingSurveyBase(BaseModel):
     week_number: int
@@ -84,6 +121,31 @@ class WellbeingSurveyBase(BaseModel):
 class WellbeingSurveyCreate(WellbeingSurveyBase):
     student_number: str
 
+# 批量录入的单条记录 (幂等键可选，重试时用同一个键不会重复插入)
+class WellbeingSurveyBatchItem(WellbeingSurveyCreate):
+    idempotency_key: Optional[str] = None
+
+# 同一学生同一周已有调查记录时的处理策略
+SurveyConflictPolicy = Literal["replace", "keep_first", "reject"]
+
+# 导出接口支持的格式 (parquet 需要安装 pyarrow)
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+
+# 批量录入中每条记录的结果 (status: created / updated / skipped / duplicate / error)
+class SurveyBatchItemResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class SurveyBatchResult(BaseModel):
+    created_count: int
+    updated_count: int
+    skipped_count: int
+    duplicate_count: int
+    error_count: int
+    results: List[SurveyBatchItemResult]
+
 # 返回给前端的字段 (输出)
 class WellbeingSurveyOut(WellbeingSurveyBase):
     id: int
@@ -92,7 +154,67 @@ class WellbeingSurveyOut(WellbeingSurveyBase):
     class Config:
         from_attributes = True
 
+# 学生调查历史中的记录 (包含学生 id)
+class WellbeingHistoryOut(WellbeingSurveyOut):
+    student_id: int
+
 # Risk Alert Schema (预警名单专用)
 class WellbeingRiskOut(WellbeingSurveyOut):
     # 继承自 SurveyOut，并增加 student 信息
-    student: StudentBasic
\ No newline at end of file
+    student: StudentBasic
+    # 最近 N 周压力逐周上升 / 睡眠逐周下降 (请求 trend_weeks 时才会计算)
+    stress_rising: bool = False
+    sleep_falling: bool = False
+
+# --- 风险规则 Schema ---
+RiskRuleDomain = Literal["academic", "wellbeing"]
+RiskRuleOperator = Literal["<", "<=", ">", ">="]
+
+# 一条条件: metric operator threshold (academic 可用 score; wellbeing 可用 stress_level / hours_slept)
+class RiskRuleIn(BaseModel):
+    metric: Literal["score", "stress_level", "hours_slept"]
+    operator: RiskRuleOperator
+    threshold: float
+
+class RiskRuleOut(RiskRuleIn):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+# 创建 / 替换规则集 (course_id 为空表示该领域的默认规则集，条件之间为 OR)
+class RiskRuleSetIn(BaseModel):
+    domain: RiskRuleDomain
+    course_id: Optional[int] = None
+    description: Optional[str] = None
+    rules: List[RiskRuleIn] = Field(min_length=1)
+
+class RiskRuleSetOut(BaseModel):
+    id: int
+    domain: str
+    course_id: Optional[int] = None
+    description: Optional[str] = None
+    version: int
+    updated_at: datetime
+    rules: List[RiskRuleOut]
+
+    class Config:
+        from_attributes = True
+
+# --- CSV 导入任务 Schema ---
+class ImportJobOut(BaseModel):
+    id: int
+    filename: str
+    status: str
+    processed_count: int
+    success_count: int
+    error_count: int
+    errors: List[str]
+    message: Optional[str] = None
+    cancel_requested: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,13 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import uuid
 from jose import jwt
 from passlib.context import CryptContext
 from app.config import get_settings
 
 settings = get_settings()
 
-# 密码哈希上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码哈希上下文 (修改 rounds 后，旧哈希会在用户下次登录时自动升级)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证明文密码是否与数据库中的哈希匹配"""
@@ -17,6 +24,102 @@ def get_password_hash(password: str) -> str:
     """生成密码哈希 (用于注册或重置密码)"""
     return pwd_context.hash(password)
 
+def _verify_and_update(plain_password: str, hashed_password: str):
+    # 在进程池中执行: 返回 (是否匹配, 需要升级时的新哈希)
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# --- 密码哈希进程池 ---
+# bcrypt 每次约几百毫秒 CPU，放到独立进程中执行，不占用请求线程池和事件循环
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending_count = 0        # 已提交但未完成的哈希任务数
+_inflight = {}            # (username, 密码摘要) -> 正在执行的校验 future
+_inflight_users = {}      # username -> 该用户正在执行的校验数
+
+
+class PasswordHashBusy(Exception):
+    """哈希队列已满，或同一用户名已有另一个密码在校验中 (路由返回 429)"""
+
+
+class PasswordHashUnavailable(Exception):
+    """进程池损坏 (工作进程被杀死或内存不足)，重建后重试仍然失败 (路由返回 503)"""
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+    with _executor_lock:
+        if _hash_executor is None:
+            # spawn: 避免 fork 带有事件循环和线程的服务进程
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _hash_executor
+
+
+def _discard_executor(broken: ProcessPoolExecutor):
+    """丢弃损坏的进程池，下一次提交时重建 (其他请求可能已经换上了新的进程池)"""
+    global _hash_executor
+    with _executor_lock:
+        if _hash_executor is broken:
+            _hash_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_hash_job(fn, *args):
+    # 进程池损坏时重建并重试一次
+    for attempt in range(2):
+        executor = _get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            _discard_executor(executor)
+    raise PasswordHashUnavailable()
+
+
+def _submit_hash_job(fn, *args) -> asyncio.Future:
+    global _pending_count
+    if _pending_count >= settings.PASSWORD_HASH_QUEUE_SIZE:
+        raise PasswordHashBusy()
+
+    future = asyncio.ensure_future(_run_hash_job(fn, *args))
+    _pending_count += 1
+
+    def _release(_):
+        global _pending_count
+        _pending_count -= 1
+    future.add_done_callback(_release)
+    return future
+
+
+async def verify_password_async(username: str, plain_password: str, hashed_password: str):
+    """
+    在进程池中校验密码，返回 (是否匹配, 新哈希或 None)
+    - 同一用户名 + 同一密码的并发请求 (重复点击、客户端重试) 共享同一次校验
+    - 同一用户名的其他密码在校验进行中时直接拒绝 (每个用户名同时只有一个校验)
+    - 队列已满时拒绝
+    以上拒绝都抛出 PasswordHashBusy；进程池重建后仍不可用时抛出 PasswordHashUnavailable
+    """
+    key = (username, hashlib.sha256(plain_password.encode()).hexdigest())
+    future = _inflight.get(key)
+    if future is None:
+        if _inflight_users.get(username):
+            raise PasswordHashBusy()
+
+        future = _submit_hash_job(_verify_and_update, plain_password, hashed_password)
+        _inflight[key] = future
+        _inflight_users[username] = 1
+
+        def _forget(_):
+            _inflight.pop(key, None)
+            _inflight_users.pop(username, None)
+        future.add_done_callback(_forget)
+
+    # shield: 某个请求被取消 (客户端断开) 时不影响共享同一校验的其他请求
+    return await asyncio.shield(future)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """生成 JWT Token"""
     to_encode = data.copy()
@@ -26,8 +129,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    # 将过期时间添加到 payload
-    to_encode.update({"exp": expire})
+    # 将过期时间和唯一 ID (jti, 用作用户缓存的 key) 添加到 payload
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     
     # 使用 SECRET_KEY 进行签名
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
@@ -0,0 +1,268 @@
+"""
+每个学生一行的汇总表 (预警名单和风险评分使用)
+
+student_summary 保存成绩数 / 总分 / 不及格数 (按当前的学术风险规则)、出勤数 / 到课数，以及最近一周的调查记录。
+预警接口只需按索引读取这张表，不必每次聚合 grades / attendances / wellbeing_surveys 全表。
+
+写入路径 (调查的创建、批量提交、CSV 导入) 在同一事务内调用 refresh_surveys 更新受影响学生的调查列，
+其他写入路径可调用 refresh 整行重算；
+没有经过这些路径的修改 (直接改库、导入成绩 / 出勤、删除学生) 由定期对账 reconcile 修正，
+间隔由 STUDENT_SUMMARY_RECONCILE_SECONDS 配置。
+学术风险规则修改后由 crud_risk_rules 在同一事务内调用 refresh (课程规则集，只重算该课程有成绩的学生) 或 rebuild (默认规则集)。
+PostgreSQL 上同样使用普通表: 物化视图只能整体刷新，无法按学生增量更新。
+
+命令行:
+    python -m app.student_summary rebuild     # 根据原始数据重建汇总表
+    python -m app.student_summary check       # 与原始数据的实时聚合结果对比
+    python -m app.student_summary reconcile   # 只修正不一致的行
+"""
+import logging
+import sys
+import threading
+
+from sqlalchemy import bindparam, case, delete, func, or_, select, update
+
+from app import models, risk_rules
+from app.database import engine
+from app.response_cache import ACADEMIC, WELLBEING, bump_shared, response_cache
+
+logger = logging.getLogger(__name__)
+
+# 每次 IN (...) 刷新的学生数量上限 (低于 SQLite 的绑定变量限制)
+STUDENT_BATCH = 900
+
+# 浮点累加结果的比较容差
+TOLERANCE = 1e-6
+
+summary = models.StudentSummary.__table__
+students = models.Student.__table__
+grades = models.Grade.__table__
+attendances = models.Attendance.__table__
+surveys = models.WellbeingSurvey.__table__
+
+STAT_COLUMNS = [
+    "grade_count", "score_sum", "fail_count", "attendance_count", "present_count",
+    "latest_survey_id", "latest_week_number", "latest_stress_level", "latest_hours_slept",
+]
+
+
+def _only(query, column, student_ids):
+    return query if student_ids is None else query.where(column.in_(student_ids))
+
+
+def _latest_surveys(student_ids=None):
+    """每个学生最近一周的调查 (同一周只有一条，id 作为兜底的排序)"""
+    ranked = _only(select(
+        surveys.c.student_id, surveys.c.id, surveys.c.week_number, surveys.c.stress_level, surveys.c.hours_slept,
+        func.row_number().over(
+            partition_by=surveys.c.student_id, order_by=(surveys.c.week_number.desc(), surveys.c.id.desc())
+        ).label("recency"),
+    ), surveys.c.student_id, student_ids).subquery()
+    return select(ranked).where(ranked.c.recency == 1).subquery()
+
+
+def _expected_query(rules: risk_rules.CompiledRules, student_ids=None):
+    """
+    根据原始数据计算汇总行 (每个学生一行，没有记录的计为 0 / NULL)
+    rules: 判定不及格的规则 (每条成绩按所属课程的规则集判定)
+    student_ids: 只计算这些学生；为空时计算全部
+    """
+    def only(query, column):
+        return _only(query, column, student_ids)
+
+    grade_stats = only(select(
+        grades.c.student_id,
+        func.count().label("grade_count"),
+        func.sum(grades.c.score).label("score_sum"),
+        func.sum(case(
+            (rules.course_condition(ACADEMIC, {"score": grades.c.score}, grades.c.course_id), 1), else_=0
+        )).label("fail_count"),
+    ), grades.c.student_id).group_by(grades.c.student_id).subquery()
+
+    attendance_stats = only(select(
+        attendances.c.student_id,
+        func.count().label("attendance_count"),
+        func.sum(case((attendances.c.status == models.AttendanceStatus.PRESENT, 1), else_=0)).label("present_count"),
+    ), attendances.c.student_id).group_by(attendances.c.student_id).subquery()
+
+    latest = _latest_surveys(student_ids)
+
+    return only(select(
+        students.c.id.label("student_id"),
+        func.coalesce(grade_stats.c.grade_count, 0).label("grade_count"),
+        func.coalesce(grade_stats.c.score_sum, 0.0).label("score_sum"),
+        func.coalesce(grade_stats.c.fail_count, 0).label("fail_count"),
+        func.coalesce(attendance_stats.c.attendance_count, 0).label("attendance_count"),
+        func.coalesce(attendance_stats.c.present_count, 0).label("present_count"),
+        latest.c.id.label("latest_survey_id"),
+        latest.c.week_number.label("latest_week_number"),
+        latest.c.stress_level.label("latest_stress_level"),
+        latest.c.hours_slept.label("latest_hours_slept"),
+    ), students.c.id)\
+        .outerjoin(grade_stats, grade_stats.c.student_id == students.c.id)\
+        .outerjoin(attendance_stats, attendance_stats.c.student_id == students.c.id)\
+        .outerjoin(latest, latest.c.student_id == students.c.id)
+
+
+def refresh(conn, student_ids, rules: risk_rules.CompiledRules = None):
+    """
+    重算这些学生的汇总行 (不提交，由调用方的事务一起提交)
+    已删除的学生对应的行同时被删除
+    rules: 为空时使用当前版本的规则
+    """
+    student_ids = sorted(set(student_ids))
+    if not student_ids:
+        return
+    rules = rules or risk_rules.get_rules(conn)
+    for start in range(0, len(student_ids), STUDENT_BATCH):
+        batch = student_ids[start:start + STUDENT_BATCH]
+        conn.execute(delete(summary).where(summary.c.student_id.in_(batch)))
+        conn.execute(summary.insert().from_select(["student_id"] + STAT_COLUMNS, _expected_query(rules, batch)))
+
+
+def refresh_surveys(conn, records):
+    """
+    调查写入后使用 (不提交): 成绩 / 出勤列不变，直接用本次写入的记录更新最近一周的调查列，不查询调查表
+    records: 写入的记录 [{id, student_id, week_number, stress_level, hours_slept}, ...]
+    每个学生取其中周数最大的一条，不早于汇总行中的最近一周时才替换 (同一周即同一条记录被覆盖)
+    还没有汇总行的学生整行计算
+    """
+    latest = {}
+    for r in records:
+        current = latest.get(r["student_id"])
+        if current is None or r["week_number"] > current["week_number"]:
+            latest[r["student_id"]] = r
+    if not latest:
+        return
+
+    # 条件放在 SET 中而不是 WHERE 中: 每个已有汇总行都被匹配，rowcount 即已有汇总行的学生数
+    newer = or_(summary.c.latest_week_number.is_(None), summary.c.latest_week_number <= bindparam("b_week_number"))
+    columns = {
+        "latest_survey_id": "b_id",
+        "latest_week_number": "b_week_number",
+        "latest_stress_level": "b_stress_level",
+        "latest_hours_slept": "b_hours_slept",
+    }
+    updated = conn.execute(
+        update(summary)
+        .where(summary.c.student_id == bindparam("b_student_id"))
+        .values(**{name: case((newer, bindparam(param)), else_=summary.c[name]) for name, param in columns.items()}),
+        [
+            {"b_student_id": student_id, "b_id": r["id"], "b_week_number": r["week_number"],
+             "b_stress_level": r["stress_level"], "b_hours_slept": r["hours_slept"]}
+            for student_id, r in latest.items()
+        ],
+    ).rowcount
+    if updated < len(latest):
+        student_ids = sorted(latest)
+        existing = set()
+        for start in range(0, len(student_ids), STUDENT_BATCH):
+            batch = student_ids[start:start + STUDENT_BATCH]
+            existing.update(conn.execute(select(summary.c.student_id).where(summary.c.student_id.in_(batch))).scalars())
+        refresh(conn, set(student_ids) - existing)
+
+
+def rebuild(conn):
+    """根据原始数据重新计算整张汇总表 (不提交)，规则直接从数据库读取 (包括本事务中未提交的修改)"""
+    conn.execute(delete(summary))
+    conn.execute(summary.insert().from_select(
+        ["student_id"] + STAT_COLUMNS, _expected_query(risk_rules.load(conn))
+    ))
+
+
+def _same(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(float(a) - float(b)) <= TOLERANCE * max(1.0, abs(float(a)), abs(float(b)))
+
+
+def _differences(conn, rules: risk_rules.CompiledRules) -> dict:
+    """
+    对比汇总表与原始数据的实时聚合结果
+    返回: {student_id: 不一致项的描述}
+    """
+    expected = {row["student_id"]: row for row in conn.execute(_expected_query(rules)).mappings()}
+    actual = {row["student_id"]: row for row in conn.execute(select(summary)).mappings()}
+
+    differences = {}
+    for student_id in sorted(set(expected) | set(actual)):
+        if student_id not in actual:
+            differences[student_id] = f"Missing summary for student {student_id}"
+        elif student_id not in expected:
+            differences[student_id] = f"Stale summary for deleted student {student_id}"
+        else:
+            wrong = [
+                f"{name} is {actual[student_id][name]}, expected {expected[student_id][name]}"
+                for name in STAT_COLUMNS
+                if not _same(expected[student_id][name], actual[student_id][name])
+            ]
+            if wrong:
+                differences[student_id] = f"Student {student_id}: " + "; ".join(wrong)
+    return differences
+
+
+def check(conn) -> list:
+    """返回: 不一致项的描述列表 (为空表示一致)"""
+    return list(_differences(conn, risk_rules.load(conn)).values())
+
+
+def reconcile(conn) -> int:
+    """
+    只重算不一致的学生 (不提交)，规则直接从数据库读取 (其他进程可能刚修改过规则)
+    返回: 修正的行数
+    """
+    rules = risk_rules.load(conn)
+    student_ids = list(_differences(conn, rules))
+    refresh(conn, student_ids, rules)
+    return len(student_ids)
+
+
+def reconcile_once() -> int:
+    with engine.begin() as conn:
+        fixed = reconcile(conn)
+        if fixed:
+            # 预警名单和风险评分的缓存基于汇总表，修正后使其失效 (命令行执行时通知服务进程)
+            bump_shared(conn, ACADEMIC, WELLBEING)
+    if fixed:
+        response_cache.bump(ACADEMIC, WELLBEING)
+        logger.warning("Student summary reconciler fixed %d rows", fixed)
+    return fixed
+
+
+def start_reconciler(interval_seconds: float) -> threading.Event:
+    """
+    启动后台对账线程 (守护线程，每隔 interval_seconds 执行一次)
+    返回: 设置后即停止线程的 Event
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval_seconds):
+            try:
+                reconcile_once()
+            except Exception:
+                logger.exception("Student summary reconciliation failed")
+
+    threading.Thread(target=run, name="student-summary-reconciler", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command == "rebuild":
+        with engine.begin() as conn:
+            rebuild(conn)
+            bump_shared(conn, ACADEMIC, WELLBEING)
+        print("Student summary rebuilt.")
+    elif command == "check":
+        with engine.connect() as conn:
+            problems = check(conn)
+        for problem in problems:
+            print(problem)
+        print("Student summary is consistent." if not problems else f"{len(problems)} inconsistencies found.")
+        sys.exit(1 if problems else 0)
+    elif command == "reconcile":
+        print(f"Fixed {reconcile_once()} student summaries.")
+    else:
+        print("Usage: python -m app.student_summary [rebuild|check|reconcile]")
+        sys.exit(2)
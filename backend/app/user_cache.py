@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import get_settings
+from app.response_cache import USERS, bump_shared
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """
+    认证后放进缓存的用户身份 (只包含权限判断需要的字段)
+    与 models.User 字段同名，路由里可以直接当作 current_user 使用
+    """
+    id: Optional[int]
+    username: str
+    full_name: Optional[str]
+    role: models.Role
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "CachedUser":
+        return cls(id=user.id, username=user.username, full_name=user.full_name, role=user.role)
+
+
+class UserCache:
+    """
+    进程内的 TTL + LRU 缓存，key 为 (username, token jti)
+    同一用户的多个 Token 各占一条，按用户名整体失效
+    每个条目记录写入时的 version (cache_versions 中 USERS 的共享版本号)，版本号变化后不再命中:
+    其他进程 (另一个 worker、seed.py) 修改用户后，最迟 RESPONSE_CACHE_SHARED_VERSION_SECONDS 秒失效
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (username, jti) -> (expires_at, version, CachedUser)
+        self._lock = threading.Lock()
+
+    def get(self, username: str, jti: Optional[str], version: int = 0) -> Optional[CachedUser]:
+        key = (username, jti)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entry_version, user = entry
+            if expires_at < time.monotonic() or entry_version != version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def put(self, jti: Optional[str], user: CachedUser, version: int = 0):
+        with self._lock:
+            self._entries[(user.username, jti)] = (time.monotonic() + self.ttl_seconds, version, user)
+            self._entries.move_to_end((user.username, jti))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == username]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_SIZE)
+
+
+# --- 失效: 用户的角色、密码被修改或用户被删除时，清除该用户的所有缓存 ---
+# 本进程立即清除；同时在同一事务中递增 USERS 共享版本号，其他进程随之失效
+@event.listens_for(models.User, "after_update")
+def _invalidate_on_update(mapper, connection, target):
+    state = inspect(target)
+    changed = any(
+        state.attrs[name].history.has_changes()
+        for name in ("username", "role", "hashed_password")
+    )
+    if changed:
+        user_cache.invalidate_user(target.username)
+        # 用户名被修改时，旧用户名下的缓存也要清除
+        old_names = state.attrs.username.history.deleted
+        for old_name in old_names:
+            user_cache.invalidate_user(old_name)
+        bump_shared(connection, USERS)
+
+
+@event.listens_for(models.User, "after_delete")
+def _invalidate_on_delete(mapper, connection, target):
+    user_cache.invalidate_user(target.username)
+    bump_shared(connection, USERS)
+
+
+# 批量 query(User).update() / delete() 不触发上面的事件: 不知道涉及哪些用户，清除全部
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_write(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and any(mapper.class_ is models.User for mapper in orm_execute_state.all_mappers):
+        user_cache.clear()
+        bump_shared(orm_execute_state.session, USERS)
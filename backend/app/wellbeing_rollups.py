@@ -0,0 +1,375 @@
+"""
+每周健康数据汇总 (趋势图使用)
+
+wellbeing_weekly_rollups 保存每周的 count / sum / 平方和 / min / max，
+wellbeing_weekly_histograms 保存每周的分桶计数 (用于百分位数)。
+course_id = 0 表示全体学生，其余为选修该课程的学生。
+
+写入路径 (create_survey / CSV 导入) 在插入调查记录的同一事务内调用 apply_surveys，
+被覆盖的记录先减去旧值再加上新值，趋势接口只需读取 O(周数) 行。
+选课关系在记录写入之后发生变化时，按课程的切片不会自动更新，需要执行 rebuild。
+
+命令行:
+    python -m app.wellbeing_rollups rebuild   # 根据原始数据重建汇总表
+    python -m app.wellbeing_rollups check     # 与原始数据的实时聚合结果对比
+"""
+import math
+import sys
+from collections import defaultdict
+
+from sqlalchemy import bindparam, case, delete, exists, func, select, update
+
+from app import models
+from app.database import engine, upsert_insert
+
+# 全体学生的汇总行使用的 course_id
+ALL_STUDENTS = 0
+
+# 睡眠时长直方图的桶宽 (小时)
+SLEEP_BUCKET_WIDTH = 0.5
+
+# 每次 IN (...) 查询的学生数量上限 (低于 SQLite 的绑定变量限制)
+STUDENT_COURSE_BATCH = 900
+
+# 浮点累加结果的比较容差
+TOLERANCE = 1e-6
+
+rollups = models.WellbeingWeeklyRollup.__table__
+histograms = models.WellbeingWeeklyHistogram.__table__
+surveys = models.WellbeingSurvey.__table__
+student_courses = models.student_courses
+
+STAT_COLUMNS = [
+    "survey_count",
+    "stress_sum", "stress_sumsq", "stress_min", "stress_max",
+    "sleep_sum", "sleep_sumsq", "sleep_min", "sleep_max",
+]
+
+
+def sleep_bucket(hours: float) -> float:
+    return math.floor(hours / SLEEP_BUCKET_WIDTH) * SLEEP_BUCKET_WIDTH
+
+
+def _course_ids_by_student(conn, student_ids) -> dict:
+    """返回: {student_id: [course_id, ...]}"""
+    student_ids = list(student_ids)
+    mapping = defaultdict(list)
+    for start in range(0, len(student_ids), STUDENT_COURSE_BATCH):
+        batch = student_ids[start:start + STUDENT_COURSE_BATCH]
+        rows = conn.execute(
+            select(student_courses.c.student_id, student_courses.c.course_id)
+            .where(student_courses.c.student_id.in_(batch))
+        )
+        for student_id, course_id in rows:
+            mapping[student_id].append(course_id)
+    return mapping
+
+
+def apply_surveys(conn, records, removed=()):
+    """
+    把写入的调查记录累加到汇总表 (不提交，由调用方的事务一起提交)
+    records: 新写入的值 [{student_id, week_number, stress_level, hours_slept}, ...]
+    removed: 被覆盖的旧值 (格式同 records)，从计数 / 和 / 平方和 / 直方图中减去
+    旧值等于该周当前的 min / max 时重新确定 min / max (_refresh_extremes)，其余情况不需要扫描原始数据
+    """
+    if not records and not removed:
+        return
+
+    courses = _course_ids_by_student(conn, {r["student_id"] for r in [*records, *removed]})
+    extremes = _current_extremes(conn, sorted({r["week_number"] for r in removed})) if removed else {}
+
+    stats = {}
+    buckets = defaultdict(int)
+    stale_stress, stale_sleep = set(), set()  # min / max 可能随旧值一起被移除的 (week_number, course_id)
+    for sign, rows in ((1, records), (-1, removed)):
+        for r in rows:
+            stress, sleep = float(r["stress_level"]), float(r["hours_slept"])
+            for course_id in [ALL_STUDENTS] + courses.get(r["student_id"], []):
+                key = (r["week_number"], course_id)
+                s = stats.get(key)
+                if s is None:
+                    s = stats[key] = [0, 0.0, 0.0, None, None, 0.0, 0.0, None, None]
+                s[0] += sign
+                s[1] += sign * stress
+                s[2] += sign * stress * stress
+                s[5] += sign * sleep
+                s[6] += sign * sleep * sleep
+                if sign > 0:
+                    s[3] = stress if s[3] is None else min(s[3], stress)
+                    s[4] = stress if s[4] is None else max(s[4], stress)
+                    s[7] = sleep if s[7] is None else min(s[7], sleep)
+                    s[8] = sleep if s[8] is None else max(s[8], sleep)
+                else:
+                    stress_min, stress_max, sleep_min, sleep_max = extremes.get(key, (None,) * 4)
+                    if stress in (stress_min, stress_max):
+                        stale_stress.add(key)
+                    if sleep in (sleep_min, sleep_max):
+                        stale_sleep.add(key)
+                buckets[key + ("stress", stress)] += sign
+                buckets[key + ("sleep", sleep_bucket(sleep))] += sign
+
+    # 累加列直接相加，min / max 取较小 / 较大值 (只有旧值的行 min / max 为 NULL，保持原值)
+    stmt = upsert_insert(conn, rollups)
+    set_ = {}
+    for name in STAT_COLUMNS:
+        current, new = rollups.c[name], stmt.excluded[name]
+        if name.endswith("_min"):
+            set_[name] = case((new < current, new), else_=current)
+        elif name.endswith("_max"):
+            set_[name] = case((new > current, new), else_=current)
+        else:
+            set_[name] = current + new
+    stmt = stmt.on_conflict_do_update(index_elements=["week_number", "course_id"], set_=set_)
+    conn.execute(stmt, [
+        {"week_number": week, "course_id": course_id, **dict(zip(STAT_COLUMNS, s))}
+        for (week, course_id), s in stats.items()
+    ])
+
+    stmt = upsert_insert(conn, histograms)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["week_number", "course_id", "metric", "bucket"],
+        set_={"count": histograms.c.count + stmt.excluded["count"]},
+    )
+    conn.execute(stmt, [
+        {"week_number": week, "course_id": course_id, "metric": metric, "bucket": bucket, "count": count}
+        for (week, course_id, metric, bucket), count in buckets.items()
+        if count
+    ])
+
+    if removed:
+        # 计数减到 0 的桶和汇总行 (例如学生选课变化后，课程切片中的记录全部被覆盖到其他课程)
+        weeks = sorted({r["week_number"] for r in removed})
+        conn.execute(delete(histograms).where(histograms.c.week_number.in_(weeks), histograms.c.count <= 0))
+        conn.execute(delete(rollups).where(rollups.c.week_number.in_(weeks), rollups.c.survey_count <= 0))
+        _refresh_extremes(conn, stale_stress, stale_sleep)
+
+
+def _current_extremes(conn, weeks) -> dict:
+    """返回: {(week_number, course_id): (stress_min, stress_max, sleep_min, sleep_max)}"""
+    rows = conn.execute(
+        select(rollups.c.week_number, rollups.c.course_id,
+               rollups.c.stress_min, rollups.c.stress_max, rollups.c.sleep_min, rollups.c.sleep_max)
+        .where(rollups.c.week_number.in_(weeks))
+    )
+    return {(week, course_id): tuple(values) for week, course_id, *values in rows}
+
+
+def _sleep_extreme(week_number: int, course_id: int, descending: bool):
+    """
+    该周 (该课程) 最小 / 最大的睡眠时长
+    沿 hours_slept 索引的一端扫描，遇到第一条属于该周 (该课程) 的记录即停止，不必聚合整周的数据
+    (week_number + 0 使数据库不选择按周的索引)
+    """
+    query = select(surveys.c.hours_slept).where(surveys.c.week_number + 0 == week_number)
+    if course_id != ALL_STUDENTS:
+        query = query.where(exists().where(
+            student_courses.c.student_id == surveys.c.student_id, student_courses.c.course_id == course_id
+        ))
+    order = surveys.c.hours_slept.desc() if descending else surveys.c.hours_slept.asc()
+    return query.order_by(order).limit(1).scalar_subquery()
+
+
+def _refresh_extremes(conn, stress_keys, sleep_keys):
+    """
+    重新确定这些 (week_number, course_id) 的 min / max (旧值被移除之后):
+    压力是整数，直方图的每个桶就是一个取值，取计数不为 0 的最小 / 最大桶即可；
+    睡眠时长按桶宽分桶，按原始数据逐个查询 (_sleep_extreme)
+    """
+    updates = defaultdict(dict)
+    if stress_keys:
+        rows = conn.execute(
+            select(histograms.c.week_number, histograms.c.course_id,
+                   func.min(histograms.c.bucket), func.max(histograms.c.bucket))
+            .where(histograms.c.week_number.in_(sorted({week for week, _ in stress_keys})),
+                   histograms.c.metric == "stress", histograms.c.count > 0)
+            .group_by(histograms.c.week_number, histograms.c.course_id)
+        )
+        for week, course_id, low, high in rows:
+            if (week, course_id) in stress_keys:
+                updates[(week, course_id)].update(stress_min=low, stress_max=high)
+    for week, course_id in sleep_keys:
+        low, high = conn.execute(select(
+            _sleep_extreme(week, course_id, descending=False), _sleep_extreme(week, course_id, descending=True)
+        )).one()
+        updates[(week, course_id)].update(sleep_min=low, sleep_max=high)
+
+    if updates:
+        # 只更新重新确定的列 (参数为 NULL 的列保持原值)，一条 executemany 完成
+        extremes = ("stress_min", "stress_max", "sleep_min", "sleep_max")
+        conn.execute(
+            update(rollups)
+            .where(rollups.c.week_number == bindparam("b_week_number"), rollups.c.course_id == bindparam("b_course_id"))
+            .values(**{name: func.coalesce(bindparam(f"b_{name}"), rollups.c[name]) for name in extremes}),
+            [
+                {"b_week_number": week, "b_course_id": course_id, **{f"b_{name}": values.get(name) for name in extremes}}
+                for (week, course_id), values in updates.items()
+            ],
+        )
+
+
+# --- 根据原始数据计算 (重建 / 一致性检查) ---
+
+def _aggregate_query(per_course: bool, weeks=None):
+    stress, sleep = surveys.c.stress_level, surveys.c.hours_slept
+    course_id = student_courses.c.course_id if per_course else ALL_STUDENTS
+    query = select(
+        surveys.c.week_number,
+        func.coalesce(course_id, ALL_STUDENTS).label("course_id"),
+        func.count().label("survey_count"),
+        func.sum(stress).label("stress_sum"),
+        func.sum(stress * stress).label("stress_sumsq"),
+        func.min(stress).label("stress_min"),
+        func.max(stress).label("stress_max"),
+        func.sum(sleep).label("sleep_sum"),
+        func.sum(sleep * sleep).label("sleep_sumsq"),
+        func.min(sleep).label("sleep_min"),
+        func.max(sleep).label("sleep_max"),
+    )
+    if weeks is not None:
+        query = query.where(surveys.c.week_number.in_(weeks))
+    if per_course:
+        query = query.join(student_courses, student_courses.c.student_id == surveys.c.student_id)\
+            .group_by(surveys.c.week_number, student_courses.c.course_id)
+    else:
+        query = query.group_by(surveys.c.week_number)
+    return query
+
+
+def _expected_histograms(conn, weeks=None) -> dict:
+    """返回: {(week_number, course_id, metric, bucket): count}"""
+    counts = defaultdict(int)
+    for per_course in (False, True):
+        for metric, column in (("stress", surveys.c.stress_level), ("sleep", surveys.c.hours_slept)):
+            course_id = student_courses.c.course_id if per_course else ALL_STUDENTS
+            query = select(surveys.c.week_number, func.coalesce(course_id, ALL_STUDENTS), column, func.count())
+            if weeks is not None:
+                query = query.where(surveys.c.week_number.in_(weeks))
+            if per_course:
+                query = query.join(student_courses, student_courses.c.student_id == surveys.c.student_id)\
+                    .group_by(surveys.c.week_number, student_courses.c.course_id, column)
+            else:
+                query = query.group_by(surveys.c.week_number, column)
+            # 睡眠时长在 Python 中分桶 (与 apply_surveys 使用同一个函数)
+            for week, cid, value, count in conn.execute(query):
+                bucket = float(value) if metric == "stress" else sleep_bucket(value)
+                counts[(week, cid, metric, bucket)] += count
+    return counts
+
+
+def rebuild(conn, weeks=None):
+    """
+    根据 wellbeing_surveys 重新计算汇总表 (不提交)
+    weeks: 只重算这些周 (例如调查记录被覆盖后，min / max 无法增量修正)；为空时全部重算
+    """
+    if weeks is not None:
+        weeks = list(weeks)
+        conn.execute(delete(rollups).where(rollups.c.week_number.in_(weeks)))
+        conn.execute(delete(histograms).where(histograms.c.week_number.in_(weeks)))
+    else:
+        conn.execute(delete(rollups))
+        conn.execute(delete(histograms))
+
+    for per_course in (False, True):
+        conn.execute(rollups.insert().from_select(
+            ["week_number", "course_id"] + STAT_COLUMNS, _aggregate_query(per_course, weeks)
+        ))
+
+    rows = [
+        {"week_number": week, "course_id": course_id, "metric": metric, "bucket": bucket, "count": count}
+        for (week, course_id, metric, bucket), count in _expected_histograms(conn, weeks).items()
+    ]
+    if rows:
+        conn.execute(histograms.insert(), rows)
+
+
+def _same(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(float(a) - float(b)) <= TOLERANCE * max(1.0, abs(float(a)), abs(float(b)))
+
+
+def check(conn) -> list:
+    """
+    对比汇总表与原始数据的实时聚合结果
+    返回: 不一致项的描述列表 (为空表示一致)
+    """
+    problems = []
+
+    expected = {}
+    for per_course in (False, True):
+        for row in conn.execute(_aggregate_query(per_course)).mappings():
+            expected[(row["week_number"], row["course_id"])] = row
+    actual = {
+        (row["week_number"], row["course_id"]): row
+        for row in conn.execute(select(rollups)).mappings()
+    }
+    for key in sorted(set(expected) | set(actual)):
+        if key not in actual:
+            problems.append(f"Missing rollup for week {key[0]}, course {key[1]}")
+        elif key not in expected:
+            problems.append(f"Stale rollup for week {key[0]}, course {key[1]}")
+        else:
+            for name in STAT_COLUMNS:
+                if not _same(expected[key][name], actual[key][name]):
+                    problems.append(
+                        f"Week {key[0]}, course {key[1]}: {name} is {actual[key][name]}, expected {expected[key][name]}"
+                    )
+
+    expected_hist = _expected_histograms(conn)
+    actual_hist = {
+        (row.week_number, row.course_id, row.metric, row.bucket): row.count
+        for row in conn.execute(select(histograms))
+    }
+    for key in sorted(set(expected_hist) | set(actual_hist)):
+        if expected_hist.get(key, 0) != actual_hist.get(key, 0):
+            problems.append(
+                f"Week {key[0]}, course {key[1]}: {key[2]} bucket {key[3]} count is "
+                f"{actual_hist.get(key, 0)}, expected {expected_hist.get(key, 0)}"
+            )
+    return problems
+
+
+# --- 读取时使用的统计 ---
+
+def variance(total: float, sumsq: float, count: int) -> float:
+    """总体方差 (浮点误差可能产生极小的负数，截断为 0)"""
+    if not count:
+        return 0.0
+    mean = total / count
+    return max(sumsq / count - mean * mean, 0.0)
+
+
+def percentile(buckets, p: float) -> float:
+    """
+    最近秩法计算百分位数
+    buckets: 按 bucket 升序排列的 [(bucket, count), ...]
+    """
+    total = sum(count for _, count in buckets)
+    rank = max(math.ceil(p / 100 * total), 1)
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen >= rank:
+            return bucket
+    return buckets[-1][0]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    if command == "rebuild":
+        from app.response_cache import WELLBEING, bump_shared
+
+        with engine.begin() as conn:
+            rebuild(conn)
+            bump_shared(conn, WELLBEING)
+        print("Wellbeing rollups rebuilt.")
+    elif command == "check":
+        with engine.connect() as conn:
+            problems = check(conn)
+        for problem in problems:
+            print(problem)
+        print("Wellbeing rollups are consistent." if not problems else f"{len(problems)} inconsistencies found.")
+        sys.exit(1 if problems else 0)
+    else:
+        print("Usage: python -m app.wellbeing_rollups [rebuild|check]")
+        sys.exit(2)
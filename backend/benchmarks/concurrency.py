@@ -0,0 +1,71 @@
+"""
+并发负载测试: 在进程内用 httpx ASGITransport 同时发出大量仪表盘请求，
+比较同步 (线程池) 与 ASYNC_DB=true (AsyncSession) 两种模式。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.concurrency --requests 3000
+    ASYNC_DB=true python -m benchmarks.concurrency --requests 3000
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.config import get_settings
+from app.main import app
+
+
+async def run(total: int, concurrency: int, path: str, username: str, password: str):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        res = await client.post("/auth/token", data={"username": username, "password": password})
+        res.raise_for_status()
+        headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+        gate = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with gate:
+                start = time.perf_counter()
+                try:
+                    r = await client.get(path, headers=headers)
+                    status = r.status_code
+                except Exception:
+                    status = "error"
+                latencies.append(time.perf_counter() - start)
+                return status
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*[one() for _ in range(total)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ok = statuses.count(200)
+    return {
+        "mode": "async" if get_settings().ASYNC_DB else "sync",
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": ok,
+        "failed": total - ok,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=3000, help="同时在途的请求数上限")
+    parser.add_argument("--path", default="/academic/courses/1/dashboard")
+    parser.add_argument("--username", default="director")
+    parser.add_argument("--password", default="director123")
+    args = parser.parse_args()
+
+    print(asyncio.run(run(args.requests, args.concurrency, args.path, args.username, args.password)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+索引基准测试: 生成约 100 万行的数据集，分别在没有 / 有热点查询索引 (迁移 1 和 4 创建的索引) 时
+通过 crud 函数执行仪表盘和预警查询，输出每个查询的平均耗时 (before -> after)。
+
+数据由 datagen.py 生成 (相同参数结果相同)；--skip-generate 复用已有的数据库。
+测量会删除并重建目标数据库中的这些索引，请使用单独的数据库文件。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.indexes --database-url sqlite:///./index_bench.db
+    python -m benchmarks.indexes --database-url sqlite:///./index_bench.db --skip-generate --repeat 5
+"""
+import argparse
+import json
+import os
+import time
+
+import datagen
+
+# 被测量的索引 (迁移 1 和迁移 4 创建，均在模型中定义)
+INDEXES = (
+    "ix_student_courses_course_student",
+    "ix_grades_course_score",
+    "ix_grades_student_score",
+    "ix_grades_student_submission",
+    "ix_attendances_course_status",
+    "ix_attendances_student_date",
+    "ix_surveys_week_stress_sleep",
+    "ux_surveys_student_week",
+    "ix_surveys_stress",
+    "ix_surveys_sleep",
+)
+
+
+def scenarios(course_id: int, student_number: str) -> dict:
+    """{名称: fn(db)}，查询形状与对应接口相同"""
+    from app.crud import crud_academic, crud_wellbeing
+
+    return {
+        "course dashboard": lambda db: crud_academic.get_course_analytics(db, course_id),
+        # 指定及格线: 走原始数据的 GROUP BY 聚合，而不是学生汇总表
+        "academic alerts": lambda db: crud_academic.get_academic_at_risk_students(db, pass_mark=50.0),
+        "student details": lambda db: crud_academic.get_student_academic_details(db, student_number),
+        "course grades": lambda db: crud_academic.get_course_grades(db, course_id, limit=100),
+        # 指定周范围: 走窗口函数查询
+        "wellbeing alerts": lambda db: crud_wellbeing.get_at_risk_students(db, week_from=1, limit=100),
+        "wellbeing history": lambda db: crud_wellbeing.get_surveys_by_student_number(db, student_number),
+    }
+
+
+def measure(repeat: int, course_id: int, student_number: str) -> dict:
+    from app.database import SessionLocal
+
+    results = {}
+    for name, fn in scenarios(course_id, student_number).items():
+        timings = []
+        for _ in range(repeat):
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                fn(db)
+                timings.append(time.perf_counter() - start)
+            finally:
+                db.close()
+        results[name] = round(sum(timings) / len(timings) * 1000, 1)
+    return results
+
+
+def drop_indexes():
+    from sqlalchemy import text
+
+    from app.database import engine
+
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+
+
+def create_indexes():
+    from sqlalchemy import text
+
+    from app.database import engine
+    from app.migrations import _create_indexes
+
+    with engine.begin() as conn:
+        _create_indexes(*INDEXES)(conn)
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="基准测试使用的数据库 (会被清空并重新生成)")
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="生成数据的进程数")
+    parser.add_argument("--skip-generate", action="store_true", help="使用已有的数据")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="结果另存为 JSON")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    if not args.skip_generate:
+        datagen.main([
+            "--students", str(args.students), "--courses", str(args.courses),
+            "--workers", str(args.workers), "--database-url", args.database_url,
+        ])
+
+    # 测量中间的课程和学生，避免落在数据的边界上
+    course_id, student_number = max(args.courses // 2, 1), f"u{max(args.students // 2, 1):07d}"
+
+    drop_indexes()
+    before = measure(args.repeat, course_id, student_number)
+    create_indexes()
+    after = measure(args.repeat, course_id, student_number)
+
+    print(f"Mean of {args.repeat} runs through the crud functions, before -> after:")
+    for name in before:
+        print(f"  {name:<18} {before[name]:>9.1f} ms -> {after[name]:>8.1f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"before_ms": before, "after_ms": after}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+登录吞吐量测试: 同时发起大量 /auth/token 请求，统计每秒登录数 (以及每个哈希进程的吞吐)。
+测试会临时创建 bench_login_* 用户 (共用同一个密码哈希)，结束后删除。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.login --users 64 --rounds 3
+    PASSWORD_HASH_WORKERS=4 python -m benchmarks.login
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app import models, security
+from app.config import get_settings
+from app.database import SessionLocal
+from app.main import app
+
+settings = get_settings()
+USER_PREFIX = "bench_login_"
+PASSWORD = "bench-password"
+
+
+def create_users(count: int):
+    db = SessionLocal()
+    try:
+        hashed = security.get_password_hash(PASSWORD)
+        db.add_all([
+            models.User(
+                username=f"{USER_PREFIX}{i}",
+                hashed_password=hashed,
+                full_name="Benchmark User",
+                role=models.Role.COURSE_DIRECTOR,
+            )
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def drop_users():
+    db = SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.username.like(f"{USER_PREFIX}%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(users: int, rounds: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(i):
+            r = await client.post("/auth/token", data={"username": f"{USER_PREFIX}{i}", "password": PASSWORD})
+            return r.status_code
+
+        # 预热: 启动哈希进程
+        await login(0)
+
+        statuses = []
+        start = time.perf_counter()
+        for _ in range(rounds):
+            statuses += await asyncio.gather(*[login(i) for i in range(users)])
+        elapsed = time.perf_counter() - start
+
+    ok = statuses.count(200)
+    return {
+        "requests": len(statuses),
+        "ok": ok,
+        "rejected_429": statuses.count(429),
+        "hash_workers": settings.PASSWORD_HASH_WORKERS,
+        "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        "logins_per_s": round(ok / elapsed, 1),
+        "logins_per_s_per_worker": round(ok / elapsed / settings.PASSWORD_HASH_WORKERS, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=32, help="每轮同时登录的不同用户数")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    drop_users()
+    create_users(args.users)
+    try:
+        print(asyncio.run(run(args.users, args.rounds)))
+    finally:
+        drop_users()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+综合风险评分基准测试: 为 N 名学生随机生成充分统计量 (与 load_statistics 的输出结构相同)，
+测量向量化特征计算 + 评分 + 排名的耗时。要求 10 万名学生在 1 秒内完成，超出时以退出码 1 结束。
+
+--from-db 额外测量从当前数据库 (DATABASE_URL) 读取统计量的耗时，并对真实数据评分。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.risk_scoring --students 100000
+    python -m benchmarks.risk_scoring --from-db
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import risk_scoring
+
+BUDGET_SECONDS = 1.0
+
+
+def make_statistics(count: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    grade_count = rng.integers(0, 13, size=count)
+    attendance_count = rng.integers(0, 37, size=count)
+    survey_count = rng.integers(0, 13, size=count)
+    weeks = np.maximum(survey_count, 1)
+    return pd.DataFrame({
+        "student_id": np.arange(1, count + 1),
+        "student_number": [f"u{i:07d}" for i in range(1, count + 1)],
+        "full_name": [f"Student {i}" for i in range(1, count + 1)],
+        "grade_count": grade_count,
+        "score_sum": grade_count * rng.uniform(30, 95, size=count),
+        "fail_count": rng.binomial(grade_count, 0.15),
+        "attendance_count": attendance_count,
+        "present_count": rng.binomial(attendance_count, 0.85),
+        "survey_count": survey_count,
+        "week_sum": survey_count * (weeks + 1) / 2,
+        "week_sumsq": survey_count * (weeks + 1) * (2 * weeks + 1) / 6,
+        "stress_sum": survey_count * rng.uniform(1, 5, size=count),
+        "week_stress_sum": survey_count * (weeks + 1) / 2 * rng.uniform(1, 5, size=count),
+        "sleep_deficit_sum": survey_count * rng.uniform(0, 2.5, size=count),
+    })
+
+
+def measure(stats: pd.DataFrame, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        risk_scoring.score_cohort(risk_scoring.compute_features(stats))
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--from-db", action="store_true", help="同时测量从数据库读取统计量")
+    args = parser.parse_args()
+
+    stats = make_statistics(args.students)
+    timings = measure(stats, args.repeat)
+    p50 = timings[len(timings) // 2]
+    print(f"Scored {args.students} synthetic students: p50 {p50 * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms")
+
+    if args.from_db:
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            stats = risk_scoring.load_statistics(db)
+            loaded = time.perf_counter() - start
+        finally:
+            db.close()
+        db_timings = measure(stats, args.repeat)
+        print(f"Loaded statistics for {len(stats)} students from the database in {loaded * 1000:.1f} ms, "
+              f"scored in p50 {db_timings[len(db_timings) // 2] * 1000:.1f} ms")
+
+    if args.students >= 100000 and timings[-1] > BUDGET_SECONDS:
+        print(f"FAILED: scoring exceeded the {BUDGET_SECONDS}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
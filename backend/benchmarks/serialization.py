@@ -0,0 +1,126 @@
+"""
+序列化基准测试: 对比默认路径与 FAST_JSON 快速路径输出大列表的耗时
+
+默认路径: response_model 校验 ORM 对象 (from_attributes) -> 转为 JSON 兼容对象 -> json.dumps
+          (与 FastAPI 处理带 response_model 路由的步骤一致)
+快速路径: fast_json.construct 组装 schema -> orjson 编码
+
+数据为内存中构造的 ORM 对象，不访问数据库，只测序列化本身。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.serialization --rows 10000 --repeat 50
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from app import fast_json, models, schemas
+
+
+def make_grades(count: int):
+    now = datetime.datetime.utcnow()
+    return [
+        models.Grade(
+            id=i, student_id=i % 5000, course_id=i % 7, assignment_title=f"Assignment {i % 3}",
+            score=float(random.randint(0, 100)), submission_date=now - datetime.timedelta(minutes=i),
+        )
+        for i in range(count)
+    ]
+
+
+def make_risk_records(count: int):
+    now = datetime.datetime.utcnow()
+    students = [
+        models.Student(id=i, full_name=f"Student {i}", student_number=f"u{i:07d}", email=f"s{i}@example.org")
+        for i in range(count)
+    ]
+    return [
+        models.WellbeingSurvey(
+            id=i, student_id=i, week_number=random.randint(1, 12), stress_level=random.randint(1, 5),
+            hours_slept=round(random.uniform(3, 9), 1), recorded_at=now, student=students[i],
+        )
+        for i in range(count)
+    ]
+
+
+def make_report(count: int):
+    now = datetime.datetime.utcnow()
+    return {
+        "student": {"full_name": "Student", "student_number": "u0000001", "email": "s@example.org"},
+        "grades": [
+            {"id": i, "student_id": 1, "assignment_title": f"Assignment {i}", "score": 70.0,
+             "submission_date": now, "course_name": "Course", "course_code": "WM000"}
+            for i in range(count // 2)
+        ],
+        "attendances": [
+            {"id": i, "date": now, "status": models.AttendanceStatus.PRESENT,
+             "course_name": "Course", "course_code": "WM000"}
+            for i in range(count // 2)
+        ],
+    }
+
+
+def default_path(items, response_model) -> bytes:
+    adapter = TypeAdapter(response_model)
+    value = adapter.validate_python(items, from_attributes=True)
+    return JSONResponse(content=adapter.dump_python(value, mode="json")).body
+
+
+def fast_path(items, schema, many) -> bytes:
+    return fast_json.FastJSONResponse(
+        content=[fast_json.construct(schema, i) for i in items] if many else fast_json.construct(schema, items)
+    ).body
+
+
+def measure(fn, repeat: int) -> dict:
+    fn()  # 预热
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cases = [
+        ("grades", make_grades(args.rows), schemas.CourseGradeOut, True),
+        ("wellbeing_alerts", make_risk_records(args.rows), schemas.WellbeingRiskOut, True),
+        ("academic_report", make_report(args.rows), schemas.StudentAcademicReport, False),
+    ]
+    results = []
+    for name, items, schema, many in cases:
+        response_model = List[schema] if many else schema
+        # 两种路径的输出必须一致
+        assert json.loads(default_path(items, response_model)) == json.loads(fast_path(items, schema, many)), name
+
+        default = measure(lambda: default_path(items, response_model), args.repeat)
+        fast = measure(lambda: fast_path(items, schema, many), args.repeat)
+        results.append({
+            "payload": name,
+            "rows": args.rows,
+            "default": default,
+            "fast_json": fast,
+            "speedup_p50": round(default["p50_ms"] / fast["p50_ms"], 2),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
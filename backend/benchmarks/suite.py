@@ -0,0 +1,323 @@
+"""
+端到端基准测试: 用 datagen.py 生成不同规模的数据集，在进程内 (httpx ASGITransport) 驱动真实的 FastAPI 应用，
+统计热点接口的吞吐量、p50 / p95 / p99 延迟和每个请求执行的 SQL 语句数。
+
+- 每个规模在独立的子进程和临时 SQLite 数据库中运行 (应用在导入时根据 DATABASE_URL 创建引擎)
+- 响应缓存默认关闭，测的是实际的查询路径 (--with-cache 打开)
+- 先顺序发送请求统计延迟和 SQL 语句数，再按 --concurrency 并发发送统计吞吐量
+- CSV 上传的延迟为上传到后台导入完成的总时间，SQL 语句数包含导入任务本身
+
+结果写入 JSON，并与保存的基线 (benchmarks/baseline.json) 对比:
+- SQL 语句数多于基线 (例如新出现的 N+1 查询) 视为回归
+- p95 延迟同时超过基线的 (1 + --latency-tolerance) 倍和基线 + --latency-slack-ms 视为回归
+  (延迟与机器有关，换机器后用 --update-baseline 重新生成)
+存在回归时以退出码 1 结束。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.suite --scales small medium
+    python -m benchmarks.suite --scales small --update-baseline
+    python -m benchmarks.suite --scales large --iterations 20 --output results.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+# 数据集规模 (datagen.py 的参数)
+SCALES = {
+    "small": {"students": 500, "courses": 5, "weeks": 10},
+    "medium": {"students": 5000, "courses": 10, "weeks": 12},
+    "large": {"students": 25000, "courses": 20, "weeks": 12},
+}
+
+# CSV 上传场景每个文件的行数，以及写入的周次 (在数据集的周次之后，每次上传使用新的一周)
+UPLOAD_ROWS = 1000
+UPLOAD_WEEK_START = 100
+
+USERS = {
+    "director": ("director", "director123"),
+    "officer": ("officer", "officer123"),
+}
+
+
+# --- 子进程: 对一个数据集运行所有场景 ---
+
+class QueryCounter:
+    """通过 before_cursor_execute 统计执行的 SQL 语句数 (executemany 计为 1 条)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        from sqlalchemy import event
+
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+def percentile(values: list, p: float) -> float:
+    """最近秩法 (values 已升序)"""
+    rank = max(int(-(-p * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+def summarize(latencies: list, queries: list) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": max(queries),
+    }
+
+
+def make_upload_csv(rows: int, week: int) -> bytes:
+    out = io.StringIO()
+    out.write("student_number,week_number,stress_level,hours_slept\n")
+    for i in range(1, rows + 1):
+        out.write(f"u{i:07d},{week},{i % 5 + 1},{4.0 + i % 10 * 0.5}\n")
+    return out.getvalue().encode()
+
+
+def wait_for_import(engine, job_id: int, timeout: float = 300.0):
+    """
+    轮询导入任务状态直到结束
+    使用 DBAPI 连接直接查询，不经过 SQLAlchemy 的执行事件，不计入 SQL 语句数
+    """
+    deadline = time.perf_counter() + timeout
+    raw = engine.raw_connection()
+    try:
+        while time.perf_counter() < deadline:
+            cursor = raw.cursor()
+            cursor.execute("SELECT status FROM import_jobs WHERE id = ?", (job_id,))
+            (status,) = cursor.fetchone()
+            cursor.close()
+            raw.commit()
+            if status not in ("PENDING", "RUNNING"):
+                return status
+            time.sleep(0.005)
+    finally:
+        raw.close()
+    raise TimeoutError(f"Import job {job_id} did not finish in {timeout}s")
+
+
+async def run_scenarios(iterations: int, concurrency: int, students: int) -> dict:
+    import httpx
+
+    from app import database
+    from app.main import app
+
+    counter = QueryCounter()
+    counter.attach(database.engine)
+    if database.async_engine is not None:
+        counter.attach(database.async_engine.sync_engine)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers = {}
+        for role, (username, password) in USERS.items():
+            res = await client.post("/auth/token", data={"username": username, "password": password})
+            res.raise_for_status()
+            headers[role] = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+        student_numbers = [f"u{i:07d}" for i in range(1, min(students, iterations) + 1)]
+        scenarios = [
+            ("login", lambda i: client.post("/auth/token", data=dict(zip(("username", "password"), USERS["director"])))),
+            ("course_dashboard", lambda i: client.get("/academic/courses/1/dashboard", headers=headers["director"])),
+            ("academic_alerts", lambda i: client.get("/academic/dashboard/alerts", headers=headers["director"])),
+            ("student_details", lambda i: client.get(
+                f"/academic/students/{student_numbers[i % len(student_numbers)]}/details", headers=headers["director"])),
+            ("wellbeing_alerts", lambda i: client.get("/wellbeing/dashboard/alerts?limit=100", headers=headers["officer"])),
+            ("wellbeing_trends", lambda i: client.get("/wellbeing/dashboard/trends", headers=headers["officer"])),
+        ]
+
+        results = {}
+        for name, send in scenarios:
+            (await send(0)).raise_for_status()  # 预热
+
+            # 顺序: 延迟和 SQL 语句数
+            latencies, queries = [], []
+            for i in range(iterations):
+                counter.reset()
+                start = time.perf_counter()
+                res = await send(i)
+                latencies.append(time.perf_counter() - start)
+                queries.append(counter.count)
+                res.raise_for_status()
+            result = summarize(latencies, queries)
+
+            # 并发: 吞吐量
+            gate = asyncio.Semaphore(concurrency)
+
+            async def one(i):
+                async with gate:
+                    (await send(i)).raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*[one(i) for i in range(iterations)])
+            result["throughput_rps"] = round(iterations / (time.perf_counter() - start), 1)
+            results[name] = result
+
+        # CSV 上传: 上传到后台导入完成，每次写入新的一周
+        rows = min(UPLOAD_ROWS, students)
+        uploads = max(iterations // 10, 3)
+        latencies, queries = [], []
+        for i in range(uploads):
+            body = make_upload_csv(rows, UPLOAD_WEEK_START + i)
+            counter.reset()
+            start = time.perf_counter()
+            res = await client.post(
+                "/wellbeing/upload_csv", files={"file": ("bench.csv", body, "text/csv")}, headers=headers["officer"]
+            )
+            res.raise_for_status()
+            status = await asyncio.to_thread(wait_for_import, database.engine, res.json()["id"])
+            latencies.append(time.perf_counter() - start)
+            queries.append(counter.count)
+            if status != "COMPLETED":
+                raise RuntimeError(f"Import job finished with status {status}")
+        result = summarize(latencies, queries)
+        result["rows_per_upload"] = rows
+        result["throughput_rows_per_second"] = round(rows * uploads / sum(latencies), 1)
+        results["csv_upload"] = result
+
+    return results
+
+
+def run_scale_child(args):
+    """子进程入口: 环境变量 DATABASE_URL 已指向生成好的数据集"""
+    results = asyncio.run(run_scenarios(args.iterations, args.concurrency, SCALES[args.run_scale]["students"]))
+    with open(args.output, "w") as f:
+        json.dump(results, f)
+
+
+# --- 主进程: 生成数据集、汇总结果、与基线对比 ---
+
+def run_scale(name: str, args, workdir: str) -> dict:
+    database_url = f"sqlite:///{os.path.join(workdir, name + '.db')}"
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "RESPONSE_CACHE_ENABLED": "true" if args.with_cache else "false",
+        "RESPONSE_CACHE_BACKEND": "memory",
+    }
+    gen_args = [f"--{key}={value}" for key, value in SCALES[name].items()]
+    subprocess.run(
+        [sys.executable, "datagen.py", *gen_args, f"--seed={args.seed}", f"--database-url={database_url}"],
+        cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+
+    output = os.path.join(workdir, name + ".json")
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--run-scale", name, "--output", output,
+         "--iterations", str(args.iterations), "--concurrency", str(args.concurrency)],
+        cwd=BACKEND_DIR, env=env, check=True,
+    )
+    with open(output) as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, latency_tolerance: float, latency_slack_ms: float) -> list:
+    """返回: 回归项的描述列表 (只比较两边都有的规模和场景)"""
+    regressions = []
+    for scale, scenarios in results["scales"].items():
+        for scenario, current in scenarios.items():
+            expected = baseline.get("scales", {}).get(scale, {}).get(scenario)
+            if expected is None:
+                continue
+            if current["queries_per_request"] > expected["queries_per_request"]:
+                regressions.append(
+                    f"{scale}/{scenario}: {current['queries_per_request']} queries per request, "
+                    f"baseline {expected['queries_per_request']}"
+                )
+            # 毫秒级的接口抖动很大，同时要求超出一个绝对值
+            limit = max(expected["p95_ms"] * (1 + latency_tolerance), expected["p95_ms"] + latency_slack_ms)
+            if current["p95_ms"] > limit:
+                regressions.append(
+                    f"{scale}/{scenario}: p95 {current['p95_ms']} ms exceeds baseline "
+                    f"{expected['p95_ms']} ms (limit {limit:.2f} ms)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--iterations", type=int, default=50, help="每个场景顺序 / 并发各发送的请求数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--with-cache", action="store_true", help="打开响应缓存")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="允许 p95 延迟超出基线的比例")
+    parser.add_argument("--latency-slack-ms", type=float, default=10.0, help="允许 p95 延迟超出基线的绝对值")
+    parser.add_argument("--run-scale", choices=list(SCALES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale:
+        run_scale_child(args)
+        return
+
+    results = {
+        "config": {
+            "iterations": args.iterations, "concurrency": args.concurrency,
+            "seed": args.seed, "with_cache": args.with_cache,
+        },
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        for name in args.scales:
+            print(f"Running scale '{name}' ({SCALES[name]['students']} students)...", flush=True)
+            results["scales"][name] = run_scale(name, args, workdir)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for scale, scenarios in results["scales"].items():
+        for scenario, r in scenarios.items():
+            print(f"{scale:>6} {scenario:<18} p50 {r['p50_ms']:>9} ms  p95 {r['p95_ms']:>9} ms  "
+                  f"p99 {r['p99_ms']:>9} ms  queries {r['queries_per_request']:>4}")
+
+    if args.update_baseline:
+        baseline = {"scales": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline["config"] = results["config"]
+        baseline.setdefault("scales", {}).update(results["scales"])
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.latency_tolerance, args.latency_slack_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+调查录入吞吐量测试: 对比逐条调用 POST /wellbeing/surveys 与一次调用 POST /wellbeing/surveys/batch
+(JSON 数组 和 NDJSON 两种请求体)。
+
+测试记录写在 1000 周以后 (不影响真实周次的趋势)，结束后删除并重建每周汇总表。
+
+用法 (在 backend/ 目录下):
+    python -m benchmarks.surveys_batch --items 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from app import models, wellbeing_rollups
+from app.database import SessionLocal
+from app.main import app
+
+BENCH_WEEK_START = 1000
+
+
+def make_items(count: int, student_numbers: list, key_prefix: str, week_offset: int):
+    return [
+        {
+            "student_number": student_numbers[i % len(student_numbers)],
+            "week_number": BENCH_WEEK_START + week_offset + i // len(student_numbers),
+            "stress_level": i % 5 + 1,
+            "hours_slept": 4.0 + i % 5,
+            "idempotency_key": f"{key_prefix}{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def cleanup():
+    db = SessionLocal()
+    try:
+        db.query(models.WellbeingSurvey)\
+            .filter(models.WellbeingSurvey.week_number >= BENCH_WEEK_START)\
+            .delete(synchronize_session=False)
+        wellbeing_rollups.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(count: int, username: str, password: str):
+    db = SessionLocal()
+    try:
+        student_numbers = [n for (n,) in db.query(models.Student.student_number).limit(1000)]
+    finally:
+        db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        res = await client.post("/auth/token", data={"username": username, "password": password})
+        res.raise_for_status()
+        headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+        run_id = uuid.uuid4().hex
+        weeks_per_run = count // len(student_numbers) + 1
+        results = []
+
+        # 1. 逐条录入
+        items = make_items(count, student_numbers, f"bench_single_{run_id}_", 0)
+        start = time.perf_counter()
+        for item in items:
+            r = await client.post("/wellbeing/surveys", json=item, headers=headers)
+            r.raise_for_status()
+        results.append(("single", time.perf_counter() - start))
+
+        # 2. JSON 数组
+        items = make_items(count, student_numbers, f"bench_json_{run_id}_", weeks_per_run)
+        start = time.perf_counter()
+        r = await client.post("/wellbeing/surveys/batch", json=items, headers=headers)
+        r.raise_for_status()
+        assert r.json()["created_count"] == count, r.json()
+        results.append(("batch_json", time.perf_counter() - start))
+
+        # 3. NDJSON (重试同一批次时应全部返回 duplicate)
+        items = make_items(count, student_numbers, f"bench_ndjson_{run_id}_", 2 * weeks_per_run)
+        body = "\n".join(json.dumps(item) for item in items)
+        ndjson_headers = {**headers, "Content-Type": "application/x-ndjson"}
+        start = time.perf_counter()
+        r = await client.post("/wellbeing/surveys/batch", content=body, headers=ndjson_headers)
+        r.raise_for_status()
+        results.append(("batch_ndjson", time.perf_counter() - start))
+        retry = await client.post("/wellbeing/surveys/batch", content=body, headers=ndjson_headers)
+        assert retry.json()["duplicate_count"] == count, retry.json()
+
+    return [
+        {"mode": mode, "items": count, "seconds": round(elapsed, 3), "items_per_second": round(count / elapsed, 1)}
+        for mode, elapsed in results
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--username", default="officer")
+    parser.add_argument("--password", default="officer123")
+    args = parser.parse_args()
+
+    try:
+        for row in asyncio.run(run(args.items, args.username, args.password)):
+            print(row)
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+可扩展的合成数据生成器 (性能测试的标准数据集)
+
+与 seed.py 生成的数据分布相同 (约 1/3 的学生压力偏高、睡眠偏少、出勤和成绩偏低)，
+但全部用 NumPy 向量化生成、executemany 批量写入，可以生成百万行以上的数据。
+
+- 相同的参数和 --seed 生成相同的数据: 学生按固定大小的块生成，每块使用由 (seed, 块号) 派生的随机数，
+  与 --workers 无关
+- --workers > 1: 各进程并行生成数据。SQLite 只允许一个写事务，由主进程按块号顺序写入 (自增 id 也可复现)；
+  其他数据库由各进程写入自己的分片 (成绩 / 出勤 / 调查记录的自增 id 顺序可能不同)
+- 运行前会清空业务数据 (用户表除外)，并确保 director / officer 演示账号存在
+
+用法 (在 backend/ 目录下):
+    python datagen.py --students 20000 --courses 20 --weeks 12 --grades-per-course 4
+    python datagen.py --students 100000 --workers 4 --database-url sqlite:///./bench.db
+"""
+import argparse
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 每块学生数 (随机数按块派生，块大小固定才能保证结果与进程数无关)
+BLOCK_SIZE = 5000
+
+# executemany 每批行数
+INSERT_BATCH = 50000
+
+# 数据的时间基准 (固定值，保证可复现)
+BASE_DATE = datetime.datetime(2025, 9, 1, 9, 0, 0)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--grades-per-course", type=int, default=4)
+    parser.add_argument("--min-courses", type=int, default=1, help="每个学生最少选修的课程数")
+    parser.add_argument("--max-courses", type=int, default=3, help="每个学生最多选修的课程数")
+    parser.add_argument("--survey-density", type=float, default=0.9, help="每个学生每周提交调查的概率")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="并行生成 / 写入的进程数")
+    parser.add_argument("--database-url", help="目标数据库 (默认使用配置中的 DATABASE_URL)")
+    args = parser.parse_args(argv)
+    args.max_courses = min(args.max_courses, args.courses)
+    args.min_courses = min(args.min_courses, args.max_courses)
+    return args
+
+
+def generate_block(args, block: int) -> dict:
+    """
+    生成一块学生的全部数据，返回 {表名: 行列表}
+    学生 id 从 1 开始连续编号，课程 id 为 1..courses
+    """
+    rng = np.random.default_rng([args.seed, block])
+    first = block * BLOCK_SIZE
+    student_ids = np.arange(first, min(first + BLOCK_SIZE, args.students)) + 1
+    n = len(student_ids)
+
+    students = [
+        {"id": int(sid), "student_number": f"u{sid:07d}", "full_name": f"Student {sid}", "email": f"u{sid:07d}@example.edu"}
+        for sid in student_ids.tolist()
+    ]
+
+    # 压力生: 约 1/3
+    stressed = rng.random(n) < 1 / 3
+
+    # 选课: 每个学生随机取 k 门不重复的课程
+    k = rng.integers(args.min_courses, args.max_courses + 1, size=n)
+    ranking = np.argsort(rng.random((n, args.courses)), axis=1)
+    chosen = np.arange(args.courses) < k[:, None]
+    enrol_student = np.repeat(np.arange(n), k)
+    enrol_course = ranking[chosen] + 1
+    enrol_stressed = stressed[enrol_student]
+    enrolments = [
+        {"student_id": int(s), "course_id": int(c)}
+        for s, c in zip(student_ids[enrol_student].tolist(), enrol_course.tolist())
+    ]
+
+    week_dates = [BASE_DATE + datetime.timedelta(weeks=w) for w in range(args.weeks)]
+
+    # 健康调查: 每个学生每周以 survey_density 的概率提交
+    submitted = rng.random((n, args.weeks)) < args.survey_density
+    survey_student, survey_week = np.nonzero(submitted)
+    survey_stressed = stressed[survey_student]
+    stress = np.where(
+        survey_stressed,
+        rng.choice([3, 4, 5, 5], size=len(survey_student)),
+        rng.choice([1, 2, 3], size=len(survey_student)),
+    )
+    sleep = np.round(np.where(
+        survey_stressed,
+        rng.uniform(4.0, 6.5, size=len(survey_student)),
+        rng.uniform(6.5, 9.0, size=len(survey_student)),
+    ), 1)
+    surveys = [
+        {"student_id": s, "week_number": w + 1, "stress_level": st, "hours_slept": h, "recorded_at": week_dates[w]}
+        for s, w, st, h in zip(
+            student_ids[survey_student].tolist(), survey_week.tolist(), stress.tolist(), sleep.tolist()
+        )
+    ]
+
+    # 出勤: 每门课每周一次，压力生更容易缺勤
+    att_enrol = np.repeat(np.arange(len(enrol_course)), args.weeks)
+    att_week = np.tile(np.arange(args.weeks), len(enrol_course))
+    present_prob = np.where(enrol_stressed[att_enrol], 0.7, 0.95)
+    draw = rng.random(len(att_enrol))
+    status = np.where(draw < present_prob, "PRESENT", np.where(draw < present_prob + 0.05, "LATE", "ABSENT"))
+    attendances = [
+        {"student_id": s, "course_id": c, "date": week_dates[w], "status": st}
+        for s, c, w, st in zip(
+            student_ids[enrol_student[att_enrol]].tolist(), enrol_course[att_enrol].tolist(),
+            att_week.tolist(), status.tolist(),
+        )
+    ]
+
+    # 成绩: 每门课 grades_per_course 次作业，压力生基础分低 10 分
+    base_score = rng.integers(50, 91, size=len(enrol_course)) - np.where(enrol_stressed, 10, 0)
+    grade_enrol = np.repeat(np.arange(len(enrol_course)), args.grades_per_course)
+    grade_no = np.tile(np.arange(1, args.grades_per_course + 1), len(enrol_course))
+    scores = np.clip(base_score[grade_enrol] + rng.integers(-5, 11, size=len(grade_enrol)), 0, 100).astype(float)
+    submitted_minutes = rng.integers(0, args.weeks * 7 * 24 * 60, size=len(grade_enrol))
+    grades = [
+        {
+            "student_id": s, "course_id": c, "assignment_title": f"Assignment {i}", "score": sc,
+            "submission_date": BASE_DATE + datetime.timedelta(minutes=m),
+        }
+        for s, c, i, sc, m in zip(
+            student_ids[enrol_student[grade_enrol]].tolist(), enrol_course[grade_enrol].tolist(),
+            grade_no.tolist(), scores.tolist(), submitted_minutes.tolist(),
+        )
+    ]
+
+    return {
+        "students": students,
+        "student_courses": enrolments,
+        "wellbeing_surveys": surveys,
+        "attendances": attendances,
+        "grades": grades,
+    }
+
+
+def _tables():
+    from app import models
+
+    return {
+        "students": models.Student.__table__,
+        "student_courses": models.student_courses,
+        "wellbeing_surveys": models.WellbeingSurvey.__table__,
+        "attendances": models.Attendance.__table__,
+        "grades": models.Grade.__table__,
+    }
+
+
+def write_block(rows: dict, counts: dict):
+    """一块数据在一个事务内写入 (executemany，每批 INSERT_BATCH 行)"""
+    from app.database import engine
+
+    with engine.begin() as conn:
+        for name, table in _tables().items():
+            for start in range(0, len(rows[name]), INSERT_BATCH):
+                conn.execute(table.insert(), rows[name][start:start + INSERT_BATCH])
+            counts[name] = counts.get(name, 0) + len(rows[name])
+
+
+def write_shard(args, blocks: list) -> dict:
+    """在当前进程中生成并写入一个分片 (若干块)；返回各表写入的行数"""
+    counts = {}
+    for block in blocks:
+        write_block(generate_block(args, block), counts)
+    return counts
+
+
+def _init_worker(database_url):
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+
+
+def reset_database(args):
+    from sqlalchemy import delete, select
+
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.migrations import run_migrations
+    from app.security import get_password_hash
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    with engine.begin() as conn:
+        # 课程会被重建: 删除按课程的风险规则集 (默认规则集保留)
+        course_rule_sets = select(models.RiskRuleSet.id).where(models.RiskRuleSet.course_id.is_not(None))
+        conn.execute(delete(models.RiskRule.__table__).where(models.RiskRule.rule_set_id.in_(course_rule_sets)))
+        conn.execute(delete(models.RiskRuleSet.__table__).where(models.RiskRuleSet.course_id.is_not(None)))
+        for table in (
+            models.StudentSummary.__table__,
+            models.WellbeingWeeklyHistogram.__table__, models.WellbeingWeeklyRollup.__table__,
+            models.ImportJob.__table__, models.WellbeingSurvey.__table__, models.Grade.__table__,
+            models.Attendance.__table__, models.student_courses, models.Student.__table__, models.Course.__table__,
+        ):
+            conn.execute(delete(table))
+        conn.execute(models.Course.__table__.insert(), [
+            {"id": i, "code": f"WM{i:03d}", "name": f"Course {i}"} for i in range(1, args.courses + 1)
+        ])
+
+    db = SessionLocal()
+    try:
+        for username, password, full_name, role in (
+            ("director", "director123", "Dr. Alice Director", models.Role.COURSE_DIRECTOR),
+            ("officer", "officer123", "Mr. Bob Wellbeing", models.Role.WELLBEING_OFFICER),
+        ):
+            if not db.query(models.User).filter(models.User.username == username).first():
+                db.add(models.User(username=username, hashed_password=get_password_hash(password),
+                                   full_name=full_name, role=role))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _init_worker(args.database_url)
+
+    from app import student_summary, wellbeing_rollups
+    from app.database import engine
+    from app.response_cache import ACADEMIC, RISK_RULES, WELLBEING, bump_shared
+
+    start = time.perf_counter()
+    reset_database(args)
+
+    blocks = list(range((args.students + BLOCK_SIZE - 1) // BLOCK_SIZE))
+    if args.workers <= 1:
+        results = [write_shard(args, blocks)]
+    elif engine.dialect.name == "sqlite":
+        # SQLite 同一时间只允许一个写事务: 各进程并行生成，由主进程按块号顺序写入
+        counts = {}
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(args.database_url,)) as pool:
+            for rows in pool.map(generate_block, [args] * len(blocks), blocks):
+                write_block(rows, counts)
+        results = [counts]
+    else:
+        # 按块轮流分配给各进程，每个进程写自己的分片
+        shards = [blocks[i::args.workers] for i in range(args.workers)]
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(args.database_url,)) as pool:
+            results = list(pool.map(write_shard, [args] * len(shards), shards))
+
+    counts = {name: sum(r.get(name, 0) for r in results) for name in _tables()}
+    counts["courses"] = args.courses
+
+    with engine.begin() as conn:
+        wellbeing_rollups.rebuild(conn)
+        student_summary.rebuild(conn)
+        # 使运行中的服务进程的仪表盘缓存失效 (按课程的规则集随课程一起被删除)
+        bump_shared(conn, ACADEMIC, WELLBEING, RISK_RULES)
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"Generated {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    for name, count in counts.items():
+        print(f"  {name}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ from passlib.context import CryptContext
 # 导入你的应用模块
 # 确保你在 backend/ 目录下运行此脚本，否则可能会报 ModuleNotFoundError
 from app.database import SessionLocal, engine, Base
-from app import models
+from app import models, student_summary, wellbeing_rollups
+from app.response_cache import ACADEMIC, RISK_RULES, USERS, WELLBEING, bump_shared
+from app.migrations import run_migrations
 
 # 初始化 Faker 和 密码加密器
 fake = Faker()
@@ -20,17 +22,23 @@ def init_db():
     # 1. 创建数据库表 (如果不存在)
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     
     db = SessionLocal()
     
     try:
         # 2. 清理旧数据 (为了避免重复运行导致数据堆积，先清空)
         print("Cleaning up old data...")
+        db.query(models.StudentSummary).delete()
         db.query(models.WellbeingSurvey).delete()
         db.query(models.Grade).delete()
         db.query(models.Attendance).delete()
         db.execute(models.student_courses.delete()) # 清空多对多关联表
         db.query(models.Student).delete()
+        # 按课程的风险规则集随课程一起删除 (默认规则集保留)
+        course_rule_sets = db.query(models.RiskRuleSet.id).filter(models.RiskRuleSet.course_id.isnot(None))
+        db.query(models.RiskRule).filter(models.RiskRule.rule_set_id.in_(course_rule_sets)).delete(synchronize_session=False)
+        db.query(models.RiskRuleSet).filter(models.RiskRuleSet.course_id.isnot(None)).delete(synchronize_session=False)
         db.query(models.Course).delete()
         db.query(models.User).delete()
         db.commit()
@@ -165,6 +173,13 @@ def init_db():
                     db.add(grade)
 
         db.commit()
+
+        # 直接插入的记录不经过 create_survey，重新计算每周汇总表和学生汇总表
+        wellbeing_rollups.rebuild(db)
+        student_summary.rebuild(db)
+        # 使运行中的服务进程的仪表盘缓存失效 (按课程的规则集随课程一起被删除)
+        bump_shared(db, ACADEMIC, WELLBEING, RISK_RULES, USERS)
+        db.commit()
         print("✅ Database seeded successfully!")
         print("Login Credentials:")
         print(" -> Course Director:   username='director', password='director123'")
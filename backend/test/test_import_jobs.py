@@ -0,0 +1,35 @@
+"""
+CSV 导入任务: 转存上传文件失败、进程重启后未完成的任务
+"""
+import pytest
+
+from app import import_jobs, models
+
+
+def job_statuses(db) -> list:
+    db.expire_all()
+    return [job.status for job in db.query(models.ImportJob).order_by(models.ImportJob.id)]
+
+
+def test_failed_upload_leaves_no_job(client, db, monkeypatch):
+    def disk_full(source):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(import_jobs, "save_upload", disk_full)
+
+    with pytest.raises(OSError):
+        client.post("/wellbeing/upload_csv", files={"file": ("surveys.csv", b"student_number\n", "text/csv")})
+    assert job_statuses(db) == []
+
+
+def test_interrupted_jobs_marked_failed(client, db):
+    db.add_all([
+        models.ImportJob(filename="queued.csv", status=models.ImportStatus.PENDING),
+        models.ImportJob(filename="running.csv", status=models.ImportStatus.RUNNING),
+        models.ImportJob(filename="done.csv", status=models.ImportStatus.COMPLETED),
+    ])
+    db.commit()
+
+    # client 夹具让 import_jobs 使用测试数据库的会话
+    assert import_jobs.fail_interrupted_jobs() == 2
+    assert job_statuses(db) == [models.ImportStatus.FAILED, models.ImportStatus.FAILED, models.ImportStatus.COMPLETED]
+    assert all(job.message.startswith("Interrupted") for job in db.query(models.ImportJob).limit(2))
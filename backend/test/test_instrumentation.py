@@ -0,0 +1,31 @@
+"""
+慢查询日志: 各数据库的 EXPLAIN 语法 (EXPLAIN_PREFIX) 能对实际执行的语句取到执行计划
+"""
+import logging
+
+import pytest
+from sqlalchemy import event, select
+
+from app import instrumentation, models
+
+
+@pytest.fixture
+def slow_queries(engine, monkeypatch, caplog):
+    # 所有语句都视为慢查询
+    monkeypatch.setattr(instrumentation.settings, "SLOW_QUERY_MS", 1e-6)
+    monkeypatch.setattr(instrumentation.settings, "SLOW_QUERY_EXPLAIN", True)
+    instrumentation.install(engine)
+    caplog.set_level(logging.WARNING, logger=instrumentation.slow_query_logger.name)
+    yield caplog
+    event.remove(engine, "before_cursor_execute", instrumentation._before_cursor_execute)
+    event.remove(engine, "after_cursor_execute", instrumentation._after_cursor_execute)
+
+
+def test_slow_query_log_includes_plan(engine, slow_queries):
+    survey = models.WellbeingSurvey
+    with engine.connect() as conn:
+        conn.execute(select(survey.id).where(survey.student_id == 1, survey.week_number >= 2)).all()
+
+    [message] = [r.getMessage() for r in slow_queries.records if "wellbeing_surveys" in r.getMessage()]
+    assert "\nPlan:\n" in message
+    assert "EXPLAIN failed" not in message
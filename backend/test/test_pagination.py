@@ -0,0 +1,89 @@
+"""
+键集分页: 游标的校验，以及跨页遍历不重复、不遗漏 (包括排序列相同的记录)
+"""
+import base64
+import json
+from typing import Optional
+
+import pytest
+from fastapi import HTTPException
+
+from app import models
+from app.crud import crud_academic, crud_wellbeing
+from app.pagination import decode_cursor, encode_cursor
+
+GRADES = 25
+
+
+@pytest.fixture(scope="module", autouse=True)
+def data(db):
+    course = models.Course(code="P1", name="Paging")
+    student = models.Student(student_number="u0000001", full_name="Student 1", email="u0000001@example.edu")
+    db.add_all([course, student])
+    db.flush()
+    # 分数有大量重复，只靠 score 无法确定顺序
+    db.add_all([models.Grade(student_id=student.id, course_id=course.id, score=float(i % 4 * 10)) for i in range(GRADES)])
+    db.add_all([
+        models.WellbeingSurvey(student_id=student.id, week_number=week, stress_level=3, hours_slept=7.0)
+        for week in range(1, 13)
+    ])
+    db.commit()
+    return course.id
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    raw_cursor({"score": 1}),
+    raw_cursor([1]),
+    raw_cursor(["a", {}]),
+    raw_cursor([1.5, "2"]),
+    raw_cursor([50.0, True]),
+    raw_cursor([None, None]),
+])
+def test_malformed_cursor(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, (Optional[float], int))
+    assert exc.value.status_code == 400
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor((40.0, 7)), (Optional[float], int)) == (40.0, 7)
+    assert decode_cursor(encode_cursor((40, 7)), (Optional[float], int)) == (40, 7)
+    assert decode_cursor(encode_cursor((None, 7)), (Optional[float], int)) == (None, 7)
+    assert decode_cursor(None, (int, int)) is None
+
+
+def collect(fetch, types, limit):
+    """按游标逐页读取 (经过编码 / 解码，与客户端相同)，返回每一页"""
+    pages, cursor = [], None
+    while True:
+        rows, next_key = fetch(decode_cursor(cursor, types), limit)
+        pages.append(rows)
+        if next_key is None:
+            return pages
+        cursor = encode_cursor(next_key)
+
+
+@pytest.mark.parametrize("limit", [1, 4, 5, GRADES, GRADES + 1])
+def test_course_grades_pages(db, data, limit):
+    pages = collect(
+        lambda after, limit: crud_academic.get_course_grades(db, data, after=after, limit=limit),
+        (Optional[float], int), limit,
+    )
+    grades = [g for page in pages for g in page]
+    assert all(len(page) == limit for page in pages[:-1])
+    assert [(g.score, g.id) for g in grades] == sorted((g.score, g.id) for g in grades)
+    assert len({g.id for g in grades}) == GRADES
+
+
+@pytest.mark.parametrize("limit", [1, 5, 12])
+def test_survey_history_pages(db, limit):
+    pages = collect(
+        lambda after, limit: crud_wellbeing.get_surveys_by_student_number(db, "u0000001", after=after, limit=limit),
+        (int, int), limit,
+    )
+    assert [s.week_number for page in pages for s in page] == list(range(1, 13))
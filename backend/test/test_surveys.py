@@ -0,0 +1,142 @@
+"""
+调查记录的写入接口: 幂等键，以及同一学生同一周已有记录时的处理策略
+(replace / keep_first / reject、配置的默认策略与 on_conflict 覆盖、同一批次 / 同一文件中的重复记录)
+"""
+import time
+
+import pytest
+
+from app import models
+from app.crud import crud_wellbeing
+
+STUDENT = "u0000001"
+
+# 已有记录时批量接口返回的状态 (每个测试使用不同的周，互不影响)
+EXPECTED_STATUS = {"replace": "updated", "keep_first": "skipped", "reject": "error"}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def students(db):
+    db.add(models.Student(student_number=STUDENT, full_name="Student 1", email=f"{STUDENT}@example.edu"))
+    db.commit()
+
+
+def post_batch(client, items, **params):
+    response = client.post("/wellbeing/surveys/batch", json=items, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+
+def upload_csv(client, rows, **params) -> dict:
+    """上传 CSV 并等待后台导入完成，返回导入任务"""
+    lines = ["student_number,week_number,stress_level,hours_slept"]
+    lines += [f"{STUDENT},{week},{stress},7.0" for week, stress in rows]
+    response = client.post(
+        "/wellbeing/upload_csv", params=params,
+        files={"file": ("surveys.csv", "\n".join(lines).encode(), "text/csv")},
+    )
+    assert response.status_code == 202, response.text
+    job_id = response.json()["id"]
+    for _ in range(200):
+        job = client.get(f"/wellbeing/imports/{job_id}").json()
+        if job["status"] not in ("pending", "running"):
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"import job {job_id} did not finish")
+
+
+def survey(week: int, stress: int, **extra) -> dict:
+    return {"student_number": STUDENT, "week_number": week, "stress_level": stress, "hours_slept": 7.0, **extra}
+
+
+def history(client) -> dict:
+    response = client.get(f"/wellbeing/students/{STUDENT}/history")
+    assert response.status_code == 200, response.text
+    return {s["week_number"]: s["stress_level"] for s in response.json()}
+
+
+def test_retried_request_does_not_revert_correction(client):
+    [created] = post_batch(client, [survey(1, 2, idempotency_key="k1")])
+    assert created["status"] == "created"
+
+    [corrected] = post_batch(client, [survey(1, 9, idempotency_key="k2")], on_conflict="replace")
+    assert corrected["status"] == "updated"
+
+    # 客户端重试第一次的请求: 键仍然可以识别，不会把修正改回去
+    [retried] = post_batch(client, [survey(1, 2, idempotency_key="k1")], on_conflict="replace")
+    assert retried == {**retried, "status": "duplicate", "id": created["id"]}
+    [retried] = post_batch(client, [survey(1, 9, idempotency_key="k2")], on_conflict="replace")
+    assert retried["status"] == "duplicate"
+    assert history(client)[1] == 9
+
+
+@pytest.mark.parametrize("week, policy", [(2, "replace"), (3, "keep_first"), (4, "reject")])
+def test_batch_existing_week(client, week, policy):
+    [created] = post_batch(client, [survey(week, 2)])
+    assert created["status"] == "created"
+
+    [result] = post_batch(client, [survey(week, 9)], on_conflict=policy)
+    assert result["status"] == EXPECTED_STATUS[policy]
+    if policy == "reject":
+        assert "already exists" in result["error"]
+    else:
+        assert result["id"] == created["id"]
+    assert history(client)[week] == (9 if policy == "replace" else 2)
+
+
+@pytest.mark.parametrize("week, policy, statuses, stress", [
+    (5, "replace", ["created", "updated"], 8),
+    (6, "keep_first", ["created", "skipped"], 3),
+    (7, "reject", ["created", "error"], 3),
+])
+def test_batch_duplicates_within_request(client, week, policy, statuses, stress):
+    results = post_batch(client, [survey(week, 3), survey(week, 8)], on_conflict=policy)
+    assert [r["status"] for r in results] == statuses
+    assert history(client)[week] == stress
+
+
+def test_configured_policy_and_override(client, monkeypatch):
+    post_batch(client, [survey(8, 2)])
+    monkeypatch.setattr(crud_wellbeing.settings, "SURVEY_CONFLICT_POLICY", "reject")
+
+    # 不指定 on_conflict 时使用配置的策略
+    [result] = post_batch(client, [survey(8, 9)])
+    assert result["status"] == "error"
+    response = client.post("/wellbeing/surveys", json=survey(8, 9))
+    assert response.status_code == 409
+
+    # 请求参数覆盖配置
+    [result] = post_batch(client, [survey(8, 9)], on_conflict="keep_first")
+    assert result["status"] == "skipped"
+    response = client.post("/wellbeing/surveys", json=survey(8, 9), params={"on_conflict": "replace"})
+    assert response.status_code == 200
+    assert response.json()["stress_level"] == 9
+    assert history(client)[8] == 9
+
+
+@pytest.mark.parametrize("week, policy, success, errors, stress", [
+    (10, "replace", 2, 0, 8),
+    (11, "keep_first", 0, 0, 2),
+    (12, "reject", 0, 2, 2),
+])
+def test_csv_existing_and_duplicate_rows(client, week, policy, success, errors, stress):
+    job = upload_csv(client, [(week, 2)])
+    assert (job["status"], job["success_count"]) == ("completed", 1)
+
+    # 已有的周，且同一文件中出现两次
+    job = upload_csv(client, [(week, 5), (week, 8)], on_conflict=policy)
+    assert job["status"] == "completed"
+    assert (job["success_count"], job["error_count"]) == (success, errors)
+    if errors:
+        assert all("already exists" in error for error in job["errors"])
+    assert history(client)[week] == stress
+
+
+def test_csv_configured_policy(client, monkeypatch):
+    upload_csv(client, [(13, 2)])
+    monkeypatch.setattr(crud_wellbeing.settings, "SURVEY_CONFLICT_POLICY", "keep_first")
+    job = upload_csv(client, [(13, 9)])
+    assert (job["success_count"], job["error_count"]) == (0, 0)
+    job = upload_csv(client, [(13, 9)], on_conflict="replace")
+    assert job["success_count"] == 1
+    assert history(client)[13] == 9
@@ -0,0 +1,63 @@
+"""
+已认证用户缓存的失效: ORM 修改、批量 update / delete、其他进程的修改 (USERS 共享版本号)，
+以及 TRUST_TOKEN_ROLE 路径对 Token 的校验
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import models, security
+from app.dependencies import get_current_user
+from app.response_cache import USERS, bump_shared, response_cache
+from app.user_cache import user_cache
+
+
+@pytest.fixture(autouse=True)
+def user(db, monkeypatch):
+    # 每次都读取 cache_versions 表，其他进程的修改立即可见
+    monkeypatch.setattr(response_cache, "shared_version_seconds", 1e-9)
+    user_cache.clear()
+    db.query(models.User).delete()
+    user = models.User(username="director", hashed_password="x", full_name="Director", role=models.Role.COURSE_DIRECTOR)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def current_user(db, **claims):
+    token = security.create_access_token({"sub": "director", **claims})
+    return asyncio.run(get_current_user(token, db))
+
+
+def test_bulk_update_invalidates(db, monkeypatch):
+    token = security.create_access_token({"sub": "director"})
+    assert asyncio.run(get_current_user(token, db)).role == models.Role.COURSE_DIRECTOR
+    # 只看本进程的失效 (不依赖共享版本号)
+    monkeypatch.setattr(response_cache, "shared_version_seconds", 0)
+    db.query(models.User).filter(models.User.username == "director")\
+        .update({"role": models.Role.WELLBEING_OFFICER}, synchronize_session=False)
+    db.commit()
+    assert asyncio.run(get_current_user(token, db)).role == models.Role.WELLBEING_OFFICER
+
+
+def test_write_from_another_process_invalidates(db, engine):
+    token = security.create_access_token({"sub": "director"})
+    assert asyncio.run(get_current_user(token, db)).role == models.Role.COURSE_DIRECTOR
+
+    # 模拟另一个进程: 直接改表 (不经过本进程的 ORM 事件)，并递增共享版本号
+    users = models.User.__table__
+    with engine.begin() as conn:
+        conn.execute(users.update().values(role=models.Role.WELLBEING_OFFICER.name))
+        bump_shared(conn, USERS)
+    db.rollback()
+    assert asyncio.run(get_current_user(token, db)).role == models.Role.WELLBEING_OFFICER
+
+
+def test_trusted_token_requires_uid(db, monkeypatch, user):
+    monkeypatch.setattr(security.settings, "TRUST_TOKEN_ROLE", True)
+    assert current_user(db, role="course_director", uid=user.id).id == user.id
+    for claims in ({"role": "course_director"}, {"role": "course_director", "uid": "1"}):
+        with pytest.raises(HTTPException) as exc:
+            current_user(db, **claims)
+        assert exc.value.status_code == 401
@@ -0,0 +1,112 @@
+"""
+每周汇总表 (wellbeing_rollups) 与原始数据实时聚合结果的一致性测试
+调查记录分别通过 create_survey、批量接口和 CSV 导入写入，包括覆盖已有的周
+
+运行 (在 backend/ 目录下): python -m pytest -q test
+"""
+import io
+
+import pytest
+
+from app import models, schemas, student_summary, wellbeing_rollups
+from app.crud import crud_wellbeing
+
+STUDENTS = 6
+COURSES = 2
+
+
+@pytest.fixture(scope="module", autouse=True)
+def students(db):
+    courses = [models.Course(code=f"C{i}", name=f"Course {i}") for i in range(1, COURSES + 1)]
+    for i in range(1, STUDENTS + 1):
+        # 前两个学生不选课 (只计入 course_id = 0)，其余选修一到两门课
+        db.add(models.Student(
+            student_number=f"u{i:07d}", full_name=f"Student {i}", email=f"u{i:07d}@example.edu",
+            enrolled_courses=courses[:(i - 1) % (COURSES + 1)],
+        ))
+    db.commit()
+
+
+def assert_consistent(db):
+    with db.get_bind().connect() as conn:
+        assert wellbeing_rollups.check(conn) == []
+        assert student_summary.check(conn) == []
+
+
+def survey(number: int, week: int, stress: int, sleep: float) -> schemas.WellbeingSurveyCreate:
+    return schemas.WellbeingSurveyCreate(
+        student_number=f"u{number:07d}", week_number=week, stress_level=stress, hours_slept=sleep
+    )
+
+
+def test_create_survey(db):
+    for number in range(1, STUDENTS + 1):
+        crud_wellbeing.create_survey(db, survey(number, 1, number, 4.0 + number / 2), policy="replace")
+    assert_consistent(db)
+
+    # 覆盖同一周: 包括该周的最小值 (学生 1) 和最大值 (学生 6)
+    crud_wellbeing.create_survey(db, survey(1, 1, 5, 7.25), policy="replace")
+    crud_wellbeing.create_survey(db, survey(6, 1, 2, 5.0), policy="replace")
+    crud_wellbeing.create_survey(db, survey(3, 1, 3, 6.5), policy="replace")
+    assert_consistent(db)
+
+    # keep_first 不修改已有记录
+    crud_wellbeing.create_survey(db, survey(2, 1, 10, 0.0), policy="keep_first")
+    assert_consistent(db)
+
+
+def test_create_surveys_batch(db):
+    items = [
+        schemas.WellbeingSurveyBatchItem(**survey(number, week, (number + week) % 10 + 1, 3.0 + week).model_dump())
+        for week in (2, 3) for number in range(1, STUDENTS + 1)
+    ]
+    crud_wellbeing.create_surveys_batch(db, list(enumerate(items)), policy="replace")
+    assert_consistent(db)
+
+    # 覆盖第 2 周的一部分，同时新增第 4 周；同一批次中重复的 (学生, 周) 以后出现的为准
+    items = [
+        schemas.WellbeingSurveyBatchItem(**survey(1, 2, 10, 2.0).model_dump()),
+        schemas.WellbeingSurveyBatchItem(**survey(4, 2, 1, 11.5).model_dump()),
+        schemas.WellbeingSurveyBatchItem(**survey(4, 2, 7, 6.0).model_dump()),
+        schemas.WellbeingSurveyBatchItem(**survey(5, 4, 6, 6.75).model_dump()),
+    ]
+    results = crud_wellbeing.create_surveys_batch(db, list(enumerate(items)), policy="replace")
+    assert [r["status"] for r in results] == ["updated", "updated", "updated", "created"]
+    assert_consistent(db)
+
+
+def test_import_surveys_csv(db):
+    def upload(rows):
+        lines = ["student_number,week_number,stress_level,hours_slept"]
+        lines += [f"u{number:07d},{week},{stress},{sleep}" for number, week, stress, sleep in rows]
+        return crud_wellbeing.import_surveys_csv(db, io.StringIO("\n".join(lines)), chunksize=4, policy="replace")
+
+    rows = [(number, 5, number % 10 + 1, 5.0 + number / 4) for number in range(1, STUDENTS + 1)]
+    assert upload(rows)["success_count"] == STUDENTS
+    assert_consistent(db)
+
+    # 修改后重新上传同一周 (覆盖)，并混入新的周和无效的行
+    rows = [(number, 5, 10 - number, 9.0 - number / 3) for number in range(1, STUDENTS + 1)]
+    rows += [(1, 6, 4, 7.5), (99, 6, 4, 7.5)]
+    result = upload(rows)
+    assert result["success_count"] == STUDENTS + 1
+    assert result["error_count"] == 1
+    assert_consistent(db)
+
+
+def test_enrolment_change_leaves_no_empty_rollup(db):
+    # 学生 1 提交后才选修课程 2，再覆盖同一周: 课程 2 的切片先 -1 再 +1，不能留下 survey_count = 0 的行
+    crud_wellbeing.create_survey(db, survey(1, 8, 4, 6.0), policy="replace")
+    student = db.query(models.Student).filter(models.Student.student_number == "u0000001").one()
+    course = db.query(models.Course).filter(models.Course.code == "C2").one()
+    student.enrolled_courses.append(course)
+    db.commit()
+    crud_wellbeing.create_survey(db, survey(1, 8, 6, 7.0), policy="replace")
+
+    assert db.query(models.WellbeingWeeklyRollup).filter(models.WellbeingWeeklyRollup.survey_count <= 0).count() == 0
+    assert all(r.survey_count > 0 for r in crud_wellbeing.get_weekly_analytics(db, course.id))
+
+    # 选课变化不会增量反映到汇总表 (学生 1 之前各周的记录)，重算后与原始数据一致
+    with db.get_bind().begin() as conn:
+        wellbeing_rollups.rebuild(conn)
+    assert_consistent(db)
@@ -14,6 +14,13 @@ export function getCourseAnalytics(courseId) {
     })
 }
 
+export function getAllCourseAnalytics() {
+    return request({
+        url: '/academic/dashboard/courses',
+        method: 'get'
+    })
+}
+
 export function getAcademicAlerts() {
     return request({
         url: '/academic/dashboard/alerts',
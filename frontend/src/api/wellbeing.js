@@ -39,3 +39,17 @@ export function uploadCsvSurveys(formData) {
         }
     })
 }
+
+export function getImportJob(jobId) {
+    return request({
+        url: `/wellbeing/imports/${jobId}`,
+        method: 'get'
+    })
+}
+
+export function cancelImportJob(jobId) {
+    return request({
+        url: `/wellbeing/imports/${jobId}/cancel`,
+        method: 'post'
+    })
+}